@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count
 from django.utils.html import format_html
-from .models import (CustomUser, UserProfile, FoodProduct, FoodImage, 
-                    Advertisement, GalleryItem, MediaItem, UserActivity)
+from .models import (CustomUser, UserProfile, FoodProduct, FoodImage, AnalysisJob,
+                    Advertisement, GalleryItem, MediaItem, Tag, UserActivity)
+from .utils.media_stats import invalidate_media_counts
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -38,7 +40,7 @@ class FoodImageInline(admin.TabularInline):
     """Inline admin for food images"""
     model = FoodImage
     extra = 0
-    readonly_fields = ('uploaded_at', 'file_size', 'image_width', 'image_height')
+    readonly_fields = ('uploaded_at', 'file_size', 'image_width', 'image_height', 'orientation')
 
 @admin.register(FoodProduct)
 class FoodProductAdmin(admin.ModelAdmin):
@@ -65,10 +67,21 @@ class FoodProductAdmin(admin.ModelAdmin):
 @admin.register(FoodImage)
 class FoodImageAdmin(admin.ModelAdmin):
     """Food image admin"""
-    list_display = ('product', 'view_type', 'prediction', 'confidence', 'uploaded_at')
+    list_display = ('product', 'view_type', 'prediction', 'confidence', 'image_width', 'image_height', 'uploaded_at')
     list_filter = ('view_type', 'prediction', 'uploaded_at')
     search_fields = ('product__brand_name', 'detected_text')
-    readonly_fields = ('uploaded_at', 'file_size', 'image_width', 'image_height')
+    readonly_fields = ('uploaded_at', 'file_size', 'image_width', 'image_height', 'orientation')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    """Analysis job queue admin"""
+    list_display = ('product', 'kind', 'status', 'progress', 'attempts', 'worker_id', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('product__brand_name', 'worker_id', 'error')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_at')
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('product')
@@ -98,11 +111,14 @@ class GalleryItemAdmin(admin.ModelAdmin):
     def approve_items(self, request, queryset):
         from django.utils import timezone
         queryset.update(status='approved', approved_by=request.user, approved_at=timezone.now())
+        # Bulk updates send no save signals
+        invalidate_media_counts()
         self.message_user(request, f"{queryset.count()} items approved.")
     approve_items.short_description = "Approve selected items"
     
     def reject_items(self, request, queryset):
         queryset.update(status='rejected')
+        invalidate_media_counts()
         self.message_user(request, f"{queryset.count()} items rejected.")
     reject_items.short_description = "Reject selected items"
     
@@ -120,18 +136,22 @@ class MediaItemAdmin(admin.ModelAdmin):
     """Media item admin"""
     list_display = ('title', 'media_type', 'status', 'uploaded_by', 'created_at')
     list_filter = ('media_type', 'status', 'created_at')
-    search_fields = ('title', 'description', 'tags')
+    search_fields = ('title', 'description', 'tags__name')
     readonly_fields = ('created_at', 'updated_at')
+    filter_horizontal = ('tags',)
     actions = ['approve_items', 'reject_items']
     
     def approve_items(self, request, queryset):
         from django.utils import timezone
         queryset.update(status='approved', approved_by=request.user, approved_at=timezone.now())
+        # Bulk updates send no save signals
+        invalidate_media_counts()
         self.message_user(request, f"{queryset.count()} items approved.")
     approve_items.short_description = "Approve selected items"
     
     def reject_items(self, request, queryset):
         queryset.update(status='rejected')
+        invalidate_media_counts()
         self.message_user(request, f"{queryset.count()} items rejected.")
     reject_items.short_description = "Reject selected items"
     
@@ -144,6 +164,20 @@ class MediaItemAdmin(admin.ModelAdmin):
             obj.approved_at = timezone.now()
         super().save_model(request, obj, form, change)
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    """Media tag admin"""
+    list_display = ('name', 'item_count')
+    search_fields = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(item_count=Count('media_items'))
+
+    def item_count(self, obj):
+        return obj.item_count
+    item_count.admin_order_field = 'item_count'
+    item_count.short_description = 'Media items'
+
 @admin.register(UserActivity)
 class UserActivityAdmin(admin.ModelAdmin):
     """User activity admin"""
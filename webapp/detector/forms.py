@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import authenticate
 from phonenumber_field.widgets import PhoneNumber
-from .models import CustomUser, UserProfile, Advertisement, GalleryItem, MediaItem
+from .models import CustomUser, UserProfile, Advertisement, GalleryItem, MediaItem, Tag
 
 class CustomUserRegistrationForm(UserCreationForm):
     """Custom user registration form"""
@@ -177,7 +177,7 @@ class MediaItemForm(forms.ModelForm):
 
     class Meta:
         model = MediaItem
-        fields = ['title', 'description', 'file', 'media_type', 'tags']
+        fields = ['title', 'description', 'file', 'media_type']  # tags come from tags_input
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500',
@@ -200,8 +200,8 @@ class MediaItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if self.instance and self.instance.pk:
-            # Convert tags list to comma-separated string for display
-            self.fields['tags_input'].initial = ', '.join(self.instance.tags) if self.instance.tags else ''
+            # Convert tags to comma-separated string for display
+            self.fields['tags_input'].initial = ', '.join(tag.name for tag in self.instance.tags.all())
 
     def clean_tags_input(self):
         tags_input = self.cleaned_data.get('tags_input', '')
@@ -211,12 +211,10 @@ class MediaItemForm(forms.ModelForm):
             return tags
         return []
 
-    def save(self, commit=True):
-        instance = super().save(commit=False)
-        instance.tags = self.cleaned_data.get('tags_input', [])
-        if commit:
-            instance.save()
-        return instance
+    def _save_m2m(self):
+        # Runs on save(), or on save_m2m() after save(commit=False)
+        super()._save_m2m()
+        self.instance.tags.set(Tag.objects.for_names(self.cleaned_data.get('tags_input', [])))
 
 class GalleryItemForm(forms.ModelForm):
     """Form for creating gallery items for product comparisons and safety guidelines"""
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detector.utils.resumable_uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads idle for longer than UPLOAD_SESSION_EXPIRY, with their partial files"
+
+    def handle(self, *args, **options):
+        expired = expire_sessions()
+        self.stdout.write(f"Expired {expired} upload sessions idle for over {settings.UPLOAD_SESSION_EXPIRY}s")
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detector.utils.job_queue import (claim_next_job, default_worker_id, record_worker_heartbeat, requeue_stale_jobs,
+                                     run_job)
+
+
+class Command(BaseCommand):
+    help = "Run queued /api/detect/ analysis jobs from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--worker-id', default=None, help='Identifier recorded on claimed jobs')
+        parser.add_argument('--poll-interval', type=float, default=settings.DETECTION_WORKER_POLL_INTERVAL,
+                            help='Seconds to sleep when no job is queued')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stdout.write(f"Detection worker {worker_id} started")
+
+        # Requests only defer OCR while a worker has checked in recently
+        last_heartbeat = None
+        while True:
+            if last_heartbeat is None or time.monotonic() - last_heartbeat >= settings.DETECTION_JOB_HEARTBEAT_INTERVAL:
+                record_worker_heartbeat(worker_id)
+                last_heartbeat = time.monotonic()
+            requeue_stale_jobs()
+            job = claim_next_job(worker_id)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            job = run_job(job)
+            self.stdout.write(f"Job {job.pk} for product {job.product_id}: {job.status}")
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0005_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('received', 'Upload Received'), ('prediction', 'View Prediction'), ('ocr', 'OCR Complete'), ('verdict', 'Final Verdict'), ('error', 'Analysis Failed')], max_length=20)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='detector.foodproduct')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0006_analysisevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='kind',
+            field=models.CharField(choices=[('analysis', 'Analysis'), ('ocr', 'OCR enrichment')], default='analysis', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='foodproduct',
+            name='ocr_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed')], default='completed', max_length=10),
+        ),
+    ]
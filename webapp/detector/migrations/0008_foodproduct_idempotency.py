@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0007_ocr_deferral'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodproduct',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='foodproduct',
+            name='upload_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='foodproduct',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key', ''), _negated=True), fields=('user', 'idempotency_key'), name='foodproduct_user_idempotency_key_uniq'),
+        ),
+    ]
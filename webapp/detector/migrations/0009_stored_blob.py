@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:06
+
+import detector.utils.blob_storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0008_foodproduct_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='foodimage',
+            name='image',
+            field=models.ImageField(storage=detector.utils.blob_storage.get_blob_storage, upload_to='food_images/'),
+        ),
+        migrations.AlterField(
+            model_name='galleryitem',
+            name='image',
+            field=models.ImageField(storage=detector.utils.blob_storage.get_blob_storage, upload_to='gallery/'),
+        ),
+        migrations.AlterField(
+            model_name='mediaitem',
+            name='file',
+            field=models.FileField(storage=detector.utils.blob_storage.get_blob_storage, upload_to='library/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0009_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodimage',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0011_upload_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysisevent',
+            name='stage',
+            field=models.CharField(choices=[('received', 'Upload Received'), ('quality', 'Image Quality Issues'), ('prediction', 'View Prediction'), ('ocr', 'OCR Complete'), ('verdict', 'Final Verdict'), ('error', 'Analysis Failed')], max_length=20),
+        ),
+    ]
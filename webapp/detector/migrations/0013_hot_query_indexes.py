@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0012_analysisevent_quality_stage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodproduct',
+            index=models.Index(fields=['user', '-created_at'], name='foodproduct_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodproduct',
+            index=models.Index(fields=['user', 'final_prediction'], name='foodproduct_user_verdict_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryitem',
+            index=models.Index(fields=['status', '-created_at'], name='galleryitem_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['status', '-created_at'], name='mediaitem_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', '-timestamp'], name='useractivity_user_time_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_stats(apps, schema_editor):
+    FoodProduct = apps.get_model('detector', 'FoodProduct')
+    UserAnalysisStats = apps.get_model('detector', 'UserAnalysisStats')
+    # Older rows may carry 'Fake'/'Real', the pipeline writes 'FAKE'/'REAL'
+    totals = FoodProduct.objects.filter(user__isnull=False).order_by().values('user').annotate(
+        total=Count('id'),
+        fake=Count('id', filter=Q(final_prediction__iexact='FAKE')),
+        real=Count('id', filter=Q(final_prediction__iexact='REAL')),
+        last=Max('created_at'),
+    )
+    UserAnalysisStats.objects.bulk_create([
+        UserAnalysisStats(user_id=row['user'], total_analyses=row['total'], fake_count=row['fake'],
+                          real_count=row['real'], last_analysis_at=row['last'])
+        for row in totals.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAnalysisStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analysis_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_analyses', models.PositiveIntegerField(default=0)),
+                ('fake_count', models.PositiveIntegerField(default=0)),
+                ('real_count', models.PositiveIntegerField(default=0)),
+                ('last_analysis_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'user analysis stats',
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
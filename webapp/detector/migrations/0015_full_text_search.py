@@ -0,0 +1,140 @@
+from django.db import migrations
+
+# Indexed text per table: (column, SQL expression over the row, weight)
+# Weights are BM25 column weights on SQLite and tsvector labels on Postgres
+OCR_TEXT = ("(SELECT group_concat(detected_text, ' ') FROM detector_foodimage "
+            "WHERE product_id = {row}.id)")
+PG_OCR_TEXT = ("(SELECT string_agg(detected_text, ' ') FROM detector_foodimage "
+               "WHERE product_id = {row}.id)")
+
+SEARCH_INDEXES = {
+    'detector_foodproduct': [
+        ('brand_name', '{row}.brand_name', 'A'),
+        ('final_prediction', '{row}.final_prediction', 'B'),
+        ('analysis_notes', '{row}.analysis_notes', 'C'),
+        ('ocr_text', None, 'D'),
+    ],
+    'detector_advertisement': [
+        ('title', '{row}.title', 'A'),
+        ('content_type', '{row}.content_type', 'B'),
+        ('description', '{row}.description', 'C'),
+    ],
+    'detector_mediaitem': [
+        ('title', '{row}.title', 'A'),
+        ('tags', '{row}.tags', 'B'),
+        ('media_type', '{row}.media_type', 'B'),
+        ('description', '{row}.description', 'C'),
+    ],
+    'detector_galleryitem': [
+        ('title', '{row}.title', 'A'),
+        ('category', '{row}.category', 'B'),
+        ('description', '{row}.description', 'C'),
+    ],
+}
+
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+
+def column_expressions(table, row, ocr_text):
+    return [ocr_text.format(row=row) if expression is None else expression.format(row=row)
+            for _, expression, _ in SEARCH_INDEXES[table]]
+
+def sqlite_statements(table):
+    index = f'{table}_fts'
+    columns = [column for column, _, _ in SEARCH_INDEXES[table]]
+    weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, _, weight in SEARCH_INDEXES[table])
+    plain = [column for column, expression, _ in SEARCH_INDEXES[table] if expression is not None]
+    statements = [
+        f"CREATE VIRTUAL TABLE {index} USING fts5({', '.join(columns)}, "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        # ORDER BY rank then weighs title-like columns above long text
+        f"INSERT INTO {index}({index}, rank) VALUES ('rank', 'bm25({weights})')",
+        f"INSERT INTO {index}(rowid, {', '.join(columns)}) "
+        f"SELECT t.id, {', '.join(column_expressions(table, 't', OCR_TEXT))} FROM {table} t",
+        f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, {', '.join(columns)}) "
+        f"VALUES (new.id, {', '.join(column_expressions(table, 'new', OCR_TEXT))}); END",
+        f"CREATE TRIGGER {index}_update AFTER UPDATE OF {', '.join(plain)} ON {table} BEGIN "
+        f"UPDATE {index} SET {', '.join(f'{column} = new.{column}' for column in plain)} "
+        f"WHERE rowid = new.id; END",
+        f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {index} WHERE rowid = old.id; END",
+    ]
+    if table == 'detector_foodproduct':
+        # OCR text lives on the product's images
+        refresh = (f"UPDATE {index} SET ocr_text = (SELECT group_concat(detected_text, ' ') FROM detector_foodimage "
+                   f"WHERE product_id = {index}.rowid) WHERE rowid IN ({{products}});")
+        statements += [
+            f"CREATE TRIGGER {index}_image_insert AFTER INSERT ON detector_foodimage BEGIN "
+            f"{refresh.format(products='new.product_id')} END",
+            f"CREATE TRIGGER {index}_image_update AFTER UPDATE OF detected_text, product_id ON detector_foodimage "
+            f"BEGIN {refresh.format(products='old.product_id, new.product_id')} END",
+            f"CREATE TRIGGER {index}_image_delete AFTER DELETE ON detector_foodimage BEGIN "
+            f"{refresh.format(products='old.product_id')} END",
+        ]
+    return statements
+
+def postgres_statements(table):
+    index = f'{table}_search'
+    plain = [column for column, expression, _ in SEARCH_INDEXES[table] if expression is not None]
+    document = ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce(({expression})::text, '')), '{weight}')"
+        for expression, (_, _, weight) in zip(column_expressions(table, 't', PG_OCR_TEXT), SEARCH_INDEXES[table])
+    )
+    statements = [
+        f"CREATE TABLE {index} (id bigint PRIMARY KEY REFERENCES {table} (id) ON DELETE CASCADE, "
+        f"document tsvector NOT NULL)",
+        f"CREATE INDEX {index}_document_idx ON {index} USING GIN (document)",
+        f"CREATE FUNCTION {index}_refresh(row_id bigint) RETURNS void AS $$ "
+        f"INSERT INTO {index} (id, document) SELECT t.id, {document} FROM {table} t WHERE t.id = row_id "
+        f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document $$ LANGUAGE sql",
+        f"INSERT INTO {index} (id, document) SELECT t.id, {document} FROM {table} t",
+        f"CREATE FUNCTION {index}_trigger() RETURNS trigger AS $$ BEGIN "
+        f"PERFORM {index}_refresh(NEW.id); RETURN NULL; END $$ LANGUAGE plpgsql",
+        f"CREATE TRIGGER {index}_refresh AFTER INSERT OR UPDATE OF {', '.join(plain)} ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {index}_trigger()",
+    ]
+    if table == 'detector_foodproduct':
+        statements += [
+            f"CREATE FUNCTION {index}_image_trigger() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN PERFORM {index}_refresh(OLD.product_id); END IF; "
+            f"IF TG_OP <> 'DELETE' THEN PERFORM {index}_refresh(NEW.product_id); END IF; "
+            f"RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER {index}_image_refresh AFTER INSERT OR UPDATE OF detected_text, product_id OR DELETE "
+            f"ON detector_foodimage FOR EACH ROW EXECUTE FUNCTION {index}_image_trigger()",
+        ]
+    return statements
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    builders = {'sqlite': sqlite_statements, 'postgresql': postgres_statements}
+    if vendor not in builders:
+        # Other databases keep the icontains fallback of utils.search
+        return
+    for table in SEARCH_INDEXES:
+        for statement in builders[vendor](table):
+            schema_editor.execute(statement)
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_INDEXES:
+        if vendor == 'sqlite':
+            # The triggers belong to the indexed tables and outlive the FTS table
+            for suffix in ('insert', 'update', 'delete', 'image_insert', 'image_update', 'image_delete'):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+        elif vendor == 'postgresql':
+            index = f'{table}_search'
+            schema_editor.execute(f"DROP TABLE IF EXISTS {index}")
+            schema_editor.execute(f"DROP FUNCTION IF EXISTS {index}_trigger, {index}_image_trigger, "
+                                  f"{index}_refresh CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0014_user_analysis_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,187 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+FTS = 'detector_mediaitem_fts'
+SEARCH = 'detector_mediaitem_search'
+
+# Text indexed for a media item's tags, before and after normalisation
+JSON_TAGS = "(SELECT tags FROM detector_mediaitem WHERE id = {item})"
+SQLITE_TAG_NAMES = ("(SELECT group_concat(tag.name, ' ') FROM detector_mediaitem_tags link "
+                    "JOIN detector_tag tag ON tag.id = link.tag_id WHERE link.mediaitem_id = {item})")
+PG_TAG_NAMES = ("(SELECT string_agg(tag.name, ' ') FROM detector_mediaitem_tags link "
+                "JOIN detector_tag tag ON tag.id = link.tag_id WHERE link.mediaitem_id = {item})")
+
+def normalize(name):
+    # Same as Tag.normalize, historical models have no custom methods
+    return ' '.join(str(name).split()).lower()[:50]
+
+def sqlite_item_triggers(tags, columns):
+    """Triggers of the media FTS table, `columns` are copied from the row on update"""
+    return [
+        f"CREATE TRIGGER {FTS}_insert AFTER INSERT ON detector_mediaitem BEGIN "
+        f"INSERT INTO {FTS}(rowid, title, tags, media_type, description) "
+        f"VALUES (new.id, new.title, {tags.format(item='new.id')}, new.media_type, new.description); END",
+        f"CREATE TRIGGER {FTS}_update AFTER UPDATE OF {', '.join(columns)} ON detector_mediaitem BEGIN "
+        f"UPDATE {FTS} SET {', '.join(f'{column} = new.{column}' for column in columns)} "
+        f"WHERE rowid = new.id; END",
+        f"CREATE TRIGGER {FTS}_delete AFTER DELETE ON detector_mediaitem BEGIN "
+        f"DELETE FROM {FTS} WHERE rowid = old.id; END",
+        f"UPDATE {FTS} SET tags = {tags.format(item=f'{FTS}.rowid')}",
+    ]
+
+def postgres_item_statements(tags, columns):
+    """Refresh function and item trigger of the media search table, `columns` trigger a refresh"""
+    document = ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce(({expression})::text, '')), '{weight}')"
+        for expression, weight in (('t.title', 'A'), (tags.format(item='t.id'), 'B'), ('t.media_type', 'B'),
+                                   ('t.description', 'C'))
+    )
+    return [
+        f"CREATE OR REPLACE FUNCTION {SEARCH}_refresh(row_id bigint) RETURNS void AS $$ "
+        f"INSERT INTO {SEARCH} (id, document) SELECT t.id, {document} FROM detector_mediaitem t WHERE t.id = row_id "
+        f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document $$ LANGUAGE sql",
+        f"CREATE TRIGGER {SEARCH}_refresh AFTER INSERT OR UPDATE OF {', '.join(columns)} ON detector_mediaitem "
+        f"FOR EACH ROW EXECUTE FUNCTION {SEARCH}_trigger()",
+        f"SELECT {SEARCH}_refresh(id) FROM detector_mediaitem",
+    ]
+
+def drop_item_triggers(schema_editor):
+    # They name the JSON tags column, which could not be dropped otherwise. SQLite
+    # drops the column by rebuilding the table, which would lose them all anyway
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for suffix in ('insert', 'update', 'delete'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS}_{suffix}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {SEARCH}_refresh ON detector_mediaitem")
+
+def drop_json_tag_triggers(apps, schema_editor):
+    drop_item_triggers(schema_editor)
+
+def create_json_tag_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    columns = ['title', 'tags', 'media_type', 'description']
+    if vendor == 'sqlite':
+        statements = sqlite_item_triggers(JSON_TAGS, columns)
+    elif vendor == 'postgresql':
+        statements = postgres_item_statements(JSON_TAGS, columns)
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+def create_tag_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    columns = ['title', 'media_type', 'description']
+    if vendor == 'sqlite':
+        refresh = f"UPDATE {FTS} SET tags = {SQLITE_TAG_NAMES.format(item=f'{FTS}.rowid')} WHERE rowid IN ({{items}});"
+        statements = [
+            f"CREATE TRIGGER {FTS}_tag_insert AFTER INSERT ON detector_mediaitem_tags BEGIN "
+            f"{refresh.format(items='new.mediaitem_id')} END",
+            f"CREATE TRIGGER {FTS}_tag_delete AFTER DELETE ON detector_mediaitem_tags BEGIN "
+            f"{refresh.format(items='old.mediaitem_id')} END",
+            f"CREATE TRIGGER {FTS}_tag_rename AFTER UPDATE OF name ON detector_tag BEGIN "
+            f"{refresh.format(items='SELECT mediaitem_id FROM detector_mediaitem_tags WHERE tag_id = new.id')} END",
+        ] + sqlite_item_triggers(SQLITE_TAG_NAMES, columns)
+    elif vendor == 'postgresql':
+        statements = [
+            f"CREATE FUNCTION {SEARCH}_link_trigger() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP = 'DELETE' THEN PERFORM {SEARCH}_refresh(OLD.mediaitem_id); "
+            f"ELSE PERFORM {SEARCH}_refresh(NEW.mediaitem_id); END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER {SEARCH}_link_refresh AFTER INSERT OR DELETE ON detector_mediaitem_tags "
+            f"FOR EACH ROW EXECUTE FUNCTION {SEARCH}_link_trigger()",
+            f"CREATE FUNCTION {SEARCH}_tag_trigger() RETURNS trigger AS $$ BEGIN "
+            f"PERFORM {SEARCH}_refresh(mediaitem_id) FROM detector_mediaitem_tags WHERE tag_id = NEW.id; "
+            f"RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER {SEARCH}_tag_refresh AFTER UPDATE OF name ON detector_tag "
+            f"FOR EACH ROW EXECUTE FUNCTION {SEARCH}_tag_trigger()",
+        ] + postgres_item_statements(PG_TAG_NAMES, columns)
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+def drop_tag_triggers(apps, schema_editor):
+    drop_item_triggers(schema_editor)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for suffix in ('tag_insert', 'tag_delete', 'tag_rename'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS}_{suffix}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {SEARCH}_link_refresh ON detector_mediaitem_tags")
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {SEARCH}_tag_refresh ON detector_tag")
+        schema_editor.execute(f"DROP FUNCTION IF EXISTS {SEARCH}_link_trigger, {SEARCH}_tag_trigger")
+
+def copy_json_tags(apps, schema_editor):
+    """Fill the tag table and links from the JSON lists, a batch of items at a time"""
+    MediaItem = apps.get_model('detector', 'MediaItem')
+    Tag = apps.get_model('detector', 'Tag')
+    Link = MediaItem.tag_set.through
+
+    def flush(batch):
+        names = {name for _, item_names in batch for name in item_names}
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+        Link.objects.bulk_create([
+            Link(mediaitem_id=item_id, tag_id=tag_ids[name]) for item_id, item_names in batch for name in item_names
+        ], ignore_conflicts=True)
+
+    batch = []
+    for item_id, tags in MediaItem.objects.values_list('id', 'tags').iterator(chunk_size=BATCH_SIZE):
+        names = {normalize(name) for name in tags or [] if isinstance(name, str)} - {''}
+        if names:
+            batch.append((item_id, names))
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+def copy_tag_links(apps, schema_editor):
+    """Rebuild the JSON lists from the links"""
+    MediaItem = apps.get_model('detector', 'MediaItem')
+    Link = MediaItem.tag_set.through
+    names = {}
+    for item_id, name in Link.objects.order_by('tag__name').values_list('mediaitem_id', 'tag__name').iterator():
+        names.setdefault(item_id, []).append(name)
+    items = [MediaItem(id=item_id, tags=item_names) for item_id, item_names in names.items()]
+    MediaItem.objects.bulk_update(items, ['tags'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0015_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(drop_json_tag_triggers, create_json_tag_triggers),
+        # Added under a temporary name so the JSON list can be copied before it is dropped
+        migrations.AddField(
+            model_name='mediaitem',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='media_items', to='detector.tag'),
+        ),
+        migrations.RunPython(copy_json_tags, copy_tag_links),
+        migrations.RemoveField(
+            model_name='mediaitem',
+            name='tags',
+        ),
+        migrations.RenameField(
+            model_name='mediaitem',
+            old_name='tag_set',
+            new_name='tags',
+        ),
+        migrations.RunPython(create_tag_triggers, drop_tag_triggers),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:01
+
+import hashlib
+import posixpath
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Fields whose files may already have renditions
+SOURCE_FIELDS = [('FoodImage', 'image'), ('GalleryItem', 'image'), ('MediaItem', 'file')]
+
+def source_key(name):
+    # Same as utils.derivatives.source_key
+    if name.startswith('blobs/'):
+        return posixpath.splitext(posixpath.basename(name))[0]
+    return hashlib.sha256(name.encode()).hexdigest()
+
+def record_rendition_sources(apps, schema_editor):
+    """Record every stored file renditions can have been generated from"""
+    RenditionSource = apps.get_model('detector', 'RenditionSource')
+    batch = []
+    for model_name, field in SOURCE_FIELDS:
+        names = apps.get_model('detector', model_name).objects.exclude(**{field: ''}).values_list(field, flat=True)
+        for name in names.distinct().iterator(chunk_size=BATCH_SIZE):
+            batch.append(RenditionSource(key=source_key(name), name=name))
+            if len(batch) >= BATCH_SIZE:
+                RenditionSource.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    RenditionSource.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('detector', '0016_media_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenditionSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=64)),
+                ('name', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['file'], name='advertisement_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['profile_picture'], name='customuser_picture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodimage',
+            index=models.Index(fields=['image'], name='foodimage_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryitem',
+            index=models.Index(fields=['image'], name='galleryitem_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['file'], name='mediaitem_file_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='renditionsource',
+            constraint=models.UniqueConstraint(fields=('key', 'name'), name='renditionsource_key_name_uniq'),
+        ),
+        migrations.RunPython(record_rendition_sources, migrations.RunPython.noop),
+    ]
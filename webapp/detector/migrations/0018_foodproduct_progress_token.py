@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0017_rendition_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodproduct',
+            name='progress_token',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0018_foodproduct_progress_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=100, unique=True)),
+                ('last_seen', models.DateTimeField()),
+            ],
+        ),
+    ]
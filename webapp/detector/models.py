@@ -1,8 +1,15 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .utils.blob_storage import get_blob_storage
+from .utils.image_headers import read_image_header
+
 class CustomUserManager(BaseUserManager):
     """Custom user manager"""
     def create_user(self, email, first_name, last_name, password=None, **extra_fields):
@@ -40,6 +47,12 @@ class CustomUser(AbstractUser):
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Media access checks look files up by name, see utils.media_access
+            models.Index(fields=['profile_picture'], name='customuser_picture_idx'),
+        ]
     
     def __str__(self):
         return self.email
@@ -80,6 +93,14 @@ class FoodProduct(models.Model):
     processing_time = models.FloatField(null=True, blank=True)  # Processing time in seconds
     brand_match = models.BooleanField(default=False)  # Whether OCR found matching brand
     ocr_results = models.JSONField(default=dict, blank=True)  # Structured OCR results
+    ocr_status = models.CharField(
+        max_length=10,
+        choices=[('pending', 'Pending'), ('completed', 'Completed')],
+        default='completed'
+    )  # 'pending' while OCR is deferred to a detection worker
+    idempotency_key = models.CharField(max_length=255, blank=True)  # Client Idempotency-Key header
+    upload_digest = models.CharField(max_length=64, blank=True, db_index=True)  # See utils.idempotency.upload_digest
+    progress_token = models.UUIDField(null=True, blank=True, db_index=True)  # Client-chosen, see AnalysisEventStreamView
     
     # Additional analysis fields
     risk_level = models.CharField(
@@ -91,6 +112,18 @@ class FoodProduct(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=~models.Q(idempotency_key=''),
+                name='foodproduct_user_idempotency_key_uniq'
+            ),
+        ]
+        indexes = [
+            # Dashboard/history listings and per-user verdict counts
+            models.Index(fields=['user', '-created_at'], name='foodproduct_user_created_idx'),
+            models.Index(fields=['user', 'final_prediction'], name='foodproduct_user_verdict_idx'),
+        ]
     
     def __str__(self):
         return f"{self.brand_name} Analysis - {self.final_prediction}"
@@ -106,7 +139,7 @@ class FoodImage(models.Model):
     ]
 
     product = models.ForeignKey(FoodProduct, on_delete=models.CASCADE, related_name='images', null=True)
-    image = models.ImageField(upload_to='food_images/')
+    image = models.ImageField(upload_to='food_images/', storage=get_blob_storage)
     view_type = models.CharField(max_length=10, choices=VIEWS, default='front')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     prediction = models.CharField(max_length=10, blank=True)  # Individual prediction for this view
@@ -117,13 +150,100 @@ class FoodImage(models.Model):
     file_size = models.IntegerField(null=True, blank=True)  # Size in bytes
     image_width = models.IntegerField(null=True, blank=True)
     image_height = models.IntegerField(null=True, blank=True)
+    orientation = models.PositiveSmallIntegerField(default=1)  # EXIF orientation, 1 is upright
 
     class Meta:
         ordering = ['view_type']
+        indexes = [
+            # Media access checks look files up by name
+            models.Index(fields=['image'], name='foodimage_image_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.brand_name} - {self.get_view_type_display()}"
 
+    def read_header_metadata(self):
+        """Fill the image metadata from the file header, without decoding pixels"""
+        self.file_size = self.image.size
+        try:
+            header = read_image_header(self.image.file)
+        except ValueError:
+            return  # Format Pillow accepts but the header reader does not know
+        self.image_width = header.width
+        self.image_height = header.height
+        self.orientation = header.orientation
+
+    def save(self, *args, **kwargs):
+        # Fresh uploads only, stored files are never re-read
+        if self.image and not self.image._committed:
+            self.read_header_metadata()
+        super().save(*args, **kwargs)
+
+class AnalysisJob(models.Model):
+    """Database-backed queue entry for analysing a product outside the HTTP request"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+    KIND_CHOICES = [
+        ('analysis', 'Analysis'),
+        ('ocr', 'OCR enrichment')
+    ]
+
+    product = models.ForeignKey(FoodProduct, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='analysis')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # Percent complete
+    full_scan = models.BooleanField(default=False)  # OCR every view, see process_product_images
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker_id = models.CharField(max_length=100, blank=True)  # Worker currently holding the job
+    locked_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analysisjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} for product {self.product_id} - {self.status}"
+
+class DetectionWorker(models.Model):
+    """Last sign of life of a run_detection_worker process"""
+    worker_id = models.CharField(max_length=100, unique=True)
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.worker_id} (seen {self.last_seen})"
+
+class AnalysisEvent(models.Model):
+    """Progress event emitted while a product is analysed, streamed to clients over SSE"""
+    STAGES = [
+        ('received', 'Upload Received'),
+        ('quality', 'Image Quality Issues'),
+        ('prediction', 'View Prediction'),
+        ('ocr', 'OCR Complete'),
+        ('verdict', 'Final Verdict'),
+        ('error', 'Analysis Failed')
+    ]
+
+    product = models.ForeignKey(FoodProduct, on_delete=models.CASCADE, related_name='events')
+    stage = models.CharField(max_length=20, choices=STAGES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Product {self.product_id} - {self.get_stage_display()}"
+
 class Advertisement(models.Model):
     """Model for storing promotional content and awareness campaigns"""
     CONTENT_TYPES = [
@@ -146,6 +266,10 @@ class Advertisement(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Media access checks look files up by name
+            models.Index(fields=['file'], name='advertisement_file_idx'),
+        ]
 
 class GalleryItem(models.Model):
     """Model for product comparison gallery items"""
@@ -164,7 +288,7 @@ class GalleryItem(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     category = models.CharField(max_length=20, choices=CATEGORIES)
-    image = models.ImageField(upload_to='gallery/')
+    image = models.ImageField(upload_to='gallery/', storage=get_blob_storage)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     approved_at = models.DateTimeField(null=True, blank=True)
@@ -178,6 +302,48 @@ class GalleryItem(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Public gallery and moderation queue, newest first per status
+            models.Index(fields=['status', '-created_at'], name='galleryitem_status_created_idx'),
+            # Media access checks look files up by name
+            models.Index(fields=['image'], name='galleryitem_image_idx'),
+        ]
+
+class TagManager(models.Manager):
+    def for_names(self, names):
+        """Tags for the given names, normalised and created as needed"""
+        names = list(dict.fromkeys(filter(None, map(Tag.normalize, names))))
+        if not names:
+            return []
+        self.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        return list(self.filter(name__in=names))
+
+    def facets(self, limit, **item_filters):
+        """
+        The `limit` most used tags among media items matching `item_filters`
+        (e.g. status='approved'), each annotated with item_count
+        """
+        lookups = {f'media_items__{field}': value for field, value in item_filters.items()}
+        return self.filter(**lookups).annotate(item_count=models.Count('media_items')).order_by(
+            '-item_count', 'name'
+        )[:limit]
+
+class Tag(models.Model):
+    """A media library tag, one row per distinct normalised name"""
+    name = models.CharField(max_length=50, unique=True)
+
+    objects = TagManager()
+
+    class Meta:
+        ordering = ['name']
+
+    @staticmethod
+    def normalize(name):
+        """Lowercase with single spaces, so 'FSSAI ' and 'fssai' are one tag"""
+        return ' '.join(name.split()).lower()[:50]
+
+    def __str__(self):
+        return self.name
 
 class MediaItem(models.Model):
     """Model for general media library items"""
@@ -195,10 +361,10 @@ class MediaItem(models.Model):
 
     title = models.CharField(max_length=200)
     description = models.TextField()
-    file = models.FileField(upload_to='library/')
+    file = models.FileField(upload_to='library/', storage=get_blob_storage)
     media_type = models.CharField(max_length=20, choices=MEDIA_TYPES)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
-    tags = models.JSONField(default=list)
+    tags = models.ManyToManyField(Tag, related_name='media_items', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     approved_at = models.DateTimeField(null=True, blank=True)
@@ -211,6 +377,12 @@ class MediaItem(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Public library and moderation queue, newest first per status
+            models.Index(fields=['status', '-created_at'], name='mediaitem_status_created_idx'),
+            # Media access checks look files up by name
+            models.Index(fields=['file'], name='mediaitem_file_idx'),
+        ]
 
 class UserActivity(models.Model):
     """Model to track user activities"""
@@ -231,6 +403,78 @@ class UserActivity(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Recent activity of a user
+            models.Index(fields=['user', '-timestamp'], name='useractivity_user_time_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.email} - {self.get_activity_type_display()}"
\ No newline at end of file
+        return f"{self.user.email} - {self.get_activity_type_display()}"
+
+class UserAnalysisStats(models.Model):
+    """
+    Running analysis totals of a user, adjusted by signals whenever a
+    product is created, given a verdict or deleted, so the dashboard reads
+    one row instead of counting the whole history
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='analysis_stats')
+    total_analyses = models.PositiveIntegerField(default=0)
+    fake_count = models.PositiveIntegerField(default=0)
+    real_count = models.PositiveIntegerField(default=0)
+    last_analysis_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'user analysis stats'
+
+    def __str__(self):
+        return f"{self.user.email} - {self.total_analyses} analyses"
+
+class StoredBlob(models.Model):
+    """A file in the content-addressed media storage and how many fields reference it"""
+    name = models.CharField(max_length=255, unique=True)  # blobs/<aa>/<bb>/<sha256><ext>
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+class RenditionSource(models.Model):
+    """
+    A file renditions were generated from, so the source key in a rendition
+    name resolves to the files it stands for with one indexed lookup
+    """
+    key = models.CharField(max_length=64, db_index=True)  # utils.derivatives.source_key
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'name'], name='renditionsource_key_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.key[:12]})"
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload, assembled in UPLOAD_SESSION_DIR until a form
+    submission moves the file into storage
+    """
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)  # Bytes received so far
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    def partial_path(self):
+        return os.path.join(settings.UPLOAD_SESSION_DIR, f"{self.token}.part")
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes)"
@@ -1,6 +1,18 @@
 from rest_framework import serializers
 from .models import CustomUser, FoodProduct, FoodImage, UserProfile
 
+class FieldSelectionMixin:
+    """
+    Lets callers pass fields=[...] to keep only those fields in the output.
+    Unknown names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
 class CustomUserSerializer(serializers.ModelSerializer):
     """Serializer for custom user model"""
     full_name = serializers.ReadOnlyField()
@@ -25,10 +37,16 @@ class FoodImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = FoodImage
         fields = ['id', 'image', 'view_type', 'prediction', 'confidence', 
-                 'detected_text', 'uploaded_at', 'file_size', 'image_width', 'image_height']
-        read_only_fields = ['id', 'uploaded_at', 'file_size', 'image_width', 'image_height']
+                 'detected_text', 'uploaded_at', 'file_size', 'image_width', 'image_height', 'orientation']
+        read_only_fields = ['id', 'uploaded_at', 'file_size', 'image_width', 'image_height', 'orientation']
+
+class FoodImageCompactSerializer(serializers.ModelSerializer):
+    """Food image without OCR text and file metadata"""
+    class Meta:
+        model = FoodImage
+        fields = ['id', 'image', 'view_type', 'prediction', 'confidence']
 
-class FoodProductSerializer(serializers.ModelSerializer):
+class FoodProductSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     """Serializer for food products"""
     images = FoodImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
@@ -50,10 +68,10 @@ class FoodProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = FoodProduct
         fields = ['id', 'user', 'brand_name', 'final_prediction', 'overall_confidence',
-                 'processing_time', 'brand_match', 'ocr_results', 'risk_level',
+                 'processing_time', 'brand_match', 'ocr_results', 'ocr_status', 'risk_level',
                  'analysis_notes', 'created_at', 'images', 'uploaded_images', 'view_types']
         read_only_fields = ['id', 'created_at', 'final_prediction', 'overall_confidence',
-                           'processing_time', 'brand_match', 'ocr_results']
+                           'processing_time', 'brand_match', 'ocr_results', 'ocr_status']
 
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
@@ -73,7 +91,17 @@ class FoodProductSerializer(serializers.ModelSerializer):
         
         return product
 
-class FoodProductListSerializer(serializers.ModelSerializer):
+class FoodProductCompactSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    """Verdict of a food product with compact images, for payload-sensitive clients"""
+    images = FoodImageCompactSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = FoodProduct
+        fields = ['id', 'brand_name', 'final_prediction', 'overall_confidence', 'brand_match',
+                 'ocr_status', 'risk_level', 'processing_time', 'created_at', 'images']
+        read_only_fields = fields
+
+class FoodProductListSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     """Simplified serializer for listing food products"""
     images_count = serializers.SerializerMethodField()
     
@@ -83,4 +111,7 @@ class FoodProductListSerializer(serializers.ModelSerializer):
                  'risk_level', 'created_at', 'images_count']
     
     def get_images_count(self, obj):
+        # List views annotate the count, anything else falls back to a query
+        if hasattr(obj, 'images_count'):
+            return obj.images_count
         return obj.images.count()
\ No newline at end of file
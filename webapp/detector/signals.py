@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils import timezone
+
+from .models import Advertisement, FoodImage, FoodProduct, GalleryItem, MediaItem, UserAnalysisStats
+from .utils.derivatives import delete_renditions
+from .utils.media_stats import invalidate_media_counts
+
+# Models whose files live in the content-addressed blob storage, and the field holding them
+BLOB_FIELDS = {
+    FoodImage: 'image',
+    GalleryItem: 'image',
+    MediaItem: 'file',
+}
+
+def release_blob(field_file, name):
+    """Give back the reference once the surrounding transaction has committed"""
+    if name and field_file.storage.is_blob(name):
+        transaction.on_commit(lambda: delete_blob(field_file.storage, name))
+
+def delete_blob(storage, name):
+    storage.delete(name)
+    # Renditions outlive the blob only while other references keep the file
+    if not storage.exists(name):
+        delete_renditions(name)
+
+def remember_blob(sender, instance, **kwargs):
+    # Reading a deferred field would cost a query per instance
+    if BLOB_FIELDS[sender] not in instance.get_deferred_fields():
+        instance._stored_blob_name = getattr(instance, BLOB_FIELDS[sender]).name
+
+def release_replaced_blob(sender, instance, created, **kwargs):
+    field_file = getattr(instance, BLOB_FIELDS[sender])
+    if not created and hasattr(instance, '_stored_blob_name') and instance._stored_blob_name != field_file.name:
+        release_blob(field_file, instance._stored_blob_name)
+    instance._stored_blob_name = field_file.name
+
+def release_deleted_blob(sender, instance, **kwargs):
+    field_file = getattr(instance, BLOB_FIELDS[sender])
+    release_blob(field_file, field_file.name)
+
+for model in BLOB_FIELDS:
+    post_init.connect(remember_blob, sender=model, dispatch_uid=f'remember_blob_{model.__name__}')
+    post_save.connect(release_replaced_blob, sender=model, dispatch_uid=f'release_replaced_blob_{model.__name__}')
+    post_delete.connect(release_deleted_blob, sender=model, dispatch_uid=f'release_deleted_blob_{model.__name__}')
+
+# UserAnalysisStats counter of each verdict, older rows may use 'Fake'/'Real'
+VERDICT_COUNTERS = {'FAKE': 'fake_count', 'REAL': 'real_count'}
+
+def adjust_analysis_stats(user_id, create=False, **changes):
+    """
+    Apply F() deltas to a user's stats row in a single UPDATE, so concurrent
+    analyses never lose a count. The row is created on first use when
+    `create` is set; decrements skip missing rows, e.g. during a user delete.
+    """
+    if UserAnalysisStats.objects.filter(user_id=user_id).update(**changes) or not create:
+        return
+    UserAnalysisStats.objects.get_or_create(user_id=user_id)
+    UserAnalysisStats.objects.filter(user_id=user_id).update(**changes)
+
+def verdict_counter(verdict):
+    return VERDICT_COUNTERS.get((verdict or '').upper())
+
+def remember_verdict(sender, instance, **kwargs):
+    if 'final_prediction' not in instance.get_deferred_fields():
+        instance._stored_verdict = instance.final_prediction
+
+def fetch_stored_verdict(sender, instance, **kwargs):
+    # Loaded with final_prediction deferred: read it before it is overwritten
+    if not instance._state.adding and not hasattr(instance, '_stored_verdict'):
+        instance._stored_verdict = sender.objects.filter(pk=instance.pk).values_list(
+            'final_prediction', flat=True
+        ).first()
+
+def count_analysis(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    previous = None if created else getattr(instance, '_stored_verdict', instance.final_prediction)
+    instance._stored_verdict = instance.final_prediction
+    if raw or instance.user_id is None or (update_fields and 'final_prediction' not in update_fields):
+        return
+
+    changes = {}
+    if created:
+        changes['total_analyses'] = F('total_analyses') + 1
+        changes['last_analysis_at'] = instance.created_at
+    old_counter, new_counter = verdict_counter(previous), verdict_counter(instance.final_prediction)
+    if old_counter != new_counter:
+        if old_counter:
+            changes[old_counter] = F(old_counter) - 1
+        if new_counter:
+            changes[new_counter] = F(new_counter) + 1
+        changes.setdefault('last_analysis_at', timezone.now())
+    if changes:
+        adjust_analysis_stats(instance.user_id, create=True, **changes)
+
+def uncount_analysis(sender, instance, **kwargs):
+    if instance.user_id is None:
+        return
+    changes = {'total_analyses': F('total_analyses') - 1}
+    counter = verdict_counter(getattr(instance, '_stored_verdict', instance.final_prediction))
+    if counter:
+        changes[counter] = F(counter) - 1
+    adjust_analysis_stats(instance.user_id, **changes)
+
+post_init.connect(remember_verdict, sender=FoodProduct, dispatch_uid='remember_verdict')
+pre_save.connect(fetch_stored_verdict, sender=FoodProduct, dispatch_uid='fetch_stored_verdict')
+post_save.connect(count_analysis, sender=FoodProduct, dispatch_uid='count_analysis')
+post_delete.connect(uncount_analysis, sender=FoodProduct, dispatch_uid='uncount_analysis')
+
+def media_changed(sender, instance, **kwargs):
+    # After commit, or a dashboard load in between would cache the old counts again
+    transaction.on_commit(invalidate_media_counts)
+
+for model in (Advertisement, GalleryItem, MediaItem):
+    post_save.connect(media_changed, sender=model, dispatch_uid=f'media_changed_save_{model.__name__}')
+    post_delete.connect(media_changed, sender=model, dispatch_uid=f'media_changed_delete_{model.__name__}')
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from ..utils.derivatives import available_formats, mime_type, rendition_url
+
+register = template.Library()
+
+# Matches the 1/2/3/4 column card grids of the media pages
+DEFAULT_SIZES = '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw'
+
+def _srcset(name, fmt):
+    return ', '.join(
+        f"{rendition_url(name, rendition, fmt)} {width}w" for rendition, width in settings.IMAGE_RENDITIONS.items()
+    )
+
+@register.simple_tag
+def responsive_image(field_file, alt='', sizes=DEFAULT_SIZES, **attrs):
+    """
+    <picture> of cached renditions of an image field, modern formats first
+    with a JPEG <img> fallback. Extra keyword arguments become <img>
+    attributes, e.g. {% responsive_image item.image alt=item.title class="w-full" %}
+    """
+    if not field_file:
+        return ''
+    name = field_file.name
+    formats = available_formats()
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (mime_type(fmt), _srcset(name, fmt), sizes) for fmt in formats if fmt != 'jpeg'
+    ))
+    if 'jpeg' in formats:
+        fallback = rendition_url(name, 'thumb', 'jpeg')
+        srcset = _srcset(name, 'jpeg')
+    else:
+        fallback, srcset = field_file.url, ''
+    attributes = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    # display: contents keeps <picture> out of the layout so the <img> classes size against the card
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" srcset="{}" sizes="{}" alt="{}" '
+        'loading="lazy" decoding="async"{}></picture>',
+        sources, fallback, srcset, sizes, alt, attributes
+    )
@@ -1,7 +1,91 @@
+from unittest import mock, skipUnless
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+from PIL import Image, ImageColor, ImageDraw
+from asgiref.sync import sync_to_async
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from .models import (Advertisement, AnalysisEvent, AnalysisJob, CustomUser, FoodImage, FoodProduct, GalleryItem,
+                     MediaItem, StoredBlob, Tag, UploadSession, UserActivity, UserAnalysisStats)
+from .utils.analysis import apply_analysis_results
+from .utils.derivatives import delete_renditions, get_rendition
+from .utils.image_quality import check_image_quality
+from .utils.media_stats import media_counts
+from .utils.resumable_uploads import AssembledUpload
+from .utils.search import full_text_search
+from .utils.video_scan import hash_distance, sample_keyframes, video_file_path
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+def make_image_file(name='front.jpg', size=(640, 480), color='white', image_format='JPEG'):
+    """Build an in-memory image upload, JPEG by default, checkered so it passes the quality pre-check"""
+    image = Image.new('RGB', size, color=color)
+    draw = ImageDraw.Draw(image)
+    shade = tuple(value * 7 // 10 for value in ImageColor.getrgb(color))
+    for y in range(0, size[1], 16):
+        for x in range(16 * (y // 16 % 2), size[0], 32):
+            draw.rectangle((x, y, x + 15, y + 15), fill=shade)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+def block_pattern(seed, size=(160, 120)):
+    """Sharp frame of random grey blocks, distinct per seed"""
+    blocks = np.random.RandomState(seed).randint(0, 255, (12, 16), dtype=np.uint8)
+    return cv2.cvtColor(cv2.resize(blocks, size, interpolation=cv2.INTER_NEAREST), cv2.COLOR_GRAY2BGR)
+
+def make_video_file(frames, name='scan.avi', fps=8):
+    """Build an MJPEG video upload from BGR frames"""
+    with tempfile.NamedTemporaryFile(suffix='.avi') as video:
+        height, width = frames[0].shape[:2]
+        writer = cv2.VideoWriter(video.name, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        return SimpleUploadedFile(name, video.read(), content_type='video/x-msvideo')
+
+def fake_pipeline_results(view_types):
+    """Results shaped like process_product_images output"""
+    return {
+        'overall_prediction': 'REAL',
+        'overall_confidence': 0.9,
+        'brand_match': True,
+        'detailed_analysis': {
+            view_type: {'prediction': 'REAL', 'confidence': 0.9, 'ocr_text': f'{view_type} text'}
+            for view_type in view_types
+        },
+        'ocr_results': {'extracted_brands': ['MAGGI'], 'expiry_dates': [],
+                        'batch_numbers': [], 'mrp_values': []},
+        'ocr_skipped_views': [],
+        'ocr_status': 'completed',
+        'processing_time': 0.5,
+    }
+
 class FoodDetectorTests(APITestCase):
     def setUp(self):
         self.url = reverse('detector:detect_food')
@@ -25,3 +109,1618 @@ class FoodDetectorTests(APITestCase):
         self.assertIn('message', response.data)
         self.assertIn('status', response.data)
         self.assertIn('supported_formats', response.data)
+
+
+class ProcessProductImagesTests(SimpleTestCase):
+    def setUp(self):
+        from detector.utils import ml_utils
+        self.ml_utils = ml_utils
+        self.images = {'front': b'front', 'back': b'back', 'side': b'side'}
+        self.ocr_by_image = {
+            b'back': {
+                'full_text': 'maggi mrp rs 14.00 batch no: ab123 exp 01/02/2026',
+                'expiry_date': '01/02/2026',
+                'batch_number': 'AB123',
+                'mrp': '14.00',
+                'extracted_brands': ['MAGGI'],
+            },
+            b'side': {'full_text': 'side', 'expiry_date': None, 'batch_number': None,
+                      'mrp': None, 'extracted_brands': []},
+            b'front': {'full_text': 'maggi', 'expiry_date': None, 'batch_number': None,
+                       'mrp': None, 'extracted_brands': ['MAGGI']},
+        }
+
+    def _run(self, **kwargs):
+        with mock.patch.object(self.ml_utils.ocr_processor, 'process_image',
+                               side_effect=self.ocr_by_image.get) as process_image:
+            results = self.ml_utils.process_product_images(self.images, 'Maggi', **kwargs)
+        return results, process_image
+
+    def test_view_ordering_puts_back_first(self):
+        self.assertEqual(self.ml_utils.order_views_for_ocr(['front', 'side', 'back']),
+                         ['back', 'side', 'front'])
+
+    def test_ocr_stops_once_required_fields_found(self):
+        results, process_image = self._run()
+        process_image.assert_called_once_with(b'back', 'back')
+        self.assertEqual(results['ocr_skipped_views'], ['side', 'front'])
+        self.assertTrue(results['brand_match'])
+        self.assertEqual(set(results['detailed_analysis']), {'front', 'back', 'side'})
+
+    def test_full_scan_ocrs_every_view(self):
+        results, process_image = self._run(full_scan=True)
+        self.assertEqual(process_image.call_count, 3)
+        self.assertEqual(results['ocr_skipped_views'], [])
+
+    def test_deferred_ocr_returns_ml_verdict_only(self):
+        results, process_image = self._run(defer_ocr=True)
+        process_image.assert_not_called()
+        self.assertEqual(results['ocr_status'], 'pending')
+        self.assertFalse(results['brand_match'])
+        self.assertEqual(set(results['detailed_analysis']), {'front', 'back', 'side'})
+
+    def test_precomputed_predictions_skip_the_model(self):
+        predictions = {view_type: ('FAKE', 0.7) for view_type in self.images}
+        with mock.patch.object(self.ml_utils.ml_predictor, 'predict_single') as predict_single:
+            results, _ = self._run(predictions=predictions)
+        predict_single.assert_not_called()
+        self.assertEqual(results['overall_prediction'], 'FAKE')
+
+    def test_ocr_profiles_follow_view_type(self):
+        processor = self.ml_utils.ocr_processor
+        self.assertEqual(processor.get_profile('front')['psm'], 11)
+        self.assertEqual(processor.get_profile('unknown'), processor.get_profile('default'))
+        config = processor.build_config(processor.get_profile('barcode'))
+        self.assertIn('--psm 7', config)
+        self.assertIn('tessedit_char_whitelist=0123456789', config)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, IMAGE_QUALITY_GATE='reject', IMAGE_QUALITY_MIN_SIDE=320,
+                   IMAGE_QUALITY_MIN_SHARPNESS=50, IMAGE_QUALITY_MIN_BRIGHTNESS=40, IMAGE_QUALITY_MAX_CLIPPED=0.6)
+class ImageQualityTests(APITestCase):
+    def setUp(self):
+        self.sharp = cv2.imdecode(np.frombuffer(make_image_file(color='orange').read(), np.uint8), cv2.IMREAD_COLOR)
+
+    def test_sharp_well_exposed_image_passes(self):
+        self.assertEqual(check_image_quality({'front': make_image_file().read(), 'back': self.sharp}), {})
+
+    def test_blurred_dark_and_small_images_get_actionable_messages(self):
+        issues = check_image_quality({
+            'front': cv2.GaussianBlur(self.sharp, (0, 0), 8),
+            'back': self.sharp // 8,
+            'side': make_image_file(size=(200, 150)).read(),
+        })
+
+        self.assertEqual(issues['front'], ['Image is blurry. Hold the camera steady and tap the label to focus'])
+        # Underexposure also flattens contrast, so the dark view may read as blurred too
+        self.assertIn('Image is too dark. Add light or move out of the shadow', issues['back'])
+        self.assertIn('200x150', issues['side'][0])
+
+    def test_undecodable_image_is_left_to_the_pipeline(self):
+        self.assertEqual(check_image_quality({'front': b'front'}), {})
+
+    def test_poor_upload_is_rejected_before_storing(self):
+        with mock.patch('detector.utils.analysis.process_product_images') as pipeline:
+            response = self.client.post(reverse('detector:detect_food'), {
+                'brand_name': 'Maggi',
+                'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg', size=(200, 150))],
+                'view_types[]': ['front', 'back'],
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(list(response.data['quality_issues']), ['back'])
+        self.assertIn('back', response.data['error'])
+        pipeline.assert_not_called()
+        self.assertFalse(FoodProduct.objects.exists())
+
+    @override_settings(IMAGE_QUALITY_GATE='flag')
+    def test_flagged_views_are_reported_and_left_out_of_ocr(self):
+        from detector.utils import ml_utils
+        ocr = {'texts': {}, 'ocr_results': {}, 'skipped_views': [], 'brand_match': False}
+        events = []
+        with mock.patch.object(ml_utils, 'run_ocr_stage', return_value=ocr) as run_ocr_stage:
+            results = ml_utils.process_product_images(
+                {'front': self.sharp, 'back': cv2.GaussianBlur(self.sharp, (0, 0), 8)}, 'Maggi',
+                on_event=lambda stage, data: events.append(stage)
+            )
+
+        self.assertEqual(list(run_ocr_stage.call_args.args[0]), ['front'])
+        self.assertEqual(list(results['quality_issues']), ['back'])
+        self.assertEqual(set(results['detailed_analysis']), {'front', 'back'})
+        self.assertEqual(events[0], 'quality')
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AnalysisJobQueueTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('detector:detect_food')
+
+    def _submit_job(self):
+        return self.client.post(self.url, {
+            'brand_name': 'Maggi',
+            'mode': 'job',
+            'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg')],
+            'view_types[]': ['front', 'back'],
+        }, format='multipart')
+
+    def test_job_mode_returns_202_with_status_url(self):
+        response = self._submit_job()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(response['Location'], response.data['status_url'])
+
+        status_response = self.client.get(response.data['status_url'])
+        self.assertEqual(status_response.data['status'], 'queued')
+        self.assertNotIn('result', status_response.data)
+
+    def test_worker_claims_and_completes_job(self):
+        from .utils import job_queue
+
+        product_id = self._submit_job().data['product_id']
+        job = job_queue.claim_next_job('test-worker')
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job_queue.claim_next_job('other-worker'))
+
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])):
+            job_queue.run_job(job)
+
+        product = FoodProduct.objects.get(pk=product_id)
+        self.assertEqual(product.final_prediction, 'REAL')
+        self.assertEqual(set(product.images.values_list('detected_text', flat=True)),
+                         {'front text', 'back text'})
+
+        response = self.client.get(reverse('detector:analysis_status', kwargs={'pk': product_id}))
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['result']['final_prediction'], 'REAL')
+        self.assertEqual(list(product.events.values_list('stage', flat=True)), ['received', 'verdict'])
+
+    def test_deferred_ocr_is_enriched_by_worker(self):
+        from .utils import job_queue
+        from .utils.analysis import analyze_product
+
+        product = FoodProduct.objects.get(pk=self._submit_job().data['product_id'])
+        AnalysisJob.objects.all().delete()
+        deferred = fake_pipeline_results(['front', 'back'])
+        deferred.update(brand_match=False, ocr_status='pending', ocr_results={})
+        with mock.patch('detector.utils.analysis.process_product_images', return_value=deferred):
+            analyze_product(product, defer_ocr=True)
+
+        product.refresh_from_db()
+        self.assertEqual(product.ocr_status, 'pending')
+        self.assertEqual(product.final_prediction, 'REAL')
+        response = self.client.get(reverse('detector:analysis_status', kwargs={'pk': product.pk}))
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['ocr_status'], 'pending')
+
+        job = job_queue.claim_next_job('test-worker')
+        self.assertEqual(job.kind, 'ocr')
+        ocr = {'ocr_results': {'extracted_brands': ['MAGGI']}, 'brand_match': True,
+               'texts': {'back': 'maggi'}, 'skipped_views': ['front']}
+        with mock.patch('detector.utils.analysis.run_ocr_stage', return_value=ocr):
+            job_queue.run_job(job)
+
+        product.refresh_from_db()
+        self.assertEqual(product.ocr_status, 'completed')
+        self.assertTrue(product.brand_match)
+        self.assertEqual(product.images.get(view_type='back').detected_text, 'maggi')
+        self.assertEqual(list(product.events.values_list('stage', flat=True)), ['received', 'ocr'])
+
+    def test_ocr_is_only_deferred_while_a_worker_is_alive(self):
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import DetectionWorker
+        from .utils.analysis import analyze_product
+
+        product = FoodProduct.objects.get(pk=self._submit_job().data['product_id'])
+        AnalysisJob.objects.all().delete()
+        with mock.patch('detector.utils.analysis.ocr_backlogged', return_value=True), \
+                mock.patch('detector.utils.analysis.process_product_images',
+                           return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            # No worker would ever pick up an OCR job
+            analyze_product(product)
+            self.assertFalse(pipeline.call_args.kwargs['defer_ocr'])
+
+            call_command('run_detection_worker', '--once', stdout=io.StringIO())
+            analyze_product(product)
+            self.assertTrue(pipeline.call_args.kwargs['defer_ocr'])
+
+            DetectionWorker.objects.update(last_seen=timezone.now() - timezone.timedelta(hours=1))
+            analyze_product(product)
+            self.assertFalse(pipeline.call_args.kwargs['defer_ocr'])
+
+    def test_stale_running_job_is_requeued(self):
+        from django.utils import timezone
+        from .utils import job_queue
+
+        self._submit_job()
+        job = job_queue.claim_next_job('dead-worker')
+        AnalysisJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(job_queue.requeue_stale_jobs(), 1)
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).status, 'queued')
+
+    def test_requeued_job_is_not_finished_by_its_old_worker(self):
+        from django.utils import timezone
+        from .utils import job_queue
+
+        self._submit_job()
+        job = job_queue.claim_next_job('slow-worker')
+        AnalysisJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timezone.timedelta(hours=1))
+        job_queue.requeue_stale_jobs()
+        self.assertEqual(job_queue.claim_next_job('second-worker').pk, job.pk)
+        self.assertFalse(job_queue.touch_job(job))
+
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])):
+            job_queue.run_job(job)
+
+        stored = AnalysisJob.objects.get(pk=job.pk)
+        self.assertEqual((stored.status, stored.worker_id), ('running', 'second-worker'))
+        self.assertIsNone(stored.finished_at)
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, DETECTION_JOB_LOCK_TIMEOUT=1, DETECTION_JOB_HEARTBEAT_INTERVAL=0.05)
+class AnalysisJobHeartbeatTests(TransactionTestCase):
+    def test_long_job_keeps_its_lock(self):
+        from .utils import job_queue
+
+        job = job_queue.enqueue_analysis(FoodProduct.objects.create(brand_name='Maggi'))
+        job = job_queue.claim_next_job('slow-worker')
+
+        def slow_pipeline(*args, **kwargs):
+            time.sleep(1.5)
+            # A stale sweep by another worker midway finds the lock fresh
+            self.assertEqual(job_queue.requeue_stale_jobs(), 0)
+            return fake_pipeline_results([])
+
+        with mock.patch('detector.utils.analysis.process_product_images', side_effect=slow_pipeline):
+            job_queue.run_job(job)
+
+        stored = AnalysisJob.objects.get(pk=job.pk)
+        self.assertEqual((stored.status, stored.attempts), ('completed', 1))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class FoodDetectorPipelineTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('detector:detect_food')
+
+    def _submit(self, **extra):
+        return self.client.post(self.url, {
+            'brand_name': 'Maggi',
+            'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg')],
+            'view_types[]': ['front', 'back'],
+        }, format='multipart', **extra)
+
+    def test_post_runs_real_pipeline(self):
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            response = self._submit()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        images, brand_name = pipeline.call_args.args
+        self.assertEqual(set(images), {'front', 'back'})
+        # Decoded by the streaming upload handler, not re-read from request.FILES
+        self.assertEqual(images['front'].shape, (480, 640, 3))
+        self.assertEqual(brand_name, 'Maggi')
+        self.assertEqual(response.data['final_prediction'], 'REAL')
+        self.assertEqual(response.data['processing_time'], 0.5)
+        self.assertTrue(response.data['brand_match'])
+        self.assertEqual({image['detected_text'] for image in response.data['images']},
+                         {'front text', 'back text'})
+
+    def test_quality_gate_and_pipeline_share_one_decode(self):
+        from .utils.ml_utils import decode_image
+
+        # Nothing prefetched, the view decodes each upload itself
+        with mock.patch('detector.utils.upload_handlers.decode_executor.try_submit', return_value=None), \
+                mock.patch('detector.views.decode_image', side_effect=decode_image) as decode, \
+                mock.patch('detector.utils.image_quality.read_image_header') as gate_decode, \
+                mock.patch('detector.utils.analysis.process_product_images',
+                           return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            response = self._submit()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(decode.call_count, 2)
+        gate_decode.assert_not_called()
+        images, _ = pipeline.call_args.args
+        self.assertEqual(images['front'].shape, (480, 640, 3))
+
+    def test_busy_slots_fall_back_to_job_queue(self):
+        from .utils.concurrency import CapacityExceeded
+
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        side_effect=CapacityExceeded('busy')):
+            response = self._submit()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(AnalysisJob.objects.get().product_id, response.data['product_id'])
+
+    def test_get_advertises_upload_limits(self):
+        response = self.client.get(self.url)
+
+        limits = response.data['upload_limits']
+        self.assertEqual(limits['max_dimension'], settings.UPLOAD_MAX_DIMENSION)
+        self.assertEqual(limits['max_file_size'], settings.MAX_IMAGE_SIZE)
+        self.assertIn('image/webp', limits['output_formats'])
+        self.assertIn('image/webp', response.data['supported_formats'])
+
+    def test_post_accepts_webp(self):
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front'])) as pipeline:
+            response = self.client.post(self.url, {
+                'brand_name': 'Maggi',
+                'images[]': [make_image_file('front.webp', image_format='WEBP')],
+                'view_types[]': ['front'],
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        images, _ = pipeline.call_args.args
+        self.assertEqual(images['front'].shape, (480, 640, 3))
+
+    def test_saturated_server_sheds_with_retry_after(self):
+        from .utils.concurrency import AdmissionController
+
+        saturated = AdmissionController('detection', max_cost=1, max_queue=0, timeout=1)
+        saturated.acquire(1)
+        with mock.patch('detector.views.detection_admission', saturated), \
+                mock.patch('detector.utils.upload_handlers.detection_admission', saturated), \
+                mock.patch('detector.utils.upload_handlers.decode_executor') as prefetch, \
+                mock.patch('detector.views.check_upload_quality') as quality_gate, \
+                mock.patch('detector.views.upload_digest') as digest:
+            response = self._submit()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(FoodProduct.objects.exists())
+        # Shed before any image was decoded or hashed
+        prefetch.try_submit.assert_not_called()
+        quality_gate.assert_not_called()
+        digest.assert_not_called()
+
+    def _login(self):
+        user = CustomUser.objects.create_user('keys@example.com', 'Ke', 'Ys', password='secret')
+        self.client.force_authenticate(user)
+        return user
+
+    def test_idempotency_key_replays_first_submission(self):
+        self._login()
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            first = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+            retry = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+            fresh = self._submit(HTTP_IDEMPOTENCY_KEY='retry-2')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        # A new key is a deliberate new submission of the same images
+        self.assertEqual(fresh.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(pipeline.call_count, 2)
+
+    def test_idempotency_keys_are_scoped_and_bound_to_their_payload(self):
+        # Anonymous clients would all share one key namespace
+        response = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(FoodProduct.objects.exists())
+
+        self._login()
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            first = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+            reused = self.client.post(self.url, {
+                'brand_name': 'Amul',
+                'images[]': [make_image_file('front.jpg', color='red'), make_image_file('back.jpg')],
+                'view_types[]': ['front', 'back'],
+            }, format='multipart', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(reused.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertNotIn('id', reused.data)
+        self.assertEqual(FoodProduct.objects.count(), 1)
+        pipeline.assert_called_once()
+
+    def test_identical_uploads_share_one_analysis(self):
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])) as pipeline:
+            first = self._submit()
+            duplicate = self._submit()
+
+        self.assertEqual(duplicate.data['id'], first.data['id'])
+        self.assertEqual(FoodProduct.objects.count(), 1)
+        pipeline.assert_called_once()
+
+    def test_failed_analysis_is_not_replayed(self):
+        self._login()
+        with mock.patch('detector.utils.analysis.process_product_images', side_effect=RuntimeError):
+            failed = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])):
+            retry = self._submit(HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(failed.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+
+    def test_extreme_aspect_ratio_rejected_before_decode(self):
+        with mock.patch('detector.utils.upload_handlers.decode_image') as decode:
+            response = self.client.post(self.url, {
+                'brand_name': 'Maggi',
+                'images[]': [make_image_file('strip.jpg', size=(2000, 10))],
+                'view_types[]': ['front'],
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('strip.jpg', response.data['error'])
+        decode.assert_not_called()
+
+    def test_stored_images_carry_header_metadata(self):
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])):
+            response = self._submit()
+
+        image = FoodImage.objects.get(pk=response.data['images'][0]['id'])
+        self.assertEqual((image.image_width, image.image_height, image.orientation), (640, 480, 1))
+        self.assertEqual(image.file_size, image.image.size)
+
+    @override_settings(DETECTION_INLINE_MAX_PIXELS=1000)
+    def test_very_large_upload_is_queued(self):
+        response = self._submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_duplicate_view_types_rejected(self):
+        response = self.client.post(self.url, {
+            'brand_name': 'Maggi',
+            'images[]': [make_image_file('a.jpg'), make_image_file('b.jpg')],
+            'view_types[]': ['front', 'front'],
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SlotBudgetTests(SimpleTestCase):
+    def test_acquire_times_out_when_exhausted(self):
+        from .utils.concurrency import CapacityExceeded, SlotBudget
+
+        budget = SlotBudget('test', slots=1, timeout=0.01)
+        with budget.acquire():
+            with self.assertRaises(CapacityExceeded):
+                with budget.acquire():
+                    pass
+        with budget.acquire():
+            pass
+
+    @override_settings(DETECTION_OCR_DEFER_LATENCY=0.5, DETECTION_OCR_LATENCY_WINDOW=30)
+    def test_ocr_backlog_follows_recent_slot_wait(self):
+        from .utils import concurrency
+
+        with mock.patch.object(concurrency.ocr_slots, 'average_wait', 2.0), \
+                mock.patch.object(concurrency.ocr_slots, 'last_wait_at', time.monotonic()):
+            self.assertTrue(concurrency.ocr_backlogged())
+        # A stale sample no longer counts
+        with mock.patch.object(concurrency.ocr_slots, 'average_wait', 2.0), \
+                mock.patch.object(concurrency.ocr_slots, 'last_wait_at', time.monotonic() - 60):
+            self.assertFalse(concurrency.ocr_backlogged())
+
+
+class ImageHeaderTests(SimpleTestCase):
+    def _encode(self, image_format, size=(64, 48), **params):
+        buffer = io.BytesIO()
+        Image.new('RGB', size).save(buffer, format=image_format, **params)
+        buffer.seek(0)
+        return buffer
+
+    def test_reads_dimensions_without_decoding(self):
+        from .utils.image_headers import read_image_header
+
+        for image_format, params in [('JPEG', {}), ('JPEG', {'progressive': True}), ('PNG', {}),
+                                     ('WEBP', {}), ('WEBP', {'lossless': True})]:
+            header = read_image_header(self._encode(image_format, **params))
+            self.assertEqual((header.format, header.width, header.height),
+                             (image_format.lower(), 64, 48), (image_format, params))
+
+    def test_reads_exif_orientation(self):
+        from .utils.image_headers import read_image_header
+
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        self.assertEqual(read_image_header(self._encode('JPEG', exif=exif)).orientation, 6)
+        self.assertEqual(read_image_header(self._encode('JPEG')).orientation, 1)
+
+    def test_rejects_unknown_and_extreme_images(self):
+        from .utils.image_headers import validate_image_header
+
+        with self.assertRaises(ValueError):
+            validate_image_header(io.BytesIO(b'GIF89a' + b'\x00' * 20))
+        with self.assertRaises(ValueError):
+            validate_image_header(io.BytesIO(self._encode('JPEG').getvalue()[:20]))
+        with self.assertRaisesMessage(ValueError, 'aspect ratio'):
+            validate_image_header(self._encode('PNG', size=(2000, 10)))
+
+
+class SubmissionGuardTests(SimpleTestCase):
+    @override_settings(DETECTION_COALESCE_TIMEOUT=0.01)
+    def test_identical_submission_waits_for_the_first(self):
+        import threading
+        from .utils.idempotency import SubmissionGuard
+
+        guard = SubmissionGuard()
+        results = []
+
+        def twin():
+            with guard.hold('abc') as twin_acquired:
+                results.append(twin_acquired)
+
+        with guard.hold('abc') as acquired:
+            self.assertTrue(acquired)
+            waiter = threading.Thread(target=twin)
+            waiter.start()
+            waiter.join()
+            with guard.hold('other') as other_acquired:
+                self.assertTrue(other_acquired)
+        # The twin gave up waiting and checks the database instead
+        self.assertEqual(results, [False])
+
+    def test_digest_ignores_upload_order_and_names(self):
+        from .utils.idempotency import upload_digest
+
+        first = upload_digest(None, 'Maggi', ['front', 'back'],
+                              [make_image_file('a.jpg'), make_image_file('b.jpg', color='red')])
+        reordered = upload_digest(None, 'maggi ', ['back', 'front'],
+                                  [make_image_file('x.jpg', color='red'), make_image_file('y.jpg')])
+        swapped = upload_digest(None, 'Maggi', ['front', 'back'],
+                                [make_image_file('a.jpg', color='red'), make_image_file('b.jpg')])
+        self.assertEqual(first, reordered)
+        self.assertNotEqual(first, swapped)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def test_cost_is_weighted_and_clamped(self):
+        from .utils.concurrency import AdmissionController
+
+        admission = AdmissionController('test', max_cost=4, max_queue=0, timeout=0.01)
+        with admission.admit(3):
+            self.assertEqual(admission.in_flight, 3)
+        # A request larger than the whole budget still runs, alone
+        with admission.admit(10):
+            self.assertEqual(admission.in_flight, 4)
+        self.assertEqual(admission.in_flight, 0)
+
+    def test_full_queue_is_shed_with_429(self):
+        from .utils.concurrency import AdmissionController, Overloaded
+
+        admission = AdmissionController('test', max_cost=2, max_queue=0, timeout=1)
+        with admission.admit(2):
+            with self.assertRaises(Overloaded) as raised:
+                admission.acquire(1)
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+    def test_queued_request_times_out_with_503(self):
+        from .utils.concurrency import AdmissionController, Overloaded
+
+        admission = AdmissionController('test', max_cost=2, max_queue=1, timeout=0.01)
+        with admission.admit(2):
+            with self.assertRaises(Overloaded) as raised:
+                admission.acquire(1)
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(admission.waiting, 0)
+
+    def test_decode_queue_drops_optional_work_when_full(self):
+        import threading
+        from .utils.concurrency import BoundedExecutor
+
+        release = threading.Event()
+        executor = BoundedExecutor(max_workers=1, max_pending=2)
+        self.addCleanup(executor.shutdown)
+        first = executor.try_submit(release.wait)
+        second = executor.try_submit(release.wait)
+        self.assertIsNone(executor.try_submit(release.wait))
+
+        release.set()
+        first.result()
+        second.result()
+        self.assertIsNotNone(executor.try_submit(int))
+
+
+class PreprocessingUploadHandlerTests(SimpleTestCase):
+    def test_image_parts_are_decoded_in_upload_order(self):
+        from .utils.upload_handlers import PreprocessingUploadHandler
+
+        handler = PreprocessingUploadHandler()
+        parts = [('images[]', make_image_file(size=(30, 20))), ('other', make_image_file()),
+                 ('images[]', SimpleUploadedFile('bad.jpg', b'not an image'))]
+        for field_name, upload in parts:
+            handler.new_file(field_name, upload.name, upload.content_type, upload.size)
+            data = upload.read()
+            self.assertEqual(handler.receive_data_chunk(data, 0), data)
+            self.assertIsNone(handler.file_complete(len(data)))
+
+        decoded = handler.decoded_images()
+        self.assertEqual(len(decoded), 2)
+        self.assertEqual(decoded[0].shape, (20, 30, 3))
+        self.assertIsNone(decoded[1])
+
+    def test_no_prefetch_while_detection_is_saturated(self):
+        from .utils.upload_handlers import PreprocessingUploadHandler
+
+        handler = PreprocessingUploadHandler()
+        upload = make_image_file(size=(30, 20))
+        with mock.patch('detector.utils.upload_handlers.detection_admission') as admission:
+            admission.saturated.return_value = True
+            handler.new_file('images[]', upload.name, upload.content_type, upload.size)
+            data = upload.read()
+            handler.receive_data_chunk(data, 0)
+            handler.file_complete(len(data))
+
+        self.assertEqual(handler.decoded_images(), [None])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ProductReadApiTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('reader@example.com', 'Read', 'Er', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def _create_products(self, count):
+        for _ in range(count):
+            product = FoodProduct.objects.create(user=self.user, brand_name='Maggi', final_prediction='REAL')
+            for view_type in ('front', 'back'):
+                FoodImage.objects.create(product=product, image=make_image_file(f'{view_type}.jpg'),
+                                         view_type=view_type, detected_text='long label text')
+        return product
+
+    def _count_list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_list_query_count_is_constant_per_page(self):
+        url = reverse('detector:product_list')
+        self._create_products(2)
+        few, _ = self._count_list_queries(url)
+        self._create_products(4)
+        many, response = self._count_list_queries(url)
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(response.data['results'][0]['images_count'], 2)
+
+        few, _ = self._count_list_queries(url + '?view=compact')
+        self._create_products(1)
+        many, response = self._count_list_queries(url + '?view=compact')
+        self.assertEqual(few, many)
+        self.assertNotIn('detected_text', response.data['results'][0]['images'][0])
+
+    def test_detail_field_selection(self):
+        product = self._create_products(1)
+        url = reverse('detector:product_detail', kwargs={'pk': product.pk})
+
+        response = self.client.get(url, {'fields': 'id,final_prediction'})
+        self.assertEqual(response.data, {'id': product.pk, 'final_prediction': 'REAL'})
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['images'][0]['detected_text'], 'long label text')
+
+    def test_other_users_products_are_hidden(self):
+        product = self._create_products(1)
+        other = CustomUser.objects.create_user('other@example.com', 'Oth', 'Er', password='secret')
+        self.client.force_authenticate(other)
+
+        response = self.client.get(reverse('detector:product_detail', kwargs={'pk': product.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('detector:product_list')).data['count'], 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Checks SQLite EXPLAIN QUERY PLAN output')
+class QueryPlanTests(TestCase):
+    """Hot per-user and moderation queries are served by their composite indexes"""
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('planner@example.com', 'Plan', 'Ner', password='secret')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        # Rows come out of the index already ordered, no sort pass
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_per_user_queries(self):
+        self.assertUsesIndex(FoodProduct.objects.filter(user=self.user).order_by('-created_at')[:5],
+                             'foodproduct_user_created_idx')
+        self.assertUsesIndex(FoodProduct.objects.filter(user=self.user, final_prediction='FAKE').order_by(),
+                             'foodproduct_user_verdict_idx')
+        self.assertUsesIndex(UserActivity.objects.filter(user=self.user).order_by('-timestamp')[:10],
+                             'useractivity_user_time_idx')
+
+    def test_moderation_queries(self):
+        self.assertUsesIndex(MediaItem.objects.filter(status='pending').order_by('-created_at'),
+                             'mediaitem_status_created_idx')
+        self.assertUsesIndex(GalleryItem.objects.filter(status='approved').order_by('-created_at'),
+                             'galleryitem_status_created_idx')
+
+class UserAnalysisStatsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('stats@example.com', 'Sta', 'Ts', password='secret')
+
+    def stats(self):
+        stats = UserAnalysisStats.objects.get(user=self.user)
+        return stats.total_analyses, stats.fake_count, stats.real_count
+
+    def test_counts_follow_creation_verdicts_and_deletes(self):
+        product = FoodProduct.objects.create(user=self.user, brand_name='Maggi')
+        self.assertEqual(self.stats(), (1, 0, 0))
+        self.assertEqual(UserAnalysisStats.objects.get(user=self.user).last_analysis_at, product.created_at)
+
+        apply_analysis_results(product, fake_pipeline_results(['front']) | {'overall_prediction': 'FAKE'})
+        self.assertEqual(self.stats(), (1, 1, 0))
+        # Re-verdict moves the count, OCR enrichment leaves it alone
+        product.final_prediction = 'REAL'
+        product.save()
+        product.ocr_status = 'completed'
+        product.save(update_fields=['ocr_status'])
+        FoodProduct.objects.create(user=self.user, brand_name='Lays', final_prediction='Fake')
+        self.assertEqual(self.stats(), (2, 1, 1))
+
+        product.delete()
+        self.assertEqual(self.stats(), (1, 1, 0))
+
+    def test_deferred_verdict_is_read_before_update(self):
+        FoodProduct.objects.create(user=self.user, brand_name='Maggi', final_prediction='FAKE')
+        product = FoodProduct.objects.only('id', 'user').get()
+        product.final_prediction = 'REAL'
+        product.save(update_fields=['final_prediction'])
+        self.assertEqual(self.stats(), (1, 0, 1))
+
+    def test_dashboard_reads_stats_row(self):
+        for verdict in ('FAKE', 'FAKE', 'REAL'):
+            FoodProduct.objects.create(user=self.user, brand_name='Maggi', final_prediction=verdict)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('detector:dashboard'))
+
+        self.assertEqual(response.context['total_analyses'], 3)
+        self.assertEqual(response.context['fake_products'], 2)
+        self.assertEqual(response.context['real_products'], 1)
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class MediaAdminDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('admin@example.com', 'Ad', 'Min', password='secret', is_staff=True)
+        Advertisement.objects.create(title='Ad', description='d', file=make_image_file('ad.jpg'),
+                                     content_type='banner', uploaded_by=self.user, is_active=False)
+        GalleryItem.objects.create(title='G', description='d', category='comparison', is_featured=True,
+                                   image=make_image_file('g.jpg'))
+
+    def test_counts_take_one_query_per_model_and_are_cached(self):
+        with self.assertNumQueries(3):
+            counts = media_counts()
+        with self.assertNumQueries(0):
+            self.assertEqual(media_counts(), counts)
+        self.assertEqual((counts['total_advertisements'], counts['active_advertisements']), (1, 0))
+        self.assertEqual((counts['total_gallery_items'], counts['featured_gallery_items']), (1, 1))
+        self.assertEqual(counts['total_media_items'], 0)
+
+    def test_saves_and_deletes_invalidate_counts(self):
+        media_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            ad = Advertisement.objects.create(title='Ad 2', description='d', file=make_image_file('ad2.jpg'),
+                                              content_type='banner', uploaded_by=self.user)
+        self.assertEqual(media_counts()['active_advertisements'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ad.delete()
+        self.assertEqual(media_counts()['total_advertisements'], 1)
+
+    def test_dashboard_renders_cached_counts(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('detector:admin_dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['featured_gallery_items'], 1)
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Needs the FTS5 or tsvector index')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('search@example.com', 'Sea', 'Rch', password='secret')
+        self.maggi = FoodProduct.objects.create(user=self.user, brand_name='Maggi Noodles', final_prediction='REAL')
+        self.lays = FoodProduct.objects.create(user=self.user, brand_name='Lays',
+                                               analysis_notes='Packed like maggi, different font')
+        self.label = FoodImage.objects.create(product=self.lays, image=make_image_file('back.jpg'), view_type='back',
+                                              detected_text='BATCH NO AB123 MRP 20')
+
+    def search(self, query, queryset=None):
+        return list(full_text_search(queryset or FoodProduct.objects.all(), query))
+
+    def test_prefix_matches_rank_brand_above_notes(self):
+        self.assertEqual(self.search('mag'), [self.maggi, self.lays])
+        self.assertEqual(self.search('maggi noodles'), [self.maggi])
+        self.assertEqual(self.search('"*) OR'), [])
+
+    def test_substring_searches_that_still_match(self):
+        # Queries the former icontains search answered: whole and partial words, any case
+        self.assertEqual(self.search('Maggi Noodles'), [self.maggi])
+        self.assertEqual(self.search('MAGGI'), [self.maggi, self.lays])
+        self.assertEqual(self.search('nood'), [self.maggi])
+        self.assertEqual(self.search('la'), [self.lays])
+        self.assertEqual(self.search('different font'), [self.lays])
+        # Words no longer need to be adjacent or in order
+        self.assertEqual(self.search('noodles maggi'), [self.maggi])
+        self.assertEqual(self.search('maggi font'), [self.lays])
+
+    def test_ocr_text_follows_image_changes(self):
+        self.assertEqual(self.search('ab123'), [self.lays])
+
+        self.label.detected_text = 'EXP 01/2026'
+        FoodImage.objects.bulk_update([self.label], ['detected_text'])
+        self.assertEqual(self.search('ab123'), [])
+        self.assertEqual(self.search('exp 2026'), [self.lays])
+
+        self.lays.delete()
+        self.assertEqual(self.search('exp'), [])
+
+    def test_media_tags_and_analyses_page(self):
+        item = MediaItem.objects.create(title='Label guide', description='How to read labels', media_type='document',
+                                        status='approved', file=make_image_file('guide.jpg'))
+        item.tags.set(Tag.objects.for_names(['counterfeit']))
+        self.assertEqual(self.search('counterfeit', MediaItem.objects.all()), [item])
+
+        Tag.objects.filter(name='counterfeit').update(name='fake')
+        self.assertEqual(self.search('counterfeit', MediaItem.objects.all()), [])
+        self.assertEqual(self.search('fake', MediaItem.objects.all()), [item])
+        item.tags.clear()
+        self.assertEqual(self.search('fake', MediaItem.objects.all()), [])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('detector:analyses'), {'search': 'maggi'})
+        self.assertEqual(response.context['total_analyses'], 2)
+        self.assertEqual(list(response.context['products']), [self.maggi, self.lays])
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class MediaTagTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('tags@example.com', 'Ta', 'Gs', password='secret', is_staff=True)
+
+    def _item(self, title, tags, status='approved', media_type='image'):
+        item = MediaItem.objects.create(title=title, description='d', media_type=media_type, status=status,
+                                        file=make_image_file(f'{title}.jpg'))
+        item.tags.set(Tag.objects.for_names(tags))
+        return item
+
+    def test_names_are_normalised_and_shared(self):
+        first = Tag.objects.for_names(['FSSAI ', 'food  safety', 'fssai', ''])
+        second = Tag.objects.for_names(['Fssai'])
+
+        self.assertEqual(sorted(tag.name for tag in first), ['food safety', 'fssai'])
+        self.assertEqual(second, [tag for tag in first if tag.name == 'fssai'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_facets_count_matching_items(self):
+        self._item('a', ['fssai', 'milk'])
+        self._item('b', ['fssai'], media_type='video')
+        self._item('c', ['fssai', 'milk'], status='pending')
+
+        facets = Tag.objects.facets(10, status='approved')
+        self.assertEqual([(tag.name, tag.item_count) for tag in facets], [('fssai', 2), ('milk', 1)])
+        facets = Tag.objects.facets(1, status='approved', media_type='video')
+        self.assertEqual([(tag.name, tag.item_count) for tag in facets], [('fssai', 1)])
+
+    def test_library_filters_by_tag(self):
+        milk = self._item('milk', ['Dairy', 'fssai'])
+        self._item('chips', ['fssai'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('detector:media_library'), {'tag': 'DAIRY'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['media_items']), [milk])
+        self.assertEqual([(tag.name, tag.item_count) for tag in response.context['tag_facets']],
+                         [('fssai', 2), ('dairy', 1)])
+        self.assertContains(response, '#dairy')
+        # Tags of the whole page come from one prefetch query
+        self.assertLessEqual(len(queries), 4)
+
+    def test_form_saves_tags(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('detector:admin_media_create'), {
+            'title': 'Guide', 'description': 'd', 'media_type': 'image', 'tags_input': 'FSSAI, labels ,fssai',
+            'file': make_image_file('guide.jpg'),
+        })
+        self.assertEqual(response.status_code, 302)
+        item = MediaItem.objects.get(title='Guide')
+        self.assertEqual([tag.name for tag in item.tags.all()], ['fssai', 'labels'])
+
+        self.client.post(reverse('detector:admin_media_update', args=[item.pk]), {
+            'title': 'Guide', 'description': 'd', 'media_type': 'image', 'tags_input': 'labels',
+        })
+        self.assertEqual([tag.name for tag in item.tags.all()], ['labels'])
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.product = FoodProduct.objects.create(brand_name='Maggi')
+
+    def _image(self, name='front.jpg', color='white'):
+        return FoodImage.objects.create(product=self.product, image=make_image_file(name, color=color))
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self._image('front.jpg')
+        second = self._image('copy.JPG')
+        gallery = GalleryItem.objects.create(title='t', description='d', category='comparison',
+                                             image=make_image_file('gallery.jpg'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image.name, gallery.image.name)
+        self.assertRegex(first.image.name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(StoredBlob.objects.get(name=first.image.name).ref_count, 3)
+
+    def test_file_is_removed_with_last_reference(self):
+        first = self._image()
+        second = self._image()
+        name = first.image.name
+        storage = first.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        item = GalleryItem.objects.create(title='t', description='d', category='comparison',
+                                          image=make_image_file('old.jpg'))
+        item = GalleryItem.objects.get(pk=item.pk)
+        old_name = item.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.image = make_image_file('new.jpg', color='red')
+            item.save()
+        self.assertNotEqual(item.image.name, old_name)
+        self.assertFalse(item.image.storage.exists(old_name))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, IMAGE_RENDITIONS={'thumb': 40, 'medium': 80})
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        self.item = GalleryItem.objects.create(title='Maggi', description='d', category='comparison',
+                                               image=make_image_file('wide.jpg', size=(200, 100), color='orange'))
+        # Renditions outlive the rolled back blob rows between tests
+        delete_renditions(self.item.image.name)
+
+    def test_rendition_is_generated_once_and_bounded_by_width(self):
+        name = get_rendition(self.item.image.name, 'thumb', 'webp')
+        self.assertRegex(name, r'^renditions/[0-9a-f]{2}/[0-9a-f]{64}_40\.webp$')
+        with default_storage.open(name) as rendition:
+            self.assertEqual(Image.open(rendition).size, (40, 20))
+
+        with mock.patch('detector.utils.derivatives.render') as render:
+            self.assertEqual(get_rendition(self.item.image.name, 'thumb', 'webp'), name)
+        render.assert_not_called()
+
+    def test_view_generates_missing_rendition(self):
+        self.item.status = 'approved'
+        self.item.save()
+        url = reverse('detector:media_rendition', args=['medium', 'jpeg', self.item.image.name])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (80, 40))
+        self.assertEqual(self.client.get(url.replace('medium', 'huge')).status_code, 404)
+        self.assertEqual(self.client.get(url.replace('medium', '4000')).status_code, 404)
+
+    def test_view_renders_only_files_the_reader_may_see(self):
+        url = reverse('detector:media_rendition', args=['medium', 'jpeg', self.item.image.name])
+        cached = get_rendition(self.item.image.name, 'thumb', 'jpeg')
+        with mock.patch('detector.utils.derivatives.render') as render:
+            # Pending gallery item, a file no row references and a rendition of a rendition
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(
+                reverse('detector:media_rendition', args=['thumb', 'jpeg', 'blobs/00/00/unknown.jpg'])
+            ).status_code, 404)
+            self.assertEqual(self.client.get(
+                reverse('detector:media_rendition', args=['thumb', 'jpeg', cached])
+            ).status_code, 404)
+        render.assert_not_called()
+
+        staff = CustomUser.objects.create_user('staff@example.com', 'St', 'Aff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_responsive_image_tag_links_cached_renditions(self):
+        cached = get_rendition(self.item.image.name, 'thumb', 'jpeg')
+        html = Template('{% load media_tags %}{% responsive_image item.image alt=item.title class="w-full" %}').render(
+            Context({'item': self.item})
+        )
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'{default_storage.url(cached)} 40w', html)
+        self.assertIn(reverse('detector:media_rendition', args=['medium', 'jpeg', self.item.image.name]) + ' 80w', html)
+        self.assertIn('alt="Maggi"', html)
+        self.assertIn('class="w-full"', html)
+
+    def test_renditions_are_removed_with_the_source_file(self):
+        name = get_rendition(self.item.image.name, 'thumb', 'webp')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.delete()
+        self.assertFalse(default_storage.exists(name))
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, MEDIA_SERVE_MODE='django')
+class MediaFileViewTests(TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        for name in ('advertisements/clip.mp4', 'food_images/label.jpg'):
+            os.makedirs(os.path.join(TEST_MEDIA_ROOT, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(TEST_MEDIA_ROOT, name), 'wb') as media:
+                media.write(self.content)
+        self.owner = CustomUser.objects.create_user('owner@example.com', 'Ow', 'Ner', password='secret')
+        self.ad = Advertisement.objects.create(title='Campaign', description='d', content_type='campaign',
+                                               file='advertisements/clip.mp4', uploaded_by=self.owner)
+        self.url = reverse('media', args=['advertisements/clip.mp4'])
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_advertises_ranges_and_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self._body(response), self.content)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self._body(response), self.content[10:20])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(self._body(response), self.content[-5:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        stale = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code, 206)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_off_to_proxy(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/advertisements/clip.mp4')
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_root_are_not_found(self):
+        self.assertEqual(self.client.get(reverse('media', args=['../settings.py'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['advertisements'])).status_code, 404)
+
+    def test_unpublished_files_are_not_found(self):
+        self.ad.is_active = False
+        self.ad.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        staff = CustomUser.objects.create_user('staff@example.com', 'St', 'Aff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_product_photos_are_private_to_their_owner(self):
+        product = FoodProduct.objects.create(user=self.owner, brand_name='Maggi')
+        FoodImage.objects.create(product=product, image='food_images/label.jpg')
+        url = reverse('media', args=['food_images/label.jpg'])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(CustomUser.objects.create_user('other@example.com', 'Oth', 'Er', password='secret'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('private', self.client.get(self.url).get('Cache-Control', ''))
+
+    def test_renditions_follow_their_source(self):
+        item = GalleryItem.objects.create(title='Maggi', description='d', category='comparison',
+                                          image=make_image_file('gallery.jpg', color='teal'))
+        delete_renditions(item.image.name)
+        url = reverse('media', args=[get_rendition(item.image.name, 'thumb', 'jpeg')])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        item.status = 'approved'
+        item.save()
+        # Source lookup, library files, then the gallery file that publishes it
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('private', response.get('Cache-Control', ''))
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, UPLOAD_SESSION_DIR=os.path.join(TEST_MEDIA_ROOT, 'sessions'),
+                   UPLOAD_CHUNK_SIZE=16)
+class ResumableUploadTests(APITestCase):
+    content = b'0123456789abcdefghijklmnopqrstuvwxyz'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('editor@example.com', 'Ed', 'Itor', password='secret', is_staff=True)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('detector:upload_sessions'),
+                                    {'filename': 'Aware_AD1.mp4', 'size': len(self.content), 'content_type': 'video/mp4'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.session = response.json()
+
+    def _patch(self, offset, data, checksum=None):
+        headers = {'Upload-Offset': str(offset)}
+        if checksum is not False:
+            digest = hashlib.sha256(checksum or data).digest()
+            headers['Upload-Checksum'] = f"sha256 {base64.b64encode(digest).decode()}"
+        return self.client.generic('PATCH', self.session['url'], data,
+                                   content_type='application/offset+octet-stream', headers=headers)
+
+    def _upload(self):
+        for offset in range(0, len(self.content), 16):
+            self.assertEqual(self._patch(offset, self.content[offset:offset + 16]).status_code, 204)
+
+    def test_chunks_are_appended_and_resumable(self):
+        response = self._patch(0, self.content[:16])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '16')
+
+        # A retried chunk reports where to resume
+        response = self._patch(0, self.content[:16])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '16')
+
+        response = self.client.head(self.session['url'])
+        self.assertEqual(response['Upload-Offset'], '16')
+        self.assertEqual(response['Upload-Length'], str(len(self.content)))
+
+        self.assertEqual(self._patch(16, self.content[16:32], checksum=False).status_code, 204)
+        self.assertEqual(self._patch(32, self.content[32:]).status_code, 204)
+        session = UploadSession.objects.get(token=self.session['token'])
+        self.assertTrue(session.is_complete)
+        with open(session.partial_path(), 'rb') as partial:
+            self.assertEqual(partial.read(), self.content)
+
+    def test_rejected_chunks_leave_the_offset(self):
+        self.assertEqual(self._patch(0, self.content[:16], checksum=b'other bytes').status_code, 460)
+        self.assertEqual(self._patch(0, self.content[:20]).status_code, 413)
+        self.assertEqual(self._patch(0, b'x' * 16, checksum=False).status_code, 204)
+
+        other = CustomUser.objects.create_user('other@example.com', 'Oth', 'Er', password='secret', is_staff=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.head(self.session['url']).status_code, 404)
+
+    def test_sessions_are_staff_only_and_capped(self):
+        from django.utils import timezone
+        member = CustomUser.objects.create_user('member@example.com', 'Mem', 'Ber', password='secret')
+        self.client.force_login(member)
+        data = {'filename': 'clip.mp4', 'size': 10}
+        self.assertEqual(self.client.post(reverse('detector:upload_sessions'), data, format='json').status_code, 403)
+        self.assertEqual(self._patch(0, self.content[:16]).status_code, 403)
+
+        self.client.force_login(self.user)
+        with self.settings(UPLOAD_SESSION_MAX_OPEN=2):
+            self.assertEqual(self.client.post(reverse('detector:upload_sessions'), data, format='json').status_code, 201)
+            self.assertEqual(self.client.post(reverse('detector:upload_sessions'), data, format='json').status_code, 429)
+            # Expired sessions no longer count
+            UploadSession.objects.update(updated_at=timezone.now() - timezone.timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY + 1))
+            self.assertEqual(self.client.post(reverse('detector:upload_sessions'), data, format='json').status_code, 201)
+
+    def test_chunks_have_their_own_throttle(self):
+        from rest_framework.throttling import ScopedRateThrottle
+        cache.clear()
+        with mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'upload_chunks': '2/hour', 'user': '1/hour'}):
+            self.assertEqual(self._patch(0, self.content[:16]).status_code, 204)
+            self.assertEqual(self._patch(16, self.content[16:32]).status_code, 204)
+            self.assertEqual(self._patch(32, self.content[32:]).status_code, 429)
+
+    def test_form_consumes_completed_upload(self):
+        self._upload()
+        response = self.client.post(reverse('detector:admin_media_create'), {
+            'title': 'Awareness ad', 'description': 'd', 'media_type': 'video',
+            'file_upload_token': self.session['token'],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        item = MediaItem.objects.get()
+        with item.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertTrue(item.file.name.endswith('.mp4'))
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(settings.UPLOAD_SESSION_DIR, f"{self.session['token']}.part")))
+
+    def test_incomplete_upload_is_not_accepted(self):
+        self._patch(0, self.content[:16])
+        response = self.client.post(reverse('detector:admin_media_create'), {
+            'title': 'Awareness ad', 'description': 'd', 'media_type': 'video',
+            'file_upload_token': self.session['token'],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(MediaItem.objects.exists())
+        self.assertTrue(UploadSession.objects.exists())
+
+    def test_malformed_tokens_are_ignored(self):
+        self._upload()
+        response = self.client.post(reverse('detector:admin_media_create'), {
+            'title': 'Awareness ad', 'description': 'd', 'media_type': 'video',
+            'file_upload_token': ['not-a-uuid', self.session['token']],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(MediaItem.objects.get().file)
+
+    def test_assembled_files_are_closed(self):
+        self._upload()
+        opened = []
+        original_init = AssembledUpload.__init__
+
+        def tracking_init(upload, session):
+            original_init(upload, session)
+            opened.append(upload)
+
+        with mock.patch.object(AssembledUpload, '__init__', tracking_init):
+            # Invalid form, the session is kept for another attempt
+            response = self.client.post(reverse('detector:admin_media_create'), {
+                'description': 'd', 'media_type': 'video', 'file_upload_token': self.session['token'],
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(UploadSession.objects.exists())
+
+            response = self.client.post(reverse('detector:admin_media_create'), {
+                'title': 'Awareness ad', 'description': 'd', 'media_type': 'video',
+                'file_upload_token': self.session['token'],
+            })
+            self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(all(upload.closed for upload in opened))
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, VIDEO_SCAN_SAMPLE_FPS=4, VIDEO_SCAN_MIN_SHARPNESS=60,
+                   VIDEO_SCAN_HASH_DISTANCE=10, VIDEO_SCAN_VIEWS=['front', 'side', 'back', 'other'],
+                   VIDEO_SCAN_OCR_FRAMES=2)
+class VideoScanTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('detector:detect_food_video')
+        blurred = cv2.GaussianBlur(block_pattern(99), (31, 31), 10)
+        # Eight frames per side, a blurred turn after the first one
+        self.frames = [block_pattern(0)] * 8 + [blurred] * 8 + [
+            block_pattern(seed) for seed in (1, 2, 3, 4) for _ in range(8)
+        ]
+
+    def test_keyframes_are_sharp_distinct_and_in_order(self):
+        video = make_video_file(self.frames)
+        with video_file_path(video) as path:
+            keyframes = sample_keyframes(path)
+
+        self.assertEqual(len(keyframes), 4)
+        indices = [keyframe.index for keyframe in keyframes]
+        self.assertEqual(indices, sorted(indices))
+        self.assertFalse(any(8 <= index < 16 for index in indices))
+        for i, first in enumerate(keyframes):
+            for second in keyframes[i + 1:]:
+                self.assertGreater(hash_distance(first.dhash, second.dhash), 10)
+
+    def test_scan_runs_batched_prediction_and_targeted_ocr(self):
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        side_effect=lambda images, brand_name, **kwargs: fake_pipeline_results(list(images))) as pipeline, \
+                mock.patch('detector.views.ml_predictor.predict_batch',
+                           side_effect=lambda images: [('REAL', 0.9)] * len(images)) as predict_batch:
+            response = self.client.post(self.url, {'brand_name': 'Maggi', 'video': make_video_file(self.frames)},
+                                        format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([frame['view_type'] for frame in response.data['keyframes']], ['front', 'side', 'back', 'other'])
+        predict_batch.assert_called_once()
+        kwargs = pipeline.call_args.kwargs
+        self.assertEqual(set(kwargs['predictions']), {'front', 'side', 'back', 'other'})
+        self.assertEqual(len(kwargs['ocr_views']), 2)
+        self.assertEqual(FoodImage.objects.filter(product_id=response.data['id']).count(), 4)
+
+    def test_busy_slots_fall_back_to_job_queue(self):
+        from .utils.concurrency import CapacityExceeded
+
+        with mock.patch('detector.views.ml_predictor.predict_batch', side_effect=CapacityExceeded('busy')):
+            response = self.client.post(self.url, {'brand_name': 'Maggi', 'video': make_video_file(self.frames)},
+                                        format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.product_id, response.data['product_id'])
+        self.assertEqual(response['Location'], response.data['status_url'])
+
+    def test_blurred_video_is_rejected(self):
+        blurred = [cv2.GaussianBlur(block_pattern(seed), (31, 31), 10) for seed in range(4) for _ in range(8)]
+        response = self.client.post(self.url, {'brand_name': 'Maggi', 'video': make_video_file(blurred)},
+                                    format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FoodProduct.objects.exists())
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, BULK_DETECTION_BATCH_SIZE=2)
+class BulkFoodDetectorTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('detector:detect_food_bulk')
+        self.user = CustomUser.objects.create_user('bulk@example.com', 'Bu', 'Lk', password='secret')
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch('detector.utils.analysis.process_product_images',
+                             side_effect=lambda images, brand_name, **kwargs: fake_pipeline_results(images))
+        self.pipeline = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _lines(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_multipart_batch_streams_one_line_per_product(self):
+        with mock.patch('detector.utils.ml_utils.ml_predictor.predict_batch',
+                        side_effect=lambda images: [('REAL', 0.9)] * len(images)) as predict_batch:
+            response = self.client.post(self.url, {
+                'products[0][brand_name]': 'Maggi',
+                'products[0][images][]': [make_image_file('f.jpg'), make_image_file('b.jpg')],
+                'products[0][view_types][]': ['front', 'back'],
+                'products[1][brand_name]': 'Amul',
+                'products[1][images][]': [make_image_file('f.jpg')],
+                'products[1][view_types][]': ['front'],
+                'products[2][brand_name]': '',
+                'products[2][images][]': [make_image_file('f.jpg')],
+                'products[2][view_types][]': ['front'],
+            }, format='multipart')
+            lines = self._lines(response)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([line['status'] for line in lines], ['completed', 'completed', 'error'])
+        self.assertEqual(FoodProduct.objects.count(), 2)
+        # Products 0 and 1 share one model call, product 2 fails validation
+        self.assertEqual([len(call.args[0]) for call in predict_batch.call_args_list], [3])
+        self.assertEqual(self.pipeline.call_args.kwargs['predictions'], {'front': ('REAL', 0.9)})
+
+    def _products(self, count):
+        data = {}
+        for index in range(count):
+            data.update({f'products[{index}][brand_name]': 'Maggi',
+                         f'products[{index}][images][]': [make_image_file('f.jpg')],
+                         f'products[{index}][view_types][]': ['front']})
+        return data
+
+    def test_requires_login(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, self._products(1), format='multipart')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_batches_share_the_admission_budget(self):
+        from .utils.concurrency import AdmissionController
+
+        saturated = AdmissionController('detection', max_cost=1, max_queue=0, timeout=1)
+        saturated.acquire(1)
+        with mock.patch('detector.utils.bulk_detection.detection_admission', saturated), \
+                mock.patch('detector.utils.ml_utils.ml_predictor.predict_batch') as predict_batch:
+            lines = self._lines(self.client.post(self.url, self._products(3), format='multipart'))
+
+        self.assertEqual([line['index'] for line in lines], [0, 1, 2])
+        self.assertTrue(all(line['status'] == 'error' and line['retry_after'] >= 1 for line in lines))
+        predict_batch.assert_not_called()
+        self.assertFalse(FoodProduct.objects.exists())
+
+    def _archive(self, manifest):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('manifest.json', json.dumps(manifest))
+            archive.writestr('sku1/front.jpg', make_image_file().read())
+        return SimpleUploadedFile('batch.zip', buffer.getvalue(), content_type='application/zip')
+
+    def test_zip_archive_with_manifest(self):
+        upload = self._archive([
+            {'brand_name': 'Maggi', 'images': {'front': 'sku1/front.jpg'}},
+            {'brand_name': 'Parle', 'images': {'top': 'sku1/front.jpg'}},
+        ])
+
+        lines = self._lines(self.client.post(self.url, {'archive': upload}, format='multipart'))
+
+        self.assertEqual(lines[0]['status'], 'completed')
+        self.assertEqual(lines[0]['brand_name'], 'Maggi')
+        self.assertEqual(lines[1], {'index': 1, 'status': 'error', 'error': 'Unknown view types: top'})
+
+    def test_unreadable_images_only_fail_their_product(self):
+        from .utils.ml_utils import decode_image
+
+        upload = self._archive([{'brand_name': brand_name, 'images': {'front': 'sku1/front.jpg'}}
+                                for brand_name in ('Maggi', 'Amul', 'Parle', 'Tata')])
+        failures = [zipfile.BadZipFile('Bad CRC-32'), cv2.error('decode failed'), OSError('read failed')]
+
+        def flaky_decode(data):
+            if failures:
+                raise failures.pop(0)
+            return decode_image(data)
+
+        with mock.patch('detector.utils.bulk_detection.decode_image', side_effect=flaky_decode), \
+                self.assertLogs('detector.utils.bulk_detection', 'ERROR') as logs:
+            lines = self._lines(self.client.post(self.url, {'archive': upload}, format='multipart'))
+
+        self.assertEqual(lines[:3], [{'index': index, 'status': 'error', 'error': 'Could not read images'}
+                                     for index in range(3)])
+        self.assertEqual(lines[3]['status'], 'completed')
+        self.assertEqual(len(logs.records), 3)
+
+    def test_malformed_manifest_is_rejected(self):
+        for manifest in (['x'], [{'brand_name': 'Maggi', 'images': ['sku1/front.jpg']}],
+                         [{'brand_name': 'Maggi', 'images': {'front': 7}}],
+                         [{'brand_name': 'Maggi', 'images': {'front': 'sku2/missing.jpg'}}]):
+            with self.subTest(manifest=manifest):
+                response = self.client.post(self.url, {'archive': self._archive(manifest)}, format='multipart')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(FoodProduct.objects.exists())
+
+    def test_batch_predictions_replace_per_image_model_calls(self):
+        from .utils.ml_utils import ocr_processor, process_product_images
+
+        self.pipeline.side_effect = process_product_images
+        ocr = {'full_text': '', 'expiry_date': None, 'batch_number': None, 'mrp': None, 'extracted_brands': []}
+        with mock.patch('detector.utils.ml_utils.ml_predictor.predict_batch',
+                        side_effect=lambda images: [('FAKE', 0.8)] * len(images)) as predict_batch, \
+                mock.patch('detector.utils.ml_utils.ml_predictor.predict_single') as predict_single, \
+                mock.patch.object(ocr_processor, 'process_image', return_value=ocr):
+            response = self.client.post(self.url, self._products(3), format='multipart')
+            lines = self._lines(response)
+
+        self.assertEqual([line['final_prediction'] for line in lines], ['FAKE'] * 3)
+        # Batches of two products: one model call each, none per image
+        self.assertEqual([len(call.args[0]) for call in predict_batch.call_args_list], [2, 1])
+        predict_single.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AsyncFoodDetectorTests(TransactionTestCase):
+    async def test_async_post_runs_pipeline(self):
+        with mock.patch('detector.views.process_product_images',
+                        side_effect=lambda images, brand_name, **kwargs: fake_pipeline_results(images)):
+            response = await self.async_client.post(reverse('detector:detect_food_async'), {
+                'brand_name': 'Maggi',
+                'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg')],
+                'view_types[]': ['front', 'back'],
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data['final_prediction'], 'REAL')
+        self.assertEqual(len(data['images']), 2)
+        product = await FoodProduct.objects.aget(pk=data['id'])
+        self.assertTrue(product.brand_match)
+
+    async def test_default_throttles_apply(self):
+        from rest_framework.throttling import AnonRateThrottle
+
+        await sync_to_async(cache.clear)()
+        with mock.patch.dict(AnonRateThrottle.THROTTLE_RATES, {'anon': '1/day'}):
+            first = await self.async_client.post(reverse('detector:detect_food_async'), {'brand_name': 'Maggi'})
+            second = await self.async_client.post(reverse('detector:detect_food_async'), {'brand_name': 'Maggi'})
+
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(second['Retry-After']), 0)
+
+    async def test_async_post_validates_input(self):
+        response = await self.async_client.post(reverse('detector:detect_food_async'), {'brand_name': 'Maggi'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'At least one image is required')
+
+    async def _submit(self, data=None, **headers):
+        return await self.async_client.post(reverse('detector:detect_food_async'), {
+            'brand_name': 'Maggi',
+            'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg')],
+            'view_types[]': ['front', 'back'],
+            **(data or {}),
+        }, headers=headers)
+
+    async def test_idempotency_key_and_identical_uploads_replay(self):
+        user = await CustomUser.objects.acreate(email='keys@example.com', username='keys@example.com')
+        await self.async_client.aforce_login(user)
+        with mock.patch('detector.views.process_product_images',
+                        side_effect=lambda images, brand_name, **kwargs: fake_pipeline_results(images)) as pipeline:
+            first = await self._submit(**{'Idempotency-Key': 'retry-1'})
+            retry = await self._submit(**{'Idempotency-Key': 'retry-1'})
+            identical = await self._submit()
+            fresh = await self._submit(**{'Idempotency-Key': 'retry-2'})
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (200, 'true'))
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        # Without a key, identical uploads within the coalesce window share the product
+        self.assertEqual(identical.json()['id'], first.json()['id'])
+        self.assertEqual(fresh.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(pipeline.call_count, 2)
+
+    @override_settings(DETECTION_INLINE_MAX_PIXELS=1000)
+    async def test_large_uploads_and_job_mode_are_queued(self):
+        with mock.patch('detector.views.process_product_images') as pipeline:
+            large = await self._submit()
+            queued = await self._submit({'mode': 'job', 'brand_name': 'Amul'})
+
+        for response in (large, queued):
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response['Location'], response.json()['status_url'])
+        pipeline.assert_not_called()
+        self.assertEqual(await AnalysisJob.objects.filter(status='queued').acount(), 2)
+
+
+@override_settings(ANALYSIS_EVENT_POLL_INTERVAL=0.01)
+class AnalysisEventStreamTests(TransactionTestCase):
+    async def _read_stream(self, product, **headers):
+        response = await self.async_client.get(
+            reverse('detector:analysis_events', kwargs={'pk': product.pk}), headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_stream_ends_after_verdict(self):
+        product = await FoodProduct.objects.acreate(brand_name='Maggi')
+        received = await AnalysisEvent.objects.acreate(product=product, stage='received', data={'views': ['front']})
+        await AnalysisEvent.objects.acreate(product=product, stage='prediction',
+                                            data={'view_type': 'front', 'prediction': 'REAL', 'confidence': 0.9})
+        await AnalysisEvent.objects.acreate(product=product, stage='verdict', data={'final_prediction': 'REAL'})
+
+        body = await self._read_stream(product)
+        self.assertIn('event: received\ndata: {"views": ["front"]}', body)
+        self.assertTrue(body.endswith('event: verdict\ndata: {"final_prediction": "REAL"}\n\n'))
+
+        resumed = await self._read_stream(product, last_event_id=str(received.pk))
+        self.assertNotIn('event: received', resumed)
+        self.assertIn('event: prediction', resumed)
+
+    async def test_other_users_product_is_hidden(self):
+        from .models import CustomUser
+
+        owner = await CustomUser.objects.acreate(email='owner@example.com', username='owner@example.com')
+        product = await FoodProduct.objects.acreate(brand_name='Maggi', user=owner)
+        response = await self.async_client.get(reverse('detector:analysis_events', kwargs={'pk': product.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_progress_token_stream_waits_for_the_upload(self):
+        token = uuid.uuid4()
+        reading = asyncio.ensure_future(self.async_client.get(
+            reverse('detector:analysis_token_events', kwargs={'token': token})))
+        await asyncio.sleep(0.05)
+        product = await FoodProduct.objects.acreate(brand_name='Maggi', progress_token=token)
+        await AnalysisEvent.objects.acreate(product=product, stage='verdict', data={'final_prediction': 'REAL'})
+
+        response = await reading
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.endswith('event: verdict\ndata: {"final_prediction": "REAL"}\n\n'))
+
+    @override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+    def test_inline_analysis_streams_under_wsgi(self):
+        token = uuid.uuid4()
+        with mock.patch('detector.utils.analysis.process_product_images',
+                        return_value=fake_pipeline_results(['front', 'back'])):
+            response = self.client.post(reverse('detector:detect_food'), {
+                'brand_name': 'Maggi',
+                'images[]': [make_image_file('front.jpg'), make_image_file('back.jpg')],
+                'view_types[]': ['front', 'back'],
+                'progress_token': str(token),
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse('detector:analysis_token_events', kwargs={'token': token}))
+        # A sync generator, an async one would be buffered whole by WSGI
+        self.assertFalse(response.is_async)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: received', body)
+        # Ends with the verdict instead of waiting for the stream timeout
+        self.assertEqual(body.split('event: ')[-1].split('\n')[0], 'verdict')
@@ -7,6 +7,7 @@ urlpatterns = [
     # Main pages
     path('', views.HomeView.as_view(), name='home'),
     path('upload/', views.UploadView.as_view(), name='upload'),
+    path('upload/video/', views.VideoUploadView.as_view(), name='upload_video'),
     path('about/', views.AboutView.as_view(), name='about'),
     path('contact/', views.ContactView.as_view(), name='contact'),
     
@@ -23,6 +24,16 @@ urlpatterns = [
     
     # API endpoints
     path('api/detect/', views.FoodDetectorView.as_view(), name='detect_food'),
+    path('api/detect/async/', views.AsyncFoodDetectorView.as_view(), name='detect_food_async'),
+    path('api/detect/bulk/', views.BulkFoodDetectorView.as_view(), name='detect_food_bulk'),
+    path('api/detect/video/', views.VideoScanView.as_view(), name='detect_food_video'),
+    path('api/products/', views.FoodProductListView.as_view(), name='product_list'),
+    path('api/products/<int:pk>/', views.FoodProductDetailView.as_view(), name='product_detail'),
+    path('api/products/<int:pk>/status/', views.AnalysisStatusView.as_view(), name='analysis_status'),
+    path('api/products/<int:pk>/events/', views.AnalysisEventStreamView.as_view(), name='analysis_events'),
+    path('api/analyses/<uuid:token>/events/', views.AnalysisEventStreamView.as_view(), name='analysis_token_events'),
+    path('api/uploads/', views.UploadSessionCreateView.as_view(), name='upload_sessions'),
+    path('api/uploads/<uuid:token>/', views.UploadSessionView.as_view(), name='upload_session'),
     
     # Custom Admin Interface (Staff only)
     path('admin/dashboard/', views.MediaAdminDashboard.as_view(), name='admin_dashboard'),
@@ -46,6 +57,7 @@ urlpatterns = [
     # Public Media Display
     path('media/library/', views.MediaLibraryView.as_view(), name='media_library'),
     path('awareness/', views.AwarenessCampaignView.as_view(), name='awareness'),
+    path('renditions/<str:rendition>/<str:fmt>/<path:name>', views.MediaRenditionView.as_view(), name='media_rendition'),
     
     # Django-allauth URLs
     # path('accounts/', include('allauth.urls')),
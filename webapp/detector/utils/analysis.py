@@ -0,0 +1,178 @@
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import AnalysisEvent, AnalysisJob, DetectionWorker, FoodImage, FoodProduct
+from .concurrency import ocr_backlogged
+from .image_quality import check_image_quality
+from .ml_utils import process_product_images, run_ocr_stage
+
+logger = logging.getLogger(__name__)
+
+def load_product_images(product: FoodProduct) -> Dict[str, bytes]:
+    """
+    Read the stored images of a product, keyed by view type
+    """
+    images = {}
+    for food_image in product.images.all():
+        with food_image.image.open('rb') as image_file:
+            images[food_image.view_type] = image_file.read()
+    return images
+
+def worker_available() -> bool:
+    """Whether a detection worker checked in within DETECTION_JOB_LOCK_TIMEOUT"""
+    cutoff = timezone.now() - timedelta(seconds=settings.DETECTION_JOB_LOCK_TIMEOUT)
+    return DetectionWorker.objects.filter(last_seen__gte=cutoff).exists()
+
+def should_defer_ocr() -> bool:
+    """
+    ocr_backlogged(), provided a worker is around to run the OCR job.
+    Without one OCR runs inline instead of staying pending forever.
+    """
+    return ocr_backlogged() and worker_available()
+
+def event_recorder(product: FoodProduct) -> Callable[[str, Dict], None]:
+    """Return an on_event callback storing AnalysisEvent rows for the product"""
+    def record(stage: str, data: Dict) -> None:
+        AnalysisEvent.objects.create(product=product, stage=stage, data=data)
+    return record
+
+def verdict_event_data(product: FoodProduct) -> Dict:
+    """Payload of the final 'verdict' event"""
+    return {
+        'final_prediction': product.final_prediction,
+        'overall_confidence': product.overall_confidence,
+        'brand_match': product.brand_match,
+        'ocr_status': product.ocr_status,
+        'processing_time': product.processing_time,
+    }
+
+# FoodProduct / FoodImage fields written from pipeline results
+PRODUCT_RESULT_FIELDS = ['final_prediction', 'overall_confidence', 'processing_time', 'brand_match', 'ocr_results',
+                         'ocr_status']
+IMAGE_RESULT_FIELDS = ['prediction', 'confidence', 'detected_text']
+
+def assign_product_results(product: FoodProduct, results: Dict[str, Union[str, float, Dict]]) -> None:
+    """Copy combined pipeline results onto the product, without saving"""
+    product.final_prediction = results['overall_prediction']
+    product.overall_confidence = results['overall_confidence']
+    product.processing_time = results['processing_time']
+    product.brand_match = results['brand_match']
+    product.ocr_results = results['ocr_results']
+    product.ocr_status = results['ocr_status']
+
+def assign_image_results(food_images: List[FoodImage], results: Dict[str, Union[str, float, Dict]]) -> List[FoodImage]:
+    """Copy per-view pipeline results onto the images, returning the ones that changed"""
+    updated = []
+    for food_image in food_images:
+        view_result = results['detailed_analysis'].get(food_image.view_type)
+        if view_result is None:
+            continue
+        food_image.prediction = view_result['prediction']
+        food_image.confidence = view_result['confidence']
+        food_image.detected_text = view_result['ocr_text']
+        updated.append(food_image)
+    return updated
+
+def apply_analysis_results(product: FoodProduct, results: Dict[str, Union[str, float, Dict]]) -> FoodProduct:
+    """
+    Store combined pipeline results on the product and its images
+
+    Per-view results are written with a single bulk update instead of one
+    save() per image.
+    """
+    assign_product_results(product, results)
+    product.save(update_fields=PRODUCT_RESULT_FIELDS)
+
+    food_images = assign_image_results(list(product.images.all()), results)
+    FoodImage.objects.bulk_update(food_images, IMAGE_RESULT_FIELDS)
+    return product
+
+async def aapply_analysis_results(product: FoodProduct, results: Dict[str, Union[str, float, Dict]]) -> FoodProduct:
+    """Async version of apply_analysis_results using the async ORM"""
+    assign_product_results(product, results)
+    await product.asave(update_fields=PRODUCT_RESULT_FIELDS)
+
+    food_images = assign_image_results([image async for image in product.images.all()], results)
+    await FoodImage.objects.abulk_update(food_images, IMAGE_RESULT_FIELDS)
+    return product
+
+def analyze_product(
+    product: FoodProduct,
+    full_scan: bool = False,
+    images: Optional[Dict[str, Union[bytes, np.ndarray]]] = None,
+    predictions: Optional[Dict[str, Tuple[str, float]]] = None,
+    on_event: Optional[Callable[[str, Dict], None]] = None,
+    defer_ocr: Optional[bool] = None,
+    ocr_views: Optional[List[str]] = None
+) -> Dict[str, Union[str, float, Dict]]:
+    """
+    Run the ML/OCR pipeline on a stored product and save the results
+
+    Args:
+        product: Product whose images are already saved
+        full_scan: OCR every view, see process_product_images
+        images: Image bytes or decoded BGR arrays keyed by view type, read back
+            from storage when omitted
+        predictions: ML results already computed per view, see process_product_images
+        on_event: Progress callback, see process_product_images. Also receives
+            the final 'verdict' event once results are saved
+        defer_ocr: Save the ML verdict only and queue an OCR enrichment job.
+            Decided by should_defer_ocr() when omitted
+        ocr_views: Views to OCR, all of them when omitted, see process_product_images
+
+    Returns:
+        Dict containing combined analysis results
+    """
+    if images is None:
+        images = load_product_images(product)
+    if defer_ocr is None:
+        defer_ocr = should_defer_ocr()
+    results = process_product_images(images, product.brand_name, full_scan=full_scan,
+                                     predictions=predictions, on_event=on_event, defer_ocr=defer_ocr,
+                                     ocr_views=ocr_views)
+    apply_analysis_results(product, results)
+    if results['ocr_status'] == 'pending':
+        AnalysisJob.objects.create(product=product, kind='ocr', full_scan=full_scan)
+    if on_event:
+        on_event('verdict', verdict_event_data(product))
+    return results
+
+def enrich_product_ocr(
+    product: FoodProduct,
+    full_scan: bool = False,
+    on_event: Optional[Callable[[str, Dict], None]] = None
+) -> Dict[str, Union[bool, Dict, List]]:
+    """
+    Fill in the OCR results of a product analysed with deferred OCR
+
+    Updates ocr_results, brand_match and ocr_status on the product and
+    detected_text on its images, leaving the ML verdict untouched. Views
+    failing the image quality pre-check are skipped as in process_product_images.
+    """
+    images = load_product_images(product)
+    if settings.IMAGE_QUALITY_GATE != 'off':
+        flagged = check_image_quality(images)
+        images = {view: image for view, image in images.items() if view not in flagged}
+    ocr = run_ocr_stage(images, product.brand_name, full_scan=full_scan)
+
+    product.ocr_results = ocr['ocr_results']
+    product.brand_match = ocr['brand_match']
+    product.ocr_status = 'completed'
+    product.save(update_fields=['ocr_results', 'brand_match', 'ocr_status'])
+
+    food_images = []
+    for food_image in product.images.all():
+        if food_image.view_type in ocr['texts']:
+            food_image.detected_text = ocr['texts'][food_image.view_type]
+            food_images.append(food_image)
+    FoodImage.objects.bulk_update(food_images, ['detected_text'])
+
+    if on_event:
+        on_event('ocr', {'ocr_results': ocr['ocr_results'], 'skipped_views': ocr['skipped_views'],
+                         'brand_match': ocr['brand_match']})
+    return ocr
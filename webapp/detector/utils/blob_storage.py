@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Media storage keeping each distinct file once
+
+    Files are stored as blobs/<aa>/<bb>/<sha256><ext>, whatever upload_to
+    says, so byte-identical uploads of any model share one file. Every save
+    takes a reference on the StoredBlob row of its file and delete() gives
+    one back, removing the file only with the last reference. Code assigning
+    an already stored name to another instance must call retain() itself.
+    """
+    prefix = 'blobs'
+
+    def blob_name(self, name: str, content: File) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{extension}"
+
+    def is_blob(self, name: str) -> bool:
+        return bool(name) and name.startswith(f"{self.prefix}/")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.blob_name(name, content)
+
+        StoredBlob = apps.get_model('detector', 'StoredBlob')
+        with transaction.atomic():
+            # The row lock orders this save against a concurrent release of the same blob
+            blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': content.size}
+            )
+            if not self.exists(name):
+                super()._save(name, content)
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        return name
+
+    def retain(self, name: str) -> None:
+        """Take an extra reference on a stored blob"""
+        StoredBlob = apps.get_model('detector', 'StoredBlob')
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+    def delete(self, name: str) -> None:
+        """Give back one reference, deleting the file with the last one"""
+        if not self.is_blob(name):
+            super().delete(name)
+            return
+
+        StoredBlob = apps.get_model('detector', 'StoredBlob')
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                logger.warning(f"Released unknown blob {name}")
+                return
+            if blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+blob_storage = ContentAddressedStorage()
+
+def get_blob_storage() -> ContentAddressedStorage:
+    """Storage callable for FileFields, keeps the instance out of migrations"""
+    return blob_storage
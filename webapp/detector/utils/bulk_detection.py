@@ -0,0 +1,224 @@
+from typing import Callable, Dict, Iterator, List
+import io
+import json
+import logging
+import re
+import zipfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from ..models import FoodImage, FoodProduct
+from .analysis import analyze_product
+from .concurrency import Overloaded, detection_admission, model_slots
+from .image_headers import validate_image_header
+from .ml_utils import decode_image, ml_predictor
+
+logger = logging.getLogger(__name__)
+
+VALID_VIEW_TYPES = {view_type for view_type, _ in FoodImage.VIEWS}
+
+MULTIPART_FIELD_PATTERN = re.compile(r'^products\[(\d+)\]\[(brand_name|view_types|images)\](\[\])?$')
+
+class BulkRequestError(ValueError):
+    """Raised when a bulk detection request cannot be parsed at all"""
+
+class BulkItem:
+    """One product of a bulk request, with image bytes loaded on demand"""
+    def __init__(self, index: int, brand_name: str, images: Dict[str, Callable[[], bytes]], names: Dict[str, str]):
+        self.index = index
+        self.brand_name = brand_name
+        self.images = images  # View type -> loader returning the image bytes
+        self.names = names  # View type -> original file name
+
+    def validate(self) -> None:
+        if not self.brand_name:
+            raise ValueError('Brand name is required')
+        if not self.images:
+            raise ValueError('At least one image is required')
+        unknown = set(self.images) - VALID_VIEW_TYPES
+        if unknown:
+            raise ValueError(f"Unknown view types: {', '.join(sorted(unknown))}")
+
+def parse_multipart_batch(data, files) -> List[BulkItem]:
+    """
+    Parse products[N][brand_name], products[N][images][] and
+    products[N][view_types][] fields into bulk items
+    """
+    products: Dict[int, Dict] = {}
+    for key in list(data.keys()) + list(files.keys()):
+        match = MULTIPART_FIELD_PATTERN.match(key)
+        if not match:
+            continue
+        index, field = int(match.group(1)), match.group(2)
+        product = products.setdefault(index, {'brand_name': '', 'view_types': [], 'images': []})
+        if field == 'brand_name':
+            product['brand_name'] = data.get(key, '').strip()
+        elif field == 'view_types':
+            product['view_types'] = data.getlist(key)
+        else:
+            product['images'] = files.getlist(key)
+
+    items = []
+    for index in sorted(products):
+        product = products[index]
+        if len(product['images']) != len(product['view_types']):
+            raise BulkRequestError(f"Product {index}: number of images and view types must match")
+        if len(set(product['view_types'])) != len(product['view_types']):
+            raise BulkRequestError(f"Product {index}: each view type can only be uploaded once")
+        images = {}
+        names = {}
+        for view_type, upload in zip(product['view_types'], product['images']):
+            images[view_type] = _upload_loader(upload)
+            names[view_type] = upload.name
+        items.append(BulkItem(index, product['brand_name'], images, names))
+    return items
+
+def _upload_loader(upload) -> Callable[[], bytes]:
+    def load() -> bytes:
+        upload.seek(0)
+        return upload.read()
+    return load
+
+def parse_archive_batch(archive) -> List[BulkItem]:
+    """
+    Parse a zip of images plus a manifest.json of the form
+    [{"brand_name": "Maggi", "images": {"front": "sku1/front.jpg", ...}}, ...]
+
+    Members are read one product at a time, never all at once.
+    """
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise BulkRequestError('Archive is not a valid zip file')
+
+    try:
+        manifest = json.loads(zip_file.read('manifest.json'))
+    except KeyError:
+        raise BulkRequestError('Archive must contain manifest.json')
+    except ValueError:
+        raise BulkRequestError('manifest.json is not valid JSON')
+    if not isinstance(manifest, list):
+        raise BulkRequestError('manifest.json must be a list of products')
+
+    members = set(zip_file.namelist())
+    items = []
+    for index, entry in enumerate(manifest):
+        if not isinstance(entry, dict):
+            raise BulkRequestError(f"Product {index}: manifest entries must be objects")
+        entry_images = entry.get('images') or {}
+        if not isinstance(entry_images, dict):
+            raise BulkRequestError(f"Product {index}: images must map view types to archive paths")
+        images = {}
+        names = {}
+        for view_type, member in entry_images.items():
+            if not isinstance(member, str) or member not in members:
+                raise BulkRequestError(f"Product {index}: {member!r} is not a file in the archive")
+            images[view_type] = _archive_loader(zip_file, member)
+            names[view_type] = member.rsplit('/', 1)[-1]
+        items.append(BulkItem(index, str(entry.get('brand_name', '')).strip(), images, names))
+    return items
+
+def _archive_loader(zip_file: zipfile.ZipFile, member: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        info = zip_file.getinfo(member)
+        if info.file_size > settings.MAX_IMAGE_SIZE:
+            raise ValueError(f"{member} exceeds the maximum image size")
+        return zip_file.read(info)
+    return load
+
+def run_bulk_detection(items: List[BulkItem], user=None, full_scan: bool = False) -> Iterator[Dict]:
+    """
+    Analyse bulk items in batches, yielding one result per product as it finishes
+
+    Images of up to BULK_DETECTION_BATCH_SIZE products go through the model in
+    a single predict_batch call. OCR then runs per product.
+
+    Each batch is admitted by its image count like any /api/detect/ request.
+    When admission sheds a batch, it and every later product get an error
+    line with retry_after, so the client can resubmit what is left.
+    """
+    batch_size = settings.BULK_DETECTION_BATCH_SIZE
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        try:
+            with detection_admission.admit(sum(len(item.images) for item in batch)):
+                yield from _run_batch(batch, user, full_scan)
+        except Overloaded as e:
+            for item in items[start:]:
+                yield {'index': item.index, 'status': 'error', 'error': str(e), 'retry_after': e.retry_after}
+            return
+
+def _run_batch(batch: List[BulkItem], user=None, full_scan: bool = False) -> Iterator[Dict]:
+    """Results of one admitted batch of run_bulk_detection"""
+    # Load and decode the batch, recording per-product failures
+    loaded: Dict[int, Dict] = {}
+    errors: Dict[int, str] = {}
+    for item in batch:
+        try:
+            item.validate()
+            raw = {view_type: load() for view_type, load in item.images.items()}
+            for view_type, data in raw.items():
+                try:
+                    validate_image_header(io.BytesIO(data))
+                except ValueError as e:
+                    raise ValueError(f"{item.names[view_type]}: {e}")
+            decoded = {view_type: decode_image(data) for view_type, data in raw.items()}
+            loaded[item.index] = {'raw': raw, 'decoded': decoded}
+        except ValueError as e:
+            errors[item.index] = str(e)
+        except Exception:
+            # Corrupt archive members, decoder and I/O errors only fail this product
+            logger.exception(f"Bulk detection could not read product {item.index}")
+            errors[item.index] = 'Could not read images'
+
+    # One model call for every view of every product in the batch
+    keys = [(index, view_type) for index, entry in loaded.items() for view_type in entry['decoded']]
+    predictions: Dict[int, Dict] = {index: {} for index in loaded}
+    if keys:
+        try:
+            with model_slots.acquire():
+                batch_results = ml_predictor.predict_batch(
+                    [loaded[index]['decoded'][view_type] for index, view_type in keys]
+                )
+            for (index, view_type), prediction in zip(keys, batch_results):
+                predictions[index][view_type] = prediction
+        except Exception as e:
+            logger.error(f"Bulk batch prediction failed: {e}")
+            for index in loaded:
+                errors[index] = 'Prediction failed'
+
+    for item in batch:
+        if item.index in errors:
+            yield {'index': item.index, 'status': 'error', 'error': errors[item.index]}
+            continue
+        try:
+            product = _store_product(item, loaded[item.index]['raw'], user)
+            analyze_product(product, full_scan=full_scan,
+                            images=loaded[item.index]['decoded'],
+                            predictions=predictions[item.index])
+            yield {
+                'index': item.index,
+                'status': 'completed',
+                'product_id': product.pk,
+                'brand_name': product.brand_name,
+                'final_prediction': product.final_prediction,
+                'overall_confidence': product.overall_confidence,
+                'brand_match': product.brand_match,
+                'processing_time': product.processing_time,
+            }
+        except Exception as e:
+            logger.error(f"Bulk detection failed for product {item.index}: {e}")
+            yield {'index': item.index, 'status': 'error', 'error': 'Analysis failed'}
+        finally:
+            loaded.pop(item.index, None)
+
+def _store_product(item: BulkItem, raw_images: Dict[str, bytes], user=None) -> FoodProduct:
+    product = FoodProduct.objects.create(user=user, brand_name=item.brand_name)
+    for view_type, data in raw_images.items():
+        FoodImage.objects.create(
+            product=product,
+            image=ContentFile(data, name=item.names[view_type]),
+            view_type=view_type
+        )
+    return product
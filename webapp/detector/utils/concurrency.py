@@ -0,0 +1,197 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class CapacityExceeded(Exception):
+    """Raised when a detection slot could not be acquired in time"""
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class SlotBudget:
+    """
+    Per-process limit on how many requests may use an expensive resource
+    (model inference, Tesseract) at the same time
+    """
+    def __init__(self, name: str, slots: int, timeout: float):
+        self.name = name
+        self.slots = slots
+        self.timeout = timeout
+        self.average_wait = 0.0  # Moving average of seconds spent waiting for a slot
+        self.last_wait_at = None  # time.monotonic() of the latest acquire attempt
+        self._semaphore = threading.BoundedSemaphore(slots)
+
+    def recent_wait(self, window: float) -> float:
+        """Average slot wait, or 0 when nothing tried to acquire within `window` seconds"""
+        if self.last_wait_at is None or time.monotonic() - self.last_wait_at > window:
+            return 0.0
+        return self.average_wait
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        """Hold one slot, waiting at most `timeout` seconds for it"""
+        started = time.monotonic()
+        acquired = self._semaphore.acquire(timeout=self.timeout)
+        self.last_wait_at = time.monotonic()
+        self.average_wait = 0.8 * self.average_wait + 0.2 * (self.last_wait_at - started)
+        if not acquired:
+            logger.warning(f"No free {self.name} slot after {self.timeout}s")
+            raise CapacityExceeded(f"All {self.slots} {self.name} slots are busy",
+                                   retry_after=max(1, int(self.timeout)))
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+class Overloaded(Exception):
+    """Raised when admission control sheds a request instead of queueing it"""
+    def __init__(self, message: str, retry_after: int, status_code: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+class AdmissionController:
+    """
+    Per-process admission control for whole detection requests
+
+    Each request costs its number of images. Requests run while the
+    in-flight cost stays within max_cost, up to max_queue more wait at most
+    `timeout` seconds for capacity, and anything beyond is rejected at once:
+    429 when the wait queue is full, 503 when the wait timed out.
+    """
+    def __init__(self, name: str, max_cost: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_cost = max_cost
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._average_duration = 1.0  # Moving average of seconds per admitted request
+        self._condition = threading.Condition()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, about one request duration"""
+        return max(1, math.ceil(self._average_duration))
+
+    def acquire(self, cost: int) -> int:
+        """
+        Wait for capacity and return the cost actually charged. Requests
+        larger than max_cost are charged max_cost so they can run alone.
+        """
+        cost = max(1, min(cost, self.max_cost))
+        with self._condition:
+            if self.waiting or self.in_flight + cost > self.max_cost:
+                if self.waiting >= self.max_queue:
+                    logger.warning(f"{self.name} admission queue full, shedding request of cost {cost}")
+                    raise Overloaded(f"Too many {self.name} requests in progress",
+                                     retry_after=self.retry_after(), status_code=429)
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.in_flight + cost <= self.max_cost,
+                                                        timeout=self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    logger.warning(f"No {self.name} capacity after {self.timeout}s, shedding request of cost {cost}")
+                    raise Overloaded(f"The {self.name} service is saturated",
+                                     retry_after=self.retry_after(), status_code=503)
+            self.in_flight += cost
+        return cost
+
+    def saturated(self) -> bool:
+        """Whether a new request would have to wait for capacity"""
+        return bool(self.waiting) or self.in_flight >= self.max_cost
+
+    def release(self, cost: int, duration: float = None) -> None:
+        """Return capacity taken by acquire()"""
+        with self._condition:
+            self.in_flight -= cost
+            if duration is not None:
+                self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, cost: int) -> Iterator[None]:
+        """Hold `cost` units of capacity for the duration of the block"""
+        charged = self.acquire(cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(charged, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aadmit(self, cost: int) -> AsyncIterator[None]:
+        """Async version of admit(), waiting for capacity in a worker thread"""
+        loop = asyncio.get_running_loop()
+        acquiring = loop.run_in_executor(None, self.acquire, cost)
+        try:
+            charged = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The client went away while queued, give the capacity back once granted
+            acquiring.add_done_callback(
+                lambda future: future.exception() is None and self.release(future.result())
+            )
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(charged, time.monotonic() - started)
+
+# Shared by every request thread in this process
+detection_admission = AdmissionController('detection', settings.DETECTION_ADMISSION_MAX_COST,
+                                          settings.DETECTION_ADMISSION_QUEUE, settings.DETECTION_ADMISSION_TIMEOUT)
+model_slots = SlotBudget('model', settings.DETECTION_MODEL_SLOTS, settings.DETECTION_SLOT_TIMEOUT)
+ocr_slots = SlotBudget('ocr', settings.DETECTION_OCR_SLOTS, settings.DETECTION_SLOT_TIMEOUT)
+
+def ocr_backlogged() -> bool:
+    """
+    Whether OCR is queueing long enough that new analyses should defer it.
+    Once OCR is deferred nothing waits on the slots, so the recent wait
+    expires after DETECTION_OCR_LATENCY_WINDOW and the next request probes again.
+    """
+    threshold = settings.DETECTION_OCR_DEFER_LATENCY
+    return threshold > 0 and ocr_slots.recent_wait(settings.DETECTION_OCR_LATENCY_WINDOW) > threshold
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """
+    Thread pool whose optional work can be dropped instead of queued
+
+    try_submit() only accepts a task while fewer than max_pending are queued
+    or running, so optional work cannot pile up without bound under load.
+    submit() is unchanged for work that must run.
+    """
+    def __init__(self, max_workers: int, max_pending: int, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def try_submit(self, fn, *args, **kwargs) -> Optional[Future]:
+        """Schedule fn(*args, **kwargs), or return None when max_pending tasks are outstanding"""
+        if not self._pending.acquire(blocking=False):
+            return None
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+# Decodes uploaded images while the rest of the request body is still arriving
+decode_executor = BoundedExecutor(max_workers=settings.DETECTION_DECODE_WORKERS,
+                                  max_pending=settings.DETECTION_DECODE_QUEUE,
+                                  thread_name_prefix='image-decode')
+
+# Runs the blocking ML/OCR pipeline for async views, off the event loop
+analysis_executor = ThreadPoolExecutor(max_workers=settings.DETECTION_ASYNC_WORKERS,
+                                       thread_name_prefix='analysis')
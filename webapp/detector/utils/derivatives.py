@@ -0,0 +1,111 @@
+from typing import Optional
+import hashlib
+import io
+import posixpath
+
+from PIL import Image, ImageOps, features
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from ..models import RenditionSource
+from .blob_storage import blob_storage
+
+RENDITION_DIR = 'renditions'
+
+# Pillow format names and MIME types of the rendition formats
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+def available_formats():
+    """Configured rendition formats this Pillow build can encode, JPEG always last"""
+    encodable = {'avif': features.check('avif'), 'webp': features.check('webp'), 'jpeg': True}
+    return [fmt for fmt in settings.IMAGE_RENDITION_FORMATS if fmt in FORMATS and encodable[fmt]]
+
+def source_key(name: str) -> str:
+    """
+    SHA-256 identifying a source file: the content hash of content-addressed
+    blobs, a hash of the name for files stored before them
+    """
+    if blob_storage.is_blob(name):
+        return posixpath.splitext(posixpath.basename(name))[0]
+    return hashlib.sha256(name.encode()).hexdigest()
+
+def rendition_name(source_name: str, width: int, fmt: str) -> str:
+    key = source_key(source_name)
+    return f"{RENDITION_DIR}/{key[:2]}/{key}_{width}.{fmt}"
+
+def render(source_name: str, width: int, fmt: str) -> bytes:
+    """Downscale a source image to at most `width` pixels wide and encode it"""
+    with blob_storage.open(source_name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        if image.width > width:
+            # Bound the width only so srcset width descriptors hold for portrait images too
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+    if fmt == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+        if image.mode in ('RGBA', 'LA', 'P') and fmt == 'jpeg':
+            # JPEG has no alpha, flatten onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGBA' if image.mode in ('LA', 'P') else 'RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=FORMATS[fmt][0], quality=settings.IMAGE_RENDITION_QUALITY)
+    return buffer.getvalue()
+
+def get_rendition(source_name: str, rendition: str, fmt: str) -> str:
+    """
+    Storage name of a rendition, generating and caching it on first use
+
+    Raises:
+        KeyError: Unknown rendition or format
+        OSError: Source missing or not an image
+    """
+    width = settings.IMAGE_RENDITIONS[rendition]
+    if fmt not in available_formats():
+        raise KeyError(fmt)
+    name = rendition_name(source_name, width, fmt)
+    if default_storage.exists(name):
+        return name
+
+    # Lets media_access resolve the rendition back to its source
+    RenditionSource.objects.get_or_create(key=source_key(source_name), name=source_name)
+    saved = default_storage.save(name, ContentFile(render(source_name, width, fmt)))
+    if saved != name:
+        # Generated concurrently by another request, keep the first copy
+        default_storage.delete(saved)
+    return name
+
+def rendition_url(source_name: str, rendition: str, fmt: str) -> str:
+    """Direct media URL once generated, otherwise the view generating it"""
+    name = rendition_name(source_name, settings.IMAGE_RENDITIONS[rendition], fmt)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    return reverse('detector:media_rendition', kwargs={'rendition': rendition, 'fmt': fmt, 'name': source_name})
+
+def delete_renditions(source_name: str) -> int:
+    """Remove every cached rendition of a source"""
+    key = source_key(source_name)
+    RenditionSource.objects.filter(key=key, name=source_name).delete()
+    directory = f"{RENDITION_DIR}/{key[:2]}"
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for file_name in files:
+        if file_name.startswith(f"{key}_"):
+            default_storage.delete(f"{directory}/{file_name}")
+            removed += 1
+    return removed
+
+def mime_type(fmt: str) -> Optional[str]:
+    return FORMATS[fmt][1] if fmt in FORMATS else None
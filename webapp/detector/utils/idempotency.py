@@ -0,0 +1,133 @@
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from typing import AsyncIterator, Iterator, List, Optional
+import asyncio
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import FoodProduct
+
+logger = logging.getLogger(__name__)
+
+def upload_digest(user, brand_name: str, view_types: List[str], images: List) -> str:
+    """
+    SHA-256 identifying a detection submission by user, brand and the
+    content of each view, independent of upload order and file names
+    """
+    views = []
+    for view_type, image in zip(view_types, images):
+        image_hash = hashlib.sha256()
+        for chunk in image.chunks():
+            image_hash.update(chunk)
+        image.seek(0)
+        views.append(f"{view_type}:{image_hash.hexdigest()}")
+
+    digest = hashlib.sha256()
+    digest.update(f"{user.pk if user else ''}\n{brand_name.strip().lower()}\n".encode())
+    digest.update('\n'.join(sorted(views)).encode())
+    return digest.hexdigest()
+
+class IdempotencyKeyReused(Exception):
+    """An Idempotency-Key sent again with a different submission"""
+
+def idempotency_key_error(idempotency_key: str, user) -> Optional[str]:
+    """
+    Why an Idempotency-Key header cannot be used, None if it can
+
+    Keys are scoped to their user, anonymous clients would all share one
+    namespace and could replay each other's products.
+    """
+    if len(idempotency_key) > 255:
+        return 'Idempotency-Key is too long'
+    if idempotency_key and user is None:
+        return 'Idempotency-Key requires an authenticated request'
+    return None
+
+def find_submission(user, idempotency_key: str, digest: str) -> Optional[FoodProduct]:
+    """
+    Product created by an earlier submission this one repeats
+
+    With an Idempotency-Key the key is looked up, so clients can still
+    submit the same images again on purpose under a new key. Without one,
+    identical uploads within DETECTION_COALESCE_WINDOW share a product.
+
+    Raises:
+        IdempotencyKeyReused: The key's product was created from a different submission
+    """
+    products = FoodProduct.objects.filter(user=user)
+    if idempotency_key:
+        product = products.filter(idempotency_key=idempotency_key).first()
+        if product and product.upload_digest != digest:
+            raise IdempotencyKeyReused('Idempotency-Key was already used for a different submission')
+        return product
+    since = timezone.now() - timedelta(seconds=settings.DETECTION_COALESCE_WINDOW)
+    return products.filter(upload_digest=digest, created_at__gte=since).order_by('created_at').first()
+
+class SubmissionGuard:
+    """
+    Per-process lock per submission digest
+
+    The first of several identical concurrent requests runs the analysis
+    while holding the lock. The others wait up to DETECTION_COALESCE_TIMEOUT
+    for it, then find its product with find_submission instead of starting
+    their own analysis.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # Digest -> [lock, number of requests holding or waiting]
+
+    @contextmanager
+    def hold(self, digest: str) -> Iterator[bool]:
+        """Yield whether the lock was acquired, proceeding either way on timeout"""
+        entry = self._enter(digest)
+        acquired = self._acquire(digest, entry)
+        try:
+            yield acquired
+        finally:
+            self._leave(digest, entry, acquired)
+
+    @asynccontextmanager
+    async def ahold(self, digest: str) -> AsyncIterator[bool]:
+        """Async version of hold(), waiting for the lock in a worker thread"""
+        entry = self._enter(digest)
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self._acquire, digest, entry)
+        try:
+            acquired = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The client went away while waiting, let go once the wait ends
+            acquiring.add_done_callback(
+                lambda future: self._leave(digest, entry, future.exception() is None and future.result())
+            )
+            raise
+        try:
+            yield acquired
+        finally:
+            self._leave(digest, entry, acquired)
+
+    def _enter(self, digest: str) -> list:
+        with self._lock:
+            entry = self._entries.setdefault(digest, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry
+
+    def _acquire(self, digest: str, entry: list) -> bool:
+        acquired = entry[0].acquire(timeout=settings.DETECTION_COALESCE_TIMEOUT)
+        if not acquired:
+            logger.warning(f"Identical submission {digest[:12]} still running after "
+                           f"{settings.DETECTION_COALESCE_TIMEOUT}s")
+        return acquired
+
+    def _leave(self, digest: str, entry: list, acquired: bool) -> None:
+        if acquired:
+            entry[0].release()
+        with self._lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._entries[digest]
+
+# Shared by every request thread in this process
+submission_guard = SubmissionGuard()
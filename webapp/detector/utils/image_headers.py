@@ -0,0 +1,141 @@
+from typing import BinaryIO, NamedTuple
+import struct
+
+from django.conf import settings
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Start-of-frame markers carrying the JPEG dimensions (not DHT/JPG/DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+class ImageHeader(NamedTuple):
+    format: str  # 'jpeg', 'png' or 'webp'
+    width: int
+    height: int
+    orientation: int = 1  # EXIF orientation, 1 is upright
+
+def read_image_header(file: BinaryIO) -> ImageHeader:
+    """
+    Read format, dimensions and EXIF orientation from the first bytes of a
+    JPEG, PNG or WebP file without decoding any pixels. The file is rewound
+    afterwards.
+
+    Raises:
+        ValueError: Unknown format or truncated header
+    """
+    file.seek(0)
+    try:
+        start = file.read(12)
+        if start[:2] == b'\xff\xd8':
+            return _read_jpeg_header(file)
+        if start[:8] == PNG_SIGNATURE:
+            return _read_png_header(start + file.read(12))
+        if start[:4] == b'RIFF' and start[8:12] == b'WEBP':
+            return _read_webp_header(start + file.read(18))
+        raise ValueError('Not a JPEG, PNG or WebP image')
+    except struct.error:
+        raise ValueError('Truncated image header')
+    finally:
+        file.seek(0)
+
+def _read_jpeg_header(file: BinaryIO) -> ImageHeader:
+    file.seek(2)
+    orientation = 1
+    while True:
+        byte = file.read(1)
+        if byte != b'\xff':
+            raise ValueError('Corrupt JPEG marker')
+        marker = file.read(1)
+        while marker == b'\xff':  # Fill bytes
+            marker = file.read(1)
+        if not marker:
+            raise ValueError('JPEG ended before its frame header')
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # Markers without a length
+            continue
+        if marker in (0xD9, 0xDA):  # End of image, start of scan
+            raise ValueError('JPEG has no frame header')
+
+        length = struct.unpack('>H', file.read(2))[0]
+        if length < 2:
+            raise ValueError('Corrupt JPEG segment')
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack('>BHH', file.read(5))
+            return ImageHeader('jpeg', width, height, orientation)
+        segment_start = file.tell()
+        if marker == 0xE1:
+            segment = file.read(length - 2)
+            if segment.startswith(b'Exif\x00\x00'):
+                orientation = _exif_orientation(segment[6:])
+        file.seek(segment_start + length - 2)
+
+def _exif_orientation(tiff: bytes) -> int:
+    """Orientation tag of the first IFD of an EXIF TIFF block, 1 when absent"""
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    try:
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        entries = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for index in range(entries):
+            entry = tiff[ifd_offset + 2 + 12 * index:ifd_offset + 14 + 12 * index]
+            tag = struct.unpack(endian + 'H', entry[:2])[0]
+            if tag == EXIF_ORIENTATION_TAG:
+                value = struct.unpack(endian + 'H', entry[8:10])[0]
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+def _read_png_header(data: bytes) -> ImageHeader:
+    if data[12:16] != b'IHDR':
+        raise ValueError('PNG does not start with IHDR')
+    width, height = struct.unpack('>II', data[16:24])
+    return ImageHeader('png', width, height)
+
+def _read_webp_header(data: bytes) -> ImageHeader:
+    chunk = data[12:16]
+    if chunk == b'VP8X':
+        width = 1 + int.from_bytes(data[24:27], 'little')
+        height = 1 + int.from_bytes(data[27:30], 'little')
+    elif chunk == b'VP8 ':
+        if data[23:26] != b'\x9d\x01\x2a':
+            raise ValueError('Corrupt WebP frame header')
+        width, height = struct.unpack('<HH', data[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b'VP8L':
+        if data[20:21] != b'\x2f':
+            raise ValueError('Corrupt WebP lossless header')
+        bits = struct.unpack('<I', data[21:25])[0]
+        width = 1 + (bits & 0x3FFF)
+        height = 1 + ((bits >> 14) & 0x3FFF)
+    else:
+        raise ValueError('Unknown WebP chunk')
+    return ImageHeader('webp', width, height)
+
+def validate_image_header(file: BinaryIO) -> ImageHeader:
+    """
+    Read the header and reject images too large or too elongated to be
+    worth decoding
+
+    Raises:
+        ValueError: Unreadable header, or dimensions outside IMAGE_MAX_DIMENSION,
+            IMAGE_MAX_PIXELS or IMAGE_MAX_ASPECT_RATIO
+    """
+    header = read_image_header(file)
+    width, height = header.width, header.height
+    if not width or not height:
+        raise ValueError('Image has no pixels')
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+        raise ValueError(f'Image is {width}x{height}, sides must be at most {settings.IMAGE_MAX_DIMENSION} pixels')
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValueError(f'Image is {width}x{height}, at most {settings.IMAGE_MAX_PIXELS} pixels are allowed')
+    if max(width, height) / min(width, height) > settings.IMAGE_MAX_ASPECT_RATIO:
+        raise ValueError(f'Image is {width}x{height}, aspect ratio must be at most '
+                         f'{settings.IMAGE_MAX_ASPECT_RATIO}:1')
+    return header
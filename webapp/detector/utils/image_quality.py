@@ -0,0 +1,118 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+import io
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .image_headers import read_image_header
+
+# Blur and exposure are measured on a grayscale copy at most this long
+ANALYSIS_SIDE = 512
+
+# Pixel values counted as crushed shadows / blown highlights
+SHADOW_LEVEL = 5
+HIGHLIGHT_LEVEL = 250
+
+class QualityReport(NamedTuple):
+    width: int
+    height: int
+    sharpness: float  # Variance of the Laplacian of the reduced copy
+    brightness: float  # Mean grey level, 0-255
+    blown_fraction: float  # Share of pixels at or above HIGHLIGHT_LEVEL
+    crushed_fraction: float  # Share of pixels at or below SHADOW_LEVEL
+
+def _reduced_decode_flag(longest_side: int) -> int:
+    # libjpeg scales while decoding, far cheaper than decoding in full and resizing
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                         (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+        if longest_side >= ANALYSIS_SIDE * factor:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+def _grayscale(image: Union[bytes, np.ndarray]) -> Optional[tuple]:
+    """Small grayscale copy and full size of an image, None when undecodable"""
+    if isinstance(image, np.ndarray):
+        height, width = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    else:
+        try:
+            header = read_image_header(io.BytesIO(image))
+            width, height = header.width, header.height
+        except ValueError:
+            return None
+        gray = cv2.imdecode(np.frombuffer(image, np.uint8), _reduced_decode_flag(max(width, height)))
+        if gray is None:
+            return None
+
+    # Whole-number factors take INTER_AREA's fast path, fractional ones are several times slower
+    factor = -(-max(gray.shape[:2]) // ANALYSIS_SIDE)
+    if factor > 1:
+        gray = cv2.resize(gray, (max(1, gray.shape[1] // factor), max(1, gray.shape[0] // factor)),
+                          interpolation=cv2.INTER_AREA)
+    return gray, width, height
+
+def assess_image(image: Union[bytes, np.ndarray]) -> Optional[QualityReport]:
+    """
+    Blur, exposure and resolution of an encoded image or BGR array, measured
+    on a copy of at most ANALYSIS_SIDE pixels. None when it cannot be decoded,
+    leaving that error to the pipeline.
+    """
+    decoded = _grayscale(image)
+    if decoded is None:
+        return None
+    gray, width, height = decoded
+
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    pixels = histogram.sum()
+    return QualityReport(
+        width=width,
+        height=height,
+        sharpness=float(cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))[1][0, 0] ** 2),
+        brightness=float(np.dot(histogram, np.arange(256)) / pixels),
+        blown_fraction=float(histogram[HIGHLIGHT_LEVEL:].sum() / pixels),
+        crushed_fraction=float(histogram[:SHADOW_LEVEL + 1].sum() / pixels),
+    )
+
+def quality_problems(report: QualityReport) -> List[str]:
+    """Actionable messages for every IMAGE_QUALITY_* threshold the image misses"""
+    problems = []
+    if min(report.width, report.height) < settings.IMAGE_QUALITY_MIN_SIDE:
+        problems.append(f'Image is only {report.width}x{report.height} pixels, at least '
+                        f'{settings.IMAGE_QUALITY_MIN_SIDE} on the short side are needed. Move closer or use the '
+                        'full camera resolution')
+    if report.sharpness < settings.IMAGE_QUALITY_MIN_SHARPNESS:
+        problems.append('Image is blurry. Hold the camera steady and tap the label to focus')
+    if report.brightness < settings.IMAGE_QUALITY_MIN_BRIGHTNESS or \
+            report.crushed_fraction > settings.IMAGE_QUALITY_MAX_CLIPPED:
+        problems.append('Image is too dark. Add light or move out of the shadow')
+    if report.blown_fraction > settings.IMAGE_QUALITY_MAX_CLIPPED:
+        problems.append('Image is overexposed. Turn off the flash or tilt the pack away from glare')
+    return problems
+
+def check_image_quality(images: Dict[str, Union[bytes, np.ndarray]]) -> Dict[str, List[str]]:
+    """Problems per view, only for views that have any"""
+    issues = {}
+    for view_type, image in images.items():
+        report = assess_image(image)
+        if report is not None:
+            problems = quality_problems(report)
+            if problems:
+                issues[view_type] = problems
+    return issues
+
+def check_upload_quality(view_types: List[str], uploads: List,
+                         decoded: Sequence[Optional[np.ndarray]] = ()) -> Dict[str, List[str]]:
+    """
+    check_image_quality for uploaded files, on the arrays already decoded
+    during upload where available. Files read instead are rewound.
+    """
+    images = {}
+    for index, (view_type, upload) in enumerate(zip(view_types, uploads)):
+        if index < len(decoded) and decoded[index] is not None:
+            images[view_type] = decoded[index]
+            continue
+        upload.seek(0)
+        images[view_type] = upload.read()
+        upload.seek(0)
+    return check_image_quality(images)
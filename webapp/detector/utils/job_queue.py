@@ -0,0 +1,160 @@
+from typing import Optional
+from contextlib import contextmanager
+from datetime import timedelta
+import logging
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import AnalysisJob, DetectionWorker, FoodProduct
+from .analysis import analyze_product, enrich_product_ocr, event_recorder
+
+logger = logging.getLogger(__name__)
+
+def default_worker_id() -> str:
+    """Identify a worker process by host and pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def record_worker_heartbeat(worker_id: str) -> None:
+    """
+    Mark the worker alive for worker_available(), forgetting workers silent
+    for longer than DETECTION_JOB_LOCK_TIMEOUT
+    """
+    now = timezone.now()
+    DetectionWorker.objects.update_or_create(worker_id=worker_id, defaults={'last_seen': now})
+    DetectionWorker.objects.filter(last_seen__lt=now - timedelta(seconds=settings.DETECTION_JOB_LOCK_TIMEOUT)).delete()
+
+def enqueue_analysis(product: FoodProduct, full_scan: bool = False) -> AnalysisJob:
+    """Queue a stored product for analysis by a detection worker"""
+    return AnalysisJob.objects.create(product=product, full_scan=full_scan)
+
+def claim_next_job(worker_id: str) -> Optional[AnalysisJob]:
+    """
+    Atomically take the oldest queued job
+
+    On backends with SKIP LOCKED (Postgres) concurrent workers skip rows that
+    another transaction is claiming. Elsewhere (SQLite) the job row itself is
+    the lock: a conditional UPDATE from 'queued' to 'running' only succeeds
+    for one worker, the others move on to the next candidate.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = (AnalysisJob.objects.select_for_update(skip_locked=True)
+                   .filter(status='queued').order_by('created_at').first())
+            if job is None:
+                return None
+            _mark_running(job, worker_id)
+            job.save(update_fields=['status', 'worker_id', 'locked_at', 'started_at', 'attempts'])
+            return job
+
+    candidate_ids = (AnalysisJob.objects.filter(status='queued')
+                     .order_by('created_at').values_list('pk', flat=True)[:10])
+    for job_id in candidate_ids:
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(pk=job_id, status='queued').update(
+            status='running',
+            worker_id=worker_id,
+            locked_at=now,
+            started_at=now,
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related('product').get(pk=job_id)
+    return None
+
+def _mark_running(job: AnalysisJob, worker_id: str) -> None:
+    now = timezone.now()
+    job.status = 'running'
+    job.worker_id = worker_id
+    job.locked_at = now
+    job.started_at = now
+    job.attempts += 1
+
+def requeue_stale_jobs() -> int:
+    """
+    Put back jobs whose worker died mid-analysis, failing those out of retries
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.DETECTION_JOB_LOCK_TIMEOUT)
+    stale = AnalysisJob.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.DETECTION_JOB_MAX_ATTEMPTS).update(
+        status='failed', error='Worker timed out', finished_at=timezone.now()
+    )
+    requeued = stale.update(status='queued', worker_id='', locked_at=None)
+    if failed or requeued:
+        logger.warning(f"Stale analysis jobs: {requeued} requeued, {failed} failed")
+    return requeued
+
+def touch_job(job: AnalysisJob) -> bool:
+    """Refresh the lock of a running job, False when it no longer belongs to this worker"""
+    return bool(AnalysisJob.objects.filter(pk=job.pk, status='running', worker_id=job.worker_id)
+                .update(locked_at=timezone.now()))
+
+@contextmanager
+def heartbeat(job: AnalysisJob):
+    """
+    Keep touching the job's lock while the block runs, so an analysis that
+    outlasts DETECTION_JOB_LOCK_TIMEOUT is not requeued and run twice
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.DETECTION_JOB_HEARTBEAT_INTERVAL):
+                if not touch_job(job):
+                    logger.warning(f"Analysis job {job.pk} was taken from worker {job.worker_id}")
+                    return
+                record_worker_heartbeat(job.worker_id)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+# Job progress (percent) reached when an analysis event of each stage is emitted
+STAGE_PROGRESS = {'prediction': 40, 'ocr': 90, 'verdict': 100}
+
+def run_job(job: AnalysisJob) -> AnalysisJob:
+    """Run a claimed job and record the outcome"""
+    record_event = event_recorder(job.product)
+
+    def on_event(stage, data):
+        record_event(stage, data)
+        progress = STAGE_PROGRESS.get(stage, job.progress)
+        if progress > job.progress:
+            job.progress = progress
+            AnalysisJob.objects.filter(pk=job.pk, worker_id=job.worker_id).update(progress=progress)
+
+    try:
+        with heartbeat(job):
+            if job.kind == 'ocr':
+                enrich_product_ocr(job.product, full_scan=job.full_scan, on_event=on_event)
+            else:
+                # Already off the request path, so never defer OCR again
+                analyze_product(job.product, full_scan=job.full_scan, on_event=on_event, defer_ocr=False)
+        job.status = 'completed'
+        job.progress = 100
+    except Exception as e:
+        logger.error(f"Analysis job {job.pk} failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+        record_event('error', {'error': 'Analysis failed'})
+    job.finished_at = timezone.now()
+
+    # Only the worker still holding the job records its outcome
+    finished = AnalysisJob.objects.filter(pk=job.pk, status='running', worker_id=job.worker_id).update(
+        status=job.status, progress=job.progress, error=job.error, finished_at=job.finished_at
+    )
+    if not finished:
+        logger.warning(f"Analysis job {job.pk} was requeued while running on {job.worker_id}, outcome dropped")
+        job.refresh_from_db()
+    return job
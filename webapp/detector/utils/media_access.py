@@ -0,0 +1,62 @@
+from functools import reduce
+from typing import Iterator, Optional, Tuple
+import operator
+import re
+
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+
+from ..models import Advertisement, CustomUser, FoodImage, GalleryItem, MediaItem, RenditionSource
+from .derivatives import RENDITION_DIR
+
+# renditions/<aa>/<source key>_<width>.<format>, see derivatives.rendition_name
+RENDITION_NAME = re.compile(rf'^{RENDITION_DIR}/[0-9a-f]{{2}}/(?P<key>[0-9a-f]{{64}})_\d+\.\w+$')
+
+PUBLIC = 'public'
+PRIVATE = 'private'
+
+def readable_files(user) -> Iterator[Tuple[type, str, Optional[Q], Optional[Q]]]:
+    """
+    Model, file field, filter of the rows published to everyone and filter
+    of the further rows `user` may read, either None for no rows: approved
+    library and gallery files, active advertisements and public profile
+    pictures for everyone, their own picture and product photos for signed
+    in users and every file for staff
+    """
+    everything = Q(pk__isnull=False) if user.is_staff else None
+    yield MediaItem, 'file', Q(status='approved'), everything
+    yield GalleryItem, 'image', Q(status='approved'), everything
+    yield Advertisement, 'file', Q(is_active=True), everything
+    signed_in = user.is_authenticated
+    yield (CustomUser, 'profile_picture', Q(profile__isnull=True) | Q(profile__profile_visibility='public'),
+           everything or (Q(pk=user.pk) if signed_in else None))
+    yield FoodImage, 'image', None, everything or (Q(product__user=user) if signed_in else None)
+
+def media_visibility(user, name: str) -> Optional[str]:
+    """
+    PUBLIC if everyone may read the stored file `name`, PRIVATE if only
+    `user` (its owner or staff) may, None if `user` may not
+
+    A rendition has the visibility of its source file. Each model costs one
+    indexed query, stopping at the first public match.
+    """
+    names = [name]
+    match = RENDITION_NAME.match(name)
+    if match:
+        names = list(RenditionSource.objects.filter(key=match['key']).values_list('name', flat=True))
+        if not names:
+            return None
+
+    visibility = None
+    for model, field, public, own in readable_files(user):
+        conditions = [condition for condition in (public, own) if condition is not None]
+        if not conditions:
+            continue
+        is_public = ExpressionWrapper(public, output_field=BooleanField()) if public is not None else Value(False)
+        matched = model.objects.filter(reduce(operator.or_, conditions), **{f'{field}__in': names}).annotate(
+            is_public=is_public
+        ).order_by('-is_public').values_list('is_public', flat=True).first()
+        if matched:
+            return PUBLIC
+        if matched is not None:
+            visibility = PRIVATE
+    return visibility
@@ -0,0 +1,69 @@
+from typing import BinaryIO, Optional, Tuple
+import os
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong ETag from size and modification time, usable for If-Range"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte (inclusive) requested by a single-range Range
+    header. None when the header is malformed or asks for several ranges,
+    which servers may answer with the whole file.
+
+    Raises:
+        RangeNotSatisfiable: The range starts past the end of the file
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, separator, last = spec.strip().partition('-')
+    if not separator or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # Suffix range, the last N bytes
+        suffix = int(last)
+        if not suffix or not size:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    return first, min(int(last), size - 1) if last else size - 1
+
+class RangedFile:
+    """
+    Read-only view of `length` bytes of a file from `offset`
+
+    Keeps fileno() so a WSGI server's file_wrapper can still sendfile() the
+    range: the file is positioned at the offset and the server sends
+    Content-Length bytes from there. Servers without sendfile read through
+    read(), which stops at the end of the range.
+    """
+    def __init__(self, file: BinaryIO, offset: int, length: int):
+        self.file = file
+        self.remaining = length
+        file.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,41 @@
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from ..models import Advertisement, GalleryItem, MediaItem
+
+MEDIA_COUNTS_CACHE_KEY = 'detector:media_counts'
+
+def count_media() -> Dict[str, int]:
+    """Media library counters, one conditional aggregate query per model"""
+    counts = {}
+    counts.update(Advertisement.objects.aggregate(
+        total_advertisements=Count('pk'),
+        active_advertisements=Count('pk', filter=Q(is_active=True)),
+    ))
+    counts.update(MediaItem.objects.aggregate(
+        total_media_items=Count('pk'),
+        approved_media_items=Count('pk', filter=Q(status='approved')),
+        pending_media_items=Count('pk', filter=Q(status='pending')),
+    ))
+    counts.update(GalleryItem.objects.aggregate(
+        total_gallery_items=Count('pk'),
+        featured_gallery_items=Count('pk', filter=Q(is_featured=True)),
+    ))
+    return counts
+
+def media_counts() -> Dict[str, int]:
+    """
+    count_media() cached for MEDIA_COUNTS_CACHE_SECONDS. Signals drop the
+    cached value whenever an advertisement, media or gallery item changes.
+    """
+    counts = cache.get(MEDIA_COUNTS_CACHE_KEY)
+    if counts is None:
+        counts = count_media()
+        cache.set(MEDIA_COUNTS_CACHE_KEY, counts, settings.MEDIA_COUNTS_CACHE_SECONDS)
+    return counts
+
+def invalidate_media_counts() -> None:
+    cache.delete(MEDIA_COUNTS_CACHE_KEY)
@@ -1,4 +1,4 @@
-from typing import Dict, List, Tuple, Optional, Union
+from typing import Callable, Dict, List, Tuple, Optional, Union
 import numpy as np
 import tensorflow as tf
 import cv2
@@ -9,10 +9,27 @@ from pathlib import Path
 import re
 from datetime import datetime
 from fuzzywuzzy import fuzz
+from django.conf import settings
 import io
 
+from .concurrency import model_slots, ocr_slots
+from .image_quality import check_image_quality
+
 logger = logging.getLogger(__name__)
 
+def decode_image(image_data: bytes) -> np.ndarray:
+    """
+    Decode raw image bytes into a BGR array
+    
+    Raises:
+        ValueError: The bytes are not a decodable image
+    """
+    nparr = np.frombuffer(image_data, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image data")
+    return img
+
 class MLPredictor:
     """
     Handles ML model loading and inference for food product authenticity detection
@@ -59,8 +76,7 @@ class MLPredictor:
         try:
             # Convert bytes to numpy array if needed
             if isinstance(image_data, bytes):
-                nparr = np.frombuffer(image_data, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                img = decode_image(image_data)
             else:
                 img = image_data
 
@@ -141,6 +157,54 @@ class MLPredictor:
             logger.error(f"Prediction failed: {e}")
             raise
 
+    def predict_batch(self, images: List[Union[bytes, np.ndarray]]) -> List[Tuple[str, float]]:
+        """
+        Make predictions for many images with a single model call
+        
+        Args:
+            images: Raw image bytes or numpy arrays
+            
+        Returns:
+            List of (prediction label, confidence score), in input order
+        """
+        if not images:
+            return []
+        if self.is_dev_mode:
+            return [self.predict_single(image_data) for image_data in images]
+            
+        try:
+            if self.model is None:
+                self._load_model()
+            
+            batch = np.concatenate([self.preprocess_image(image_data) for image_data in images])
+            preds = self.model.predict(batch, verbose=0)
+            
+            results = []
+            for pred in preds:
+                pred_class = self.class_names[int(round(pred[0]))]
+                confidence = float(pred[0]) if pred_class == 'REAL' else float(1 - pred[0])
+                results.append((pred_class, confidence))
+            return results
+            
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}")
+            raise
+
+# Tesseract settings per view type. 'psm' is the page segmentation mode, 'oem'
+# the engine mode, 'whitelist' restricts recognised characters and
+# 'max_dimension' caps the longest image side before OCR.
+# settings.OCR_PROFILES entries are merged over these.
+DEFAULT_OCR_PROFILES = {
+    'default': {'psm': 3, 'oem': 1, 'lang': 'eng', 'whitelist': None, 'max_dimension': 1600},
+    # Brand artwork: a few scattered words, sparse text mode is much faster
+    'front': {'psm': 11, 'max_dimension': 1200},
+    # Ingredients / expiry / batch / MRP panel: one uniform block of text
+    'back': {'psm': 6, 'max_dimension': 1600},
+    'side': {'psm': 11, 'max_dimension': 1200},
+    # Printed digits under the bars only
+    'barcode': {'psm': 7, 'whitelist': '0123456789', 'max_dimension': 1000},
+}
+
 class OCRProcessor:
     """
     Handles OCR processing and text extraction from images
@@ -149,16 +213,40 @@ class OCRProcessor:
         # Configure Tesseract path
         pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
         
+        self.profiles = self._load_profiles()
+        
         self.date_pattern = r'(\d{2}\/\d{2}\/\d{4}|\d{2}\.\d{2}\.\d{4})'
         self.batch_pattern = r'batch\s*(?:no\.?|number\.?)?\s*:?\s*([a-z0-9]+)'
         self.mrp_pattern = r'mrp\.?\s*:?\s*(?:rs\.?)?\s*(\d+(?:\.\d{2})?)'
 
-    def process_image(self, image_data: Union[bytes, np.ndarray]) -> Dict[str, str]:
+    def _load_profiles(self) -> Dict[str, Dict]:
+        """Merge settings.OCR_PROFILES over the default per-view profiles"""
+        overrides = getattr(settings, 'OCR_PROFILES', {})
+        base = {**DEFAULT_OCR_PROFILES['default'], **overrides.get('default', {})}
+        return {
+            view_type: {**base, **DEFAULT_OCR_PROFILES.get(view_type, {}), **overrides.get(view_type, {})}
+            for view_type in set(DEFAULT_OCR_PROFILES) | set(overrides)
+        }
+
+    def get_profile(self, view_type: Optional[str] = None) -> Dict:
+        """Return the OCR profile for a FoodImage.view_type, falling back to 'default'"""
+        return self.profiles.get(view_type or 'default', self.profiles['default'])
+
+    @staticmethod
+    def build_config(profile: Dict) -> str:
+        """Build the Tesseract command line config string for a profile"""
+        config = f"--oem {profile['oem']} --psm {profile['psm']}"
+        if profile.get('whitelist'):
+            config += f" -c tessedit_char_whitelist={profile['whitelist']}"
+        return config
+
+    def process_image(self, image_data: Union[bytes, np.ndarray], view_type: Optional[str] = None) -> Dict[str, str]:
         """
         Extract text and key information from image
         
         Args:
             image_data: Raw image bytes or numpy array
+            view_type: FoodImage.view_type used to pick the OCR profile
             
         Returns:
             Dict containing extracted text and structured information
@@ -170,8 +258,19 @@ class OCRProcessor:
             else:
                 img = Image.fromarray(cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB))
 
+            profile = self.get_profile(view_type)
+            
+            # Downscale large photos, Tesseract time grows with pixel count
+            max_dimension = profile.get('max_dimension')
+            if max_dimension and max(img.size) > max_dimension:
+                img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
             # Extract text using Tesseract
-            text = pytesseract.image_to_string(img)
+            text = pytesseract.image_to_string(
+                img,
+                lang=profile['lang'],
+                config=self.build_config(profile)
+            )
             text = text.lower()
 
             # Extract structured information
@@ -238,16 +337,114 @@ class OCRProcessor:
 ml_predictor = MLPredictor()
 ocr_processor = OCRProcessor()
 
+# Views most likely to carry the printed expiry/batch/MRP block are OCR'd first
+OCR_VIEW_PRIORITY = ['back', 'side', 'barcode', 'other', 'front']
+
+# OCR fields that must all be found before the remaining views can be skipped
+REQUIRED_OCR_FIELDS = ('expiry_dates', 'batch_numbers', 'mrp_values')
+
+def order_views_for_ocr(view_types: List[str]) -> List[str]:
+    """
+    Order views so that the ones most likely to hold label details are OCR'd first.
+    Unknown view types keep their relative order and go last.
+    """
+    def priority(view_type: str) -> int:
+        if view_type in OCR_VIEW_PRIORITY:
+            return OCR_VIEW_PRIORITY.index(view_type)
+        return len(OCR_VIEW_PRIORITY)
+
+    return sorted(view_types, key=priority)
+
+def ocr_fields_complete(ocr_results: Dict[str, set], brand_name: str) -> bool:
+    """
+    Check whether all required OCR fields and a brand match have been found
+    """
+    if not all(ocr_results[field] for field in REQUIRED_OCR_FIELDS):
+        return False
+    return ocr_processor.verify_brand(list(ocr_results['extracted_brands']), brand_name)
+
+def run_ocr_stage(
+    images: Dict[str, Union[bytes, np.ndarray]],
+    brand_name: str,
+    full_scan: bool = False
+) -> Dict[str, Union[bool, Dict, List]]:
+    """
+    OCR the views of a product in OCR_VIEW_PRIORITY order, stopping as soon as
+    the required fields and a brand match are found unless full_scan is set
+    
+    Raises:
+        CapacityExceeded: No OCR slot freed up within DETECTION_SLOT_TIMEOUT
+        
+    Returns:
+        Dict with the aggregated ocr_results (lists), brand_match, the text
+        read per view and the views skipped by the early exit
+    """
+    ocr_results = {
+        'extracted_brands': set(),
+        'expiry_dates': set(),
+        'batch_numbers': set(),
+        'mrp_values': set()
+    }
+    texts = {}
+    skipped_views = []
+    
+    for view_type in order_views_for_ocr(list(images)):
+        if not full_scan and ocr_fields_complete(ocr_results, brand_name):
+            skipped_views.append(view_type)
+            continue
+        
+        with ocr_slots.acquire():
+            ocr_result = ocr_processor.process_image(images[view_type], view_type)
+        texts[view_type] = ocr_result['full_text']
+        
+        # Aggregate OCR results
+        if ocr_result['extracted_brands']:
+            ocr_results['extracted_brands'].update(ocr_result['extracted_brands'])
+        if ocr_result['expiry_date']:
+            ocr_results['expiry_dates'].add(ocr_result['expiry_date'])
+        if ocr_result['batch_number']:
+            ocr_results['batch_numbers'].add(ocr_result['batch_number'])
+        if ocr_result['mrp']:
+            ocr_results['mrp_values'].add(ocr_result['mrp'])
+    
+    # Sorted lists for JSON serialization
+    ocr_results = {k: sorted(v) for k, v in ocr_results.items()}
+    return {
+        'ocr_results': ocr_results,
+        'brand_match': ocr_processor.verify_brand(ocr_results['extracted_brands'], brand_name),
+        'texts': texts,
+        'skipped_views': skipped_views
+    }
+
 def process_product_images(
     images: Dict[str, bytes], 
-    brand_name: str
+    brand_name: str,
+    full_scan: bool = False,
+    predictions: Optional[Dict[str, Tuple[str, float]]] = None,
+    on_event: Optional[Callable[[str, Dict], None]] = None,
+    defer_ocr: bool = False,
+    ocr_views: Optional[List[str]] = None
 ) -> Dict[str, Union[str, float, Dict]]:
     """
     Process multiple product images and combine results
     
+    ML prediction runs on every view, then OCR runs through run_ocr_stage.
+    Views failing the image quality pre-check are reported in
+    'quality_issues' and left out of OCR unless IMAGE_QUALITY_GATE is 'off'.
+    
     Args:
         images: Dict of image type to image data
         brand_name: User provided brand name
+        full_scan: OCR every view even when the required fields are already found
+        predictions: ML results already computed per view (e.g. by predict_batch)
+        on_event: Called with (stage, data) after the quality check, after each
+            view prediction and when OCR is done
+        defer_ocr: Return the ML verdict only, with ocr_status 'pending'. OCR
+            is left to run_ocr_stage later
+        ocr_views: OCR only these views, e.g. the sharpest frames of a video scan
+        
+    Raises:
+        CapacityExceeded: No model or OCR slot freed up within DETECTION_SLOT_TIMEOUT
         
     Returns:
         Dict containing combined analysis results
@@ -259,59 +456,66 @@ def process_product_images(
             'brand_match': False,
             'detailed_analysis': {},
             'ocr_results': {
-                'extracted_brands': set(),
-                'expiry_dates': set(),
-                'batch_numbers': set(),
-                'mrp_values': set()
+                'extracted_brands': [],
+                'expiry_dates': [],
+                'batch_numbers': [],
+                'mrp_values': []
             },
+            'ocr_skipped_views': [],
+            'quality_issues': {},
+            'ocr_status': 'pending' if defer_ocr else 'completed',
             'processing_time': 0.0
         }
         
         start_time = datetime.now()
         total_confidence = 0.0
-        predictions = {'REAL': 0, 'FAKE': 0}
+        votes = {'REAL': 0, 'FAKE': 0}
         
-        # Process each image
+        if settings.IMAGE_QUALITY_GATE != 'off':
+            results['quality_issues'] = check_image_quality(images)
+            if results['quality_issues'] and on_event:
+                on_event('quality', {'quality_issues': results['quality_issues']})
+        
+        # ML prediction on each image
         for view_type, image_data in images.items():
-            # ML prediction
-            pred_class, confidence = ml_predictor.predict_single(image_data)
-            predictions[pred_class] += 1
+            if predictions and view_type in predictions:
+                pred_class, confidence = predictions[view_type]
+            else:
+                with model_slots.acquire():
+                    pred_class, confidence = ml_predictor.predict_single(image_data)
+            votes[pred_class] += 1
             total_confidence += confidence
             
-            # OCR processing
-            ocr_result = ocr_processor.process_image(image_data)
-            
             # Store detailed results
             results['detailed_analysis'][view_type] = {
                 'prediction': pred_class,
                 'confidence': confidence,
-                'ocr_text': ocr_result['full_text']
+                'ocr_text': ''
             }
-            
-            # Aggregate OCR results
-            if ocr_result['extracted_brands']:
-                results['ocr_results']['extracted_brands'].update(ocr_result['extracted_brands'])
-            if ocr_result['expiry_date']:
-                results['ocr_results']['expiry_dates'].add(ocr_result['expiry_date'])
-            if ocr_result['batch_number']:
-                results['ocr_results']['batch_numbers'].add(ocr_result['batch_number'])
-            if ocr_result['mrp']:
-                results['ocr_results']['mrp_values'].add(ocr_result['mrp'])
+            if on_event:
+                on_event('prediction', {'view_type': view_type, 'prediction': pred_class, 'confidence': confidence})
+        
+        # OCR processing, most informative views first
+        if not defer_ocr:
+            ocr_images = {view: image for view, image in images.items()
+                          if (ocr_views is None or view in ocr_views) and view not in results['quality_issues']}
+            ocr = run_ocr_stage(ocr_images, brand_name, full_scan=full_scan)
+            for view_type, text in ocr['texts'].items():
+                results['detailed_analysis'][view_type]['ocr_text'] = text
+            results['ocr_results'] = ocr['ocr_results']
+            results['ocr_skipped_views'] = ocr['skipped_views']
+            results['brand_match'] = ocr['brand_match']
+            if on_event:
+                on_event('ocr', {
+                    'ocr_results': ocr['ocr_results'],
+                    'skipped_views': ocr['skipped_views']
+                })
         
         # Calculate overall results
         num_images = len(images)
-        results['overall_prediction'] = 'REAL' if predictions['REAL'] > predictions['FAKE'] else 'FAKE'
+        results['overall_prediction'] = 'REAL' if votes['REAL'] > votes['FAKE'] else 'FAKE'
         results['overall_confidence'] = total_confidence / num_images if num_images > 0 else 0.0
         
-        # Convert sets to lists for JSON serialization
-        results['ocr_results'] = {k: list(v) for k, v in results['ocr_results'].items()}
-        
-        # Check brand match
-        results['brand_match'] = ocr_processor.verify_brand(
-            results['ocr_results']['extracted_brands'], 
-            brand_name
-        )
-        
         # Calculate processing time
         results['processing_time'] = (datetime.now() - start_time).total_seconds()
         
@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from ..models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+# Upload-Checksum algorithms, both available to browsers through crypto.subtle
+CHECKSUM_ALGORITHMS = {'sha1', 'sha256'}
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+class ChunkError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+def parse_checksum(header: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Algorithm and digest of an `Upload-Checksum: <algorithm> <base64>` header
+
+    Raises:
+        ChunkError: Unsupported algorithm or malformed digest
+    """
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(' ')
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ChunkError(f"Unsupported checksum algorithm {algorithm!r}", 400)
+    try:
+        return algorithm, base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise ChunkError('Malformed checksum', 400)
+
+def append_chunk(session: UploadSession, stream: BinaryIO, offset: int, length: int,
+                 checksum: Optional[Tuple[str, bytes]] = None) -> int:
+    """
+    Write `length` bytes from `stream` at `offset` of the session's partial
+    file and return the new offset
+
+    The chunk is streamed to a temporary file in UPLOAD_SESSION_DIR while it
+    is hashed, so neither the chunk nor the file is held in memory. Only a
+    verified chunk is copied into the partial file, under a compare-and-swap
+    on the offset so two clients resuming the same session cannot both
+    write the same range.
+
+    Raises:
+        ChunkError: Offset mismatch (409), oversized chunk (413) or checksum mismatch (460)
+    """
+    if offset != session.offset:
+        raise ChunkError(f"Upload is at offset {session.offset}, not {offset}", 409)
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        raise ChunkError(f"Chunks are limited to {settings.UPLOAD_CHUNK_SIZE} bytes", 413)
+    if offset + length > session.size:
+        raise ChunkError(f"Chunk ends past the declared size of {session.size} bytes", 400)
+
+    digest = hashlib.new(checksum[0]) if checksum else None
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    with tempfile.TemporaryFile(dir=settings.UPLOAD_SESSION_DIR) as chunk:
+        remaining = length
+        while remaining:
+            data = stream.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not data:
+                raise ChunkError(f"Chunk ended {remaining} bytes early", 400)
+            if digest:
+                digest.update(data)
+            chunk.write(data)
+            remaining -= len(data)
+        if digest and digest.digest() != checksum[1]:
+            raise ChunkError('Chunk checksum mismatch', 460)
+
+        chunk.seek(0)
+        with transaction.atomic():
+            claimed = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+                offset=F('offset') + length, updated_at=timezone.now()
+            )
+            if not claimed:
+                raise ChunkError('Upload offset changed while the chunk was received', 409)
+            # Rolls the offset back if the write fails
+            with open(session.partial_path(), 'r+b' if offset else 'wb') as partial:
+                partial.seek(offset)
+                shutil.copyfileobj(chunk, partial)
+
+    session.offset = offset + length
+    return session.offset
+
+class AssembledUpload(UploadedFile):
+    """
+    A completed upload session as a form file
+
+    Exposes temporary_file_path() like Django's TemporaryUploadedFile, so
+    FileSystemStorage moves the partial file into place instead of copying.
+    """
+    def __init__(self, session: UploadSession):
+        super().__init__(open(session.partial_path(), 'rb'), session.filename,
+                         session.content_type or None, session.size)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+def parse_tokens(values: List[str]) -> List[uuid.UUID]:
+    """Upload tokens among submitted values, anything that is not a UUID dropped"""
+    tokens = []
+    for value in values:
+        try:
+            tokens.append(uuid.UUID(value))
+        except (TypeError, ValueError, AttributeError):
+            logger.warning(f"Ignoring malformed upload token {value!r}")
+    return tokens
+
+@contextmanager
+def attach_uploads(request, field_name: str) -> Iterator[Tuple[MultiValueDict, List[UploadSession]]]:
+    """
+    Copy of request.FILES with the completed upload sessions named in
+    POST[<field_name>_upload_token] added under `field_name`
+
+    Unknown, foreign, malformed and incomplete sessions are skipped, leaving
+    the form to report the missing file. The assembled files are closed on
+    exit, whether or not the form saved them.
+    """
+    files = request.FILES.copy()
+    tokens = parse_tokens(request.POST.getlist(f"{field_name}_upload_token"))
+    if not tokens:
+        yield files, []
+        return
+
+    sessions = []
+    assembled = []
+    try:
+        for session in UploadSession.objects.filter(user=request.user, token__in=tokens):
+            if not session.is_complete:
+                logger.warning(f"Upload session {session.token} submitted at {session.offset}/{session.size} bytes")
+                continue
+            upload = AssembledUpload(session)
+            assembled.append(upload)
+            files.appendlist(field_name, upload)
+            sessions.append(session)
+        yield files, sessions
+    finally:
+        for upload in assembled:
+            upload.close()
+
+def discard_session(session: UploadSession) -> None:
+    """Delete a session and whatever is left of its partial file"""
+    try:
+        os.remove(session.partial_path())
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY)
+
+def open_session_count(user) -> int:
+    """Sessions of `user` that are neither consumed nor expired"""
+    return UploadSession.objects.filter(user=user, updated_at__gte=expiry_cutoff()).count()
+
+def expire_sessions() -> int:
+    """Discard sessions idle for longer than UPLOAD_SESSION_EXPIRY"""
+    expired = list(UploadSession.objects.filter(updated_at__lt=expiry_cutoff()))
+    for session in expired:
+        discard_session(session)
+    return len(expired)
@@ -0,0 +1,79 @@
+from concurrent.futures import Future
+from typing import List, Optional
+import io
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .concurrency import decode_executor, detection_admission
+from .image_headers import validate_image_header
+from .ml_utils import decode_image
+
+logger = logging.getLogger(__name__)
+
+class PreprocessingUploadHandler(FileUploadHandler):
+    """
+    Starts decoding each uploaded image as soon as its multipart part is
+    complete, while later parts are still arriving.
+
+    Installed in front of Django's default handlers. Chunks are copied and
+    passed on unchanged, and file_complete returns None, so request.FILES is
+    built exactly as before.
+
+    Prefetching is skipped while detection admission is saturated or the
+    decode queue is full: a request that may be shed should not be decoded
+    first. Skipped parts are decoded after admission instead.
+    """
+    image_field = 'images[]'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.futures: List[Optional[Future]] = []  # One entry per image part, in upload order
+        self._is_image = False
+        self._buffer = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._is_image = field_name == self.image_field
+        self._buffer = io.BytesIO() if self._is_image else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._buffer is not None:
+            if self._buffer.tell() + len(raw_data) > settings.MAX_IMAGE_SIZE:
+                # Too large to prefetch, decoded later from request.FILES
+                self._buffer = None
+            else:
+                self._buffer.write(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self._is_image:
+            future = None
+            if self._buffer is not None:
+                try:
+                    validate_image_header(self._buffer)
+                    if not detection_admission.saturated():
+                        future = decode_executor.try_submit(decode_image, self._buffer.getvalue())
+                except ValueError as e:
+                    # Rejected by request validation, not worth decoding
+                    logger.info(f"Not prefetching upload: {e}")
+            self.futures.append(future)
+        self._is_image = False
+        self._buffer = None
+        return None
+
+    def decoded_images(self) -> List[Optional[np.ndarray]]:
+        """
+        Wait for the decode stage, aligned with request.FILES.getlist('images[]').
+        Parts that were not prefetched or failed to decode are None.
+        """
+        decoded = []
+        for future in self.futures:
+            try:
+                decoded.append(future.result() if future else None)
+            except ValueError as e:
+                logger.warning(f"Prefetch decode failed: {e}")
+                decoded.append(None)
+        return decoded
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+# Side of the grayscale frame blur and similarity are measured on
+ANALYSIS_WIDTH = 320
+
+class KeyFrame(NamedTuple):
+    index: int  # Frame number in the video
+    timestamp: float  # Seconds from the start
+    sharpness: float  # Variance of the Laplacian, higher is sharper
+    dhash: int  # 64-bit difference hash
+    image: np.ndarray  # BGR frame, longest side at most UPLOAD_MAX_DIMENSION
+
+def frame_sharpness(gray: np.ndarray) -> float:
+    """Variance of the Laplacian, low for blurred or motion-smeared frames"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+def difference_hash(gray: np.ndarray) -> int:
+    """64-bit dHash: whether each pixel of a 9x8 thumbnail is brighter than its right neighbour"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+def hash_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+def _limit_size(frame: np.ndarray) -> np.ndarray:
+    height, width = frame.shape[:2]
+    scale = settings.UPLOAD_MAX_DIMENSION / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+def _drop_closest(candidates: List[KeyFrame]) -> None:
+    """Remove the blurrier frame of the most similar pair"""
+    pairs = ((hash_distance(a.dhash, b.dhash), i, j)
+             for i, a in enumerate(candidates) for j, b in enumerate(candidates) if i < j)
+    _, i, j = min(pairs)
+    del candidates[i if candidates[i].sharpness < candidates[j].sharpness else j]
+
+def sample_keyframes(path: str) -> List[KeyFrame]:
+    """
+    Sharp, mutually distinct frames of a video, in time order
+
+    Decodes at most VIDEO_SCAN_MAX_SECONDS of video and only retrieves
+    VIDEO_SCAN_SAMPLE_FPS frames per second. Frames below
+    VIDEO_SCAN_MIN_SHARPNESS are dropped, and a frame within
+    VIDEO_SCAN_HASH_DISTANCE dHash bits of a kept one only replaces it when
+    sharper. At most 3x VIDEO_SCAN_VIEWS candidates are held in memory.
+
+    Raises:
+        ValueError: The file is not a readable video
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('Could not read the video')
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / settings.VIDEO_SCAN_SAMPLE_FPS))
+        last_frame = int(fps * settings.VIDEO_SCAN_MAX_SECONDS)
+        max_candidates = 3 * len(settings.VIDEO_SCAN_VIEWS)
+        candidates: List[KeyFrame] = []
+
+        for index in range(last_frame):
+            # grab() skips a frame without converting it, retrieve() only for sampled ones
+            if not capture.grab():
+                break
+            if index % step:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+
+            height, width = frame.shape[:2]
+            gray = cv2.cvtColor(
+                cv2.resize(frame, (ANALYSIS_WIDTH, max(1, round(height * ANALYSIS_WIDTH / width))),
+                           interpolation=cv2.INTER_AREA),
+                cv2.COLOR_BGR2GRAY
+            )
+            sharpness = frame_sharpness(gray)
+            if sharpness < settings.VIDEO_SCAN_MIN_SHARPNESS:
+                continue
+
+            frame_hash = difference_hash(gray)
+            similar = [i for i, kept in enumerate(candidates)
+                       if hash_distance(kept.dhash, frame_hash) <= settings.VIDEO_SCAN_HASH_DISTANCE]
+            if similar:
+                best = max(similar, key=lambda i: candidates[i].sharpness)
+                if candidates[best].sharpness >= sharpness:
+                    continue
+                # Same view, sharper: take the place of the kept frame
+                del candidates[best]
+
+            candidates.append(KeyFrame(index, index / fps, sharpness, frame_hash, _limit_size(frame)))
+            if len(candidates) > max_candidates:
+                _drop_closest(candidates)
+    finally:
+        capture.release()
+
+    return select_keyframes(candidates, len(settings.VIDEO_SCAN_VIEWS))
+
+def select_keyframes(candidates: List[KeyFrame], count: int) -> List[KeyFrame]:
+    """`count` candidates spread evenly over the video, in time order"""
+    if len(candidates) <= count:
+        return candidates
+    positions = np.linspace(0, len(candidates) - 1, count)
+    return [candidates[int(round(position))] for position in positions]
+
+def keyframe_views(keyframes: List[KeyFrame]) -> Dict[str, KeyFrame]:
+    """
+    Name keyframes after the views of VIDEO_SCAN_VIEWS in filming order:
+    the pack is filmed front first and turned once
+    """
+    return dict(zip(settings.VIDEO_SCAN_VIEWS, keyframes))
+
+def select_ocr_views(views: Dict[str, KeyFrame]) -> List[str]:
+    """The VIDEO_SCAN_OCR_FRAMES sharpest views, the only ones worth OCR time"""
+    ranked = sorted(views, key=lambda view_type: views[view_type].sharpness, reverse=True)
+    return ranked[:settings.VIDEO_SCAN_OCR_FRAMES]
+
+@contextmanager
+def video_file_path(upload) -> Iterator[str]:
+    """Path OpenCV can open for an uploaded video, spooling in-memory uploads to disk"""
+    if hasattr(upload, 'temporary_file_path'):
+        yield upload.temporary_file_path()
+        return
+
+    suffix = os.path.splitext(upload.name or '')[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as spooled:
+        for chunk in upload.chunks():
+            spooled.write(chunk)
+        spooled.flush()
+        yield spooled.name
@@ -4,25 +4,74 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.authentication import CSRFCheck
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.throttling import ScopedRateThrottle, UserRateThrottle
 from django.views.generic import TemplateView, View
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils._os import safe_join
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
+from django.db.models import Count
 from django.core.paginator import Paginator
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from asgiref.sync import sync_to_async
+from PIL import Image
+from contextlib import nullcontext
+from functools import partial
+from urllib.parse import quote
+import asyncio
+import cv2
+import json
 import logging
-
-from .models import (CustomUser, UserProfile, FoodProduct, FoodImage, 
-                    Advertisement, GalleryItem, MediaItem, UserActivity)
-from .forms import CustomUserRegistrationForm, CustomUserLoginForm, UserProfileForm, CustomUserUpdateForm
-from .serializers import FoodProductSerializer, FoodImageSerializer
+import math
+import mimetypes
+import os
+import time
+import uuid
+
+from .models import (CustomUser, UserProfile, FoodProduct, FoodImage, AnalysisJob, AnalysisEvent,
+                    Advertisement, GalleryItem, MediaItem, Tag, UploadSession, UserActivity, UserAnalysisStats)
+from .forms import (CustomUserRegistrationForm, CustomUserLoginForm, UserProfileForm, CustomUserUpdateForm,
+                    AdvertisementForm, GalleryItemForm, MediaItemForm)
+from .serializers import (FoodProductSerializer, FoodImageSerializer, FoodProductCompactSerializer,
+                          FoodProductListSerializer)
+from .utils.analysis import (aapply_analysis_results, analyze_product, event_recorder, should_defer_ocr,
+                             verdict_event_data)
+from .utils.bulk_detection import BulkRequestError, parse_archive_batch, parse_multipart_batch, run_bulk_detection
+from .utils.concurrency import (CapacityExceeded, Overloaded, analysis_executor, decode_executor, detection_admission,
+                                model_slots)
+from .utils.derivatives import available_formats, get_rendition, mime_type
+from .utils.idempotency import (IdempotencyKeyReused, find_submission, idempotency_key_error, submission_guard,
+                                upload_digest)
+from .utils.image_headers import validate_image_header
+from .utils.image_quality import check_image_quality, check_upload_quality
+from .utils.media_serving import RangedFile, RangeNotSatisfiable, file_etag, parse_byte_range
+from .utils.media_access import PRIVATE, RENDITION_NAME, media_visibility
+from .utils.media_stats import media_counts
+from .utils.job_queue import enqueue_analysis
+from .utils.ml_utils import decode_image, ml_predictor, process_product_images
+from .utils.resumable_uploads import (ChunkError, append_chunk, attach_uploads, discard_session, open_session_count,
+                                      parse_checksum)
+from .utils.search import full_text_search
+from .utils.upload_handlers import PreprocessingUploadHandler
+from .utils.video_scan import keyframe_views, sample_keyframes, select_ocr_views, video_file_path
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +92,79 @@ def log_user_activity(user, activity_type, description="", request=None):
             user_agent=user_agent
         )
 
+def validate_detection_request(brand_name, images, view_types):
+    """Return an error message for an invalid detection upload, or None"""
+    if not brand_name:
+        return 'Brand name is required'
+    if not images:
+        return 'At least one image is required'
+    if len(images) != len(view_types):
+        return 'Number of images and view types must match'
+    if len(set(view_types)) != len(view_types):
+        return 'Each view type can only be uploaded once'
+    # Header only, nothing is decoded for rejected uploads
+    for image in images:
+        try:
+            validate_image_header(image)
+        except ValueError as e:
+            return f'{image.name}: {e}'
+    return None
+
+def parse_progress_token(value):
+    """Client-chosen UUID the analysis events can be followed by before the product id is known"""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+def quality_rejection_data(issues):
+    """Body of the 422 answered when IMAGE_QUALITY_GATE rejects an upload"""
+    return {
+        'error': f"Please retake the {', '.join(issues)} image{'s' if len(issues) > 1 else ''}",
+        'quality_issues': issues
+    }
+
+def exceeds_inline_pixels(food_images):
+    """Whether stored images are too large to analyse inside the request"""
+    pixels = sum((image.image_width or 0) * (image.image_height or 0) for image in food_images)
+    return pixels > settings.DETECTION_INLINE_MAX_PIXELS
+
+def replayed_submission(product, product_data):
+    """
+    Body, status and headers answering a repeated submission with the
+    original product: its result once analysed, otherwise where to follow
+    the analysis still running
+    """
+    headers = {'Idempotent-Replayed': 'true'}
+    if product.final_prediction:
+        return product_data(product), status.HTTP_200_OK, headers
+
+    job = product.jobs.filter(kind='analysis').order_by('-created_at').first()
+    status_url = reverse('detector:analysis_status', kwargs={'pk': product.pk})
+    headers['Location'] = status_url
+    return {
+        'job_id': job.pk if job else None,
+        'product_id': product.pk,
+        'status': job.status if job else 'running',
+        'status_url': status_url
+    }, status.HTTP_202_ACCEPTED, headers
+
+def queued_submission(product, full_scan=False):
+    """Enqueue the stored product for a detection worker, body, status and headers of the 202"""
+    job = enqueue_analysis(product, full_scan=full_scan)
+    status_url = reverse('detector:analysis_status', kwargs={'pk': product.pk})
+    return {
+        'job_id': job.pk,
+        'product_id': product.pk,
+        'status': job.status,
+        'status_url': status_url
+    }, status.HTTP_202_ACCEPTED, {'Location': status_url}
+
+def queued_response(product, full_scan=False):
+    """queued_submission as a DRF response"""
+    data, status_code, headers = queued_submission(product, full_scan)
+    return Response(data, status=status_code, headers=headers)
+
 class UploadView(TemplateView):
     """View for the image upload page"""
     template_name = 'detector/upload.html'
@@ -53,6 +175,16 @@ class UploadView(TemplateView):
         context['advertisements'] = Advertisement.objects.filter(is_active=True).order_by('-created_at')[:5]
         return context
 
+class VideoUploadView(TemplateView):
+    """Page scanning a product from a video, posted to VideoScanView"""
+    template_name = 'detector/media/video_upload.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['max_video_mb'] = settings.VIDEO_SCAN_MAX_SIZE // (1024 * 1024)
+        context['max_video_seconds'] = settings.VIDEO_SCAN_MAX_SECONDS
+        return context
+
 class AboutView(TemplateView):
     template_name = 'detector/about.html'
 
@@ -140,19 +272,18 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         # Get user's recent food products
         recent_products = FoodProduct.objects.filter(user=user).order_by('-created_at')[:5]
         
-        # Get user statistics
-        total_analyses = FoodProduct.objects.filter(user=user).count()
-        fake_products = FoodProduct.objects.filter(user=user, final_prediction='Fake').count()
-        real_products = FoodProduct.objects.filter(user=user, final_prediction='Real').count()
+        # Totals kept up to date by signals, a single primary key read
+        stats = UserAnalysisStats.objects.filter(user=user).first() or UserAnalysisStats(user=user)
         
         # Get recent activities
         recent_activities = UserActivity.objects.filter(user=user).order_by('-timestamp')[:10]
         
         context.update({
             'recent_products': recent_products,
-            'total_analyses': total_analyses,
-            'fake_products': fake_products,
-            'real_products': real_products,
+            'total_analyses': stats.total_analyses,
+            'fake_products': stats.fake_count,
+            'real_products': stats.real_count,
+            'last_analysis_at': stats.last_analysis_at,
             'recent_activities': recent_activities,
         })
         return context
@@ -221,11 +352,7 @@ class AnalysesView(LoginRequiredMixin, TemplateView):
         products = FoodProduct.objects.filter(user=user).order_by('-created_at')
         
         if search_query:
-            products = products.filter(
-                Q(brand_name__icontains=search_query) |
-                Q(final_prediction__icontains=search_query) |
-                Q(analysis_notes__icontains=search_query)
-            )
+            products = full_text_search(products, search_query, 'brand_name', 'final_prediction', 'analysis_notes')
         
         # Pagination
         paginator = Paginator(products, 10)  # 10 items per page
@@ -278,21 +405,23 @@ class AdsUploadView(UserPassesTestMixin, TemplateView):
             return redirect('detector:upload')
 
         try:
-            files = request.FILES.getlist('files')
             content_type = request.POST.get('content_type')
             title = request.POST.get('title')
             description = request.POST.get('description')
             duration = request.POST.get('duration')
 
-            for file in files:
-                Advertisement.objects.create(
-                    title=title,
-                    description=description,
-                    file=file,
-                    content_type=content_type,
-                    duration_days=int(duration) if duration else 30,
-                    uploaded_by=request.user
-                )
+            with attach_uploads(request, 'files') as (files, uploads):
+                for file in files.getlist('files'):
+                    Advertisement.objects.create(
+                        title=title,
+                        description=description,
+                        file=file,
+                        content_type=content_type,
+                        duration_days=int(duration) if duration else 30,
+                        uploaded_by=request.user
+                    )
+                for upload in uploads:
+                    discard_session(upload)
             messages.success(request, "Advertisement uploaded successfully")
             return redirect('detector:upload_ads')
         except Exception as e:
@@ -391,11 +520,181 @@ class DeleteMediaView(UserPassesTestMixin, View):
 
         return JsonResponse({'error': 'Not found'}, status=404)
 
+class MediaRenditionView(View):
+    """
+    Generate a missing image rendition and serve it
+
+    Templates link here only until the rendition exists, after that they use
+    its media URL directly. Only the configured IMAGE_RENDITIONS widths are
+    rendered, and only of source files the reader may see (see
+    utils.media_access), so the view cannot be used to render arbitrary
+    files at arbitrary sizes.
+    """
+
+    def get(self, request, rendition, fmt, name):
+        if rendition not in settings.IMAGE_RENDITIONS or fmt not in available_formats():
+            raise Http404('Unknown rendition')
+        if RENDITION_NAME.match(name):
+            raise Http404('Image not found')
+        visibility = media_visibility(request.user, name)
+        if visibility is None:
+            raise Http404('Image not found')
+        try:
+            rendition_name = get_rendition(name, rendition, fmt)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning(f"Could not render {rendition}/{fmt} of {name}: {e}")
+            raise Http404('Image not found')
+
+        response = FileResponse(default_storage.open(rendition_name, 'rb'), content_type=mime_type(fmt))
+        patch_cache_control(response, max_age=settings.IMAGE_RENDITION_CACHE_SECONDS, **{visibility: True})
+        return response
+
+class MediaFileView(View):
+    """
+    Serve files under MEDIA_ROOT with byte ranges and conditional requests
+
+    Browsers seek in videos with Range requests and revalidate with
+    If-None-Match / If-Modified-Since instead of downloading again. With
+    MEDIA_SERVE_MODE 'x-accel-redirect' or 'x-sendfile' the access check and
+    validators still run here but the body is handed off to the front proxy,
+    whose location for MEDIA_ROOT must be internal.
+
+    Files nobody published are not found, except for their owners and staff
+    (see utils.media_access), and those are only cached privately.
+    """
+
+    def get(self, request, path):
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404('File not found')
+        if not os.path.isfile(full_path):
+            raise Http404('File not found')
+        visibility = media_visibility(request.user, path)
+        if visibility is None:
+            raise Http404('File not found')
+
+        stat = os.stat(full_path)
+        etag = file_etag(stat)
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = self.file_response(request, full_path, path, stat, etag, content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if visibility == PRIVATE:
+            patch_cache_control(response, private=True)
+        return response
+
+    def file_response(self, request, full_path, path, stat, etag, content_type):
+        if settings.MEDIA_SERVE_MODE == 'x-accel-redirect':
+            # nginx answers Range itself for internal redirects
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+            return response
+        if settings.MEDIA_SERVE_MODE == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+            return response
+
+        size = stat.st_size
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        # A stale If-Range means the client's partial copy is outdated, send it all
+        if range_header and (if_range is None or if_range in (etag, http_date(stat.st_mtime))):
+            try:
+                byte_range = parse_byte_range(range_header, size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = size
+            return response
+
+        first, last = byte_range
+        length = last - first + 1
+        response = FileResponse(RangedFile(open(full_path, 'rb'), first, length),
+                                content_type=content_type, status=206)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        return response
+
 # API Views
-class FoodDetectorView(APIView):
+class ProductRepresentationMixin:
+    """
+    Picks the product representation of an API response from the query string
+
+    ?view=list|compact|detail selects the serializer, ?fields=id,final_prediction
+    keeps only the named fields. optimize_queryset() fetches exactly what the
+    chosen representation reads, so query counts do not grow with page size.
+    """
+    representations = {
+        'list': FoodProductListSerializer,
+        'compact': FoodProductCompactSerializer,
+        'detail': FoodProductSerializer,
+    }
+    default_representation = 'detail'
+
+    def get_representation(self):
+        representation = self.request.query_params.get('view', self.default_representation)
+        return representation if representation in self.representations else self.default_representation
+
+    def requested_fields(self):
+        fields = self.request.query_params.get('fields', '')
+        return [field.strip() for field in fields.split(',') if field.strip()] or None
+
+    def optimize_queryset(self, queryset):
+        if self.get_representation() == 'list':
+            return queryset.annotate(images_count=Count('images'))
+        return queryset.prefetch_related('images')
+
+    def product_data(self, instance, many=False):
+        serializer_class = self.representations[self.get_representation()]
+        return serializer_class(instance, many=many, fields=self.requested_fields()).data
+
+class ProductPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+class FoodProductListView(ProductRepresentationMixin, APIView):
+    """API endpoint listing the current user's analysed products, newest first"""
+    permission_classes = [IsAuthenticated]
+    default_representation = 'list'
+
+    def get(self, request, *args, **kwargs):
+        products = self.optimize_queryset(FoodProduct.objects.filter(user=request.user).order_by('-created_at'))
+        paginator = ProductPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        return paginator.get_paginated_response(self.product_data(page, many=True))
+
+class FoodProductDetailView(ProductRepresentationMixin, APIView):
+    """API endpoint returning one analysed product"""
+
+    def get(self, request, pk, *args, **kwargs):
+        product = get_object_or_404(self.optimize_queryset(FoodProduct.objects.all()), pk=pk)
+        if product.user_id and product.user_id != request.user.id:
+            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.product_data(product), status=status.HTTP_200_OK)
+
+class FoodDetectorView(ProductRepresentationMixin, APIView):
     """API endpoint for food detection"""
     parser_classes = (MultiPartParser, FormParser)
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be installed before the multipart body is parsed
+        self.upload_prefetch = None
+        if request.method == 'POST':
+            self.upload_prefetch = PreprocessingUploadHandler(request)
+            request.upload_handlers.insert(0, self.upload_prefetch)
+        return super().initialize_request(request, *args, **kwargs)
+
     def get(self, request, *args, **kwargs):
         return Response({
             'message': 'Welcome to the Food Detection API',
@@ -404,19 +703,81 @@ class FoodDetectorView(APIView):
                     'description': 'Detect fake/real food from multiple images',
                     'parameters': {
                         'brand_name': 'Name of the food product',
-                        'images': 'Multiple image files (JPEG/PNG)',
-                        'view_types': 'Type of view for each image (front, back, side, barcode, other)'
+                        'images': 'Multiple image files (JPEG/PNG/WebP)',
+                        'view_types': 'Type of view for each image (front, back, side, barcode, other)',
+                        'mode': 'Optional. "job" queues the analysis and returns 202 with a job id',
+                        'full_scan': 'Optional. "true" runs OCR on every view',
+                        'progress_token': 'Optional client-chosen UUID, follow the analysis at '
+                                          '/api/analyses/<progress_token>/events/ while the request runs'
                     },
                     'returns': {
                         'final_prediction': 'Overall Real/Fake classification',
                         'overall_confidence': 'Combined confidence score (0-1)',
                         'images': 'Analysis results for each uploaded image'
+                    },
+                    'overload': '429 or 503 with Retry-After when too many images are being analysed',
+                    'quality': '422 with quality_issues per view when an image is too small, blurred, dark or '
+                               'overexposed to read',
+                    'idempotency': 'Optional Idempotency-Key header, signed in users only. Repeats return the '
+                                   'first product with Idempotent-Replayed: true, 422 if the key was used '
+                                   'for a different submission'
+                },
+                'POST /api/detect/bulk/': {
+                    'description': 'Analyse many products at once, one NDJSON result line per product. '
+                                   'Requires login, batches share the detection admission budget',
+                    'parameters': {
+                        'products[N][brand_name]': 'Brand name of product N',
+                        'products[N][images][]': 'Image files of product N',
+                        'products[N][view_types][]': 'View type of each image of product N',
+                        'archive': 'Alternatively, a zip of images with a manifest.json'
+                    }
+                },
+                'POST /api/detect/video/': {
+                    'description': 'Detect from a short video of the pack turned once, front first',
+                    'parameters': {
+                        'brand_name': 'Name of the food product',
+                        'video': f'Video file, at most {settings.VIDEO_SCAN_MAX_SIZE // (1024 * 1024)}MB. Only the '
+                                 f'first {settings.VIDEO_SCAN_MAX_SECONDS:g}s are scanned',
+                        'full_scan': 'Optional. "true" runs OCR on every selected keyframe'
+                    },
+                    'returns': 'Same as POST /api/detect/, plus the keyframes used per view'
+                },
+                'POST /api/detect/async/': {
+                    'description': 'Same as POST /api/detect/, served by an async view on the ASGI stack'
+                },
+                'GET /api/products/': {
+                    'description': "Paginated list of the current user's analyses",
+                    'parameters': {
+                        'page': 'Page number',
+                        'page_size': 'Products per page, at most 100'
                     }
+                },
+                'GET /api/products/<id>/': {
+                    'description': 'One analysed product'
+                },
+                'GET /api/products/<id>/status/': {
+                    'description': 'Progress and, once completed, the result of a queued analysis'
+                },
+                'GET /api/products/<id>/events/': {
+                    'description': 'Server-Sent Events stream: received, quality, prediction, ocr, verdict, error'
+                },
+                'GET /api/analyses/<progress_token>/events/': {
+                    'description': 'Same stream, found by the progress_token of the upload before it is stored'
                 }
             },
-            'supported_formats': ['image/jpeg', 'image/png'],
+            'supported_formats': ['image/jpeg', 'image/png', 'image/webp'],
             'max_file_size': '5MB per image',
-            'required_views': ['front', 'back']
+            'upload_limits': {
+                'max_dimension': settings.UPLOAD_MAX_DIMENSION,
+                'max_file_size': settings.MAX_IMAGE_SIZE,
+                'output_formats': settings.UPLOAD_OUTPUT_FORMATS,
+                'quality': settings.UPLOAD_QUALITY
+            },
+            'required_views': ['front', 'back'],
+            'product_views': {
+                'view': 'list, compact (no OCR text) or detail (default, list for GET /api/products/)',
+                'fields': 'Comma separated fields to keep, e.g. id,final_prediction'
+            }
         }, status=status.HTTP_200_OK)
 
     def post(self, request, *args, **kwargs):
@@ -428,66 +789,626 @@ class FoodDetectorView(APIView):
             images = request.FILES.getlist('images[]')
             view_types = request.POST.getlist('view_types[]')
 
-            if not brand_name:
-                return Response({'error': 'Brand name is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-            if not images:
-                return Response({'error': 'At least one image is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-            if len(images) != len(view_types):
-                return Response({'error': 'Number of images and view types must match'}, status=status.HTTP_400_BAD_REQUEST)
+            error = validate_detection_request(brand_name, images, view_types)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create product with user association if authenticated
+            job_mode = (request.query_params.get('mode') or request.POST.get('mode')) == 'job'
+            full_scan = request.POST.get('full_scan', '').lower() == 'true'
             user = request.user if request.user.is_authenticated else None
-            
-            serializer = FoodProductSerializer(data={
-                'brand_name': brand_name,
-                'uploaded_images': images,
-                'view_types': view_types,
-                'user': user.id if user else None
-            })
-
-            if serializer.is_valid():
-                product = serializer.save()
-                
-                # Log analysis activity
-                if user:
-                    log_user_activity(user, 'analysis', f'Analyzed product: {brand_name}', request)
-
-                # Simulate ML processing (replace with actual ML logic)
-                from random import random, choice
-                predictions = ['Real', 'Fake']
-
-                overall_confidence = 0
-                predictions_count = {'Real': 0, 'Fake': 0}
-
-                for image in product.images.all():
-                    pred = choice(predictions)
-                    conf = random() * 0.5 + 0.5
-                    image.prediction = pred
-                    image.confidence = conf
-                    image.detected_text = f"Sample text for {image.get_view_type_display()}"
-                    image.save()
-
-                    predictions_count[pred] += 1
-                    overall_confidence += conf
-
-                total_images = len(product.images.all())
-                final_pred = 'Real' if predictions_count['Real'] > predictions_count['Fake'] else 'Fake'
-                overall_conf = overall_confidence / total_images if total_images > 0 else 0
-
-                product.final_prediction = final_pred
-                product.overall_confidence = overall_conf
-                product.save()
-
-                return Response(FoodProductSerializer(product).data, status=status.HTTP_201_CREATED)
+            idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+            error = idempotency_key_error(idempotency_key, user)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Queued jobs are cheap, inline analyses are admitted by image count before
+            # any decoding or hashing, so shed requests cost next to nothing
+            admission = nullcontext() if job_mode else detection_admission.admit(len(images))
+            with admission:
+                # Cheap blur/exposure/resolution check before anything is stored
+                decoded = None
+                if settings.IMAGE_QUALITY_GATE == 'reject':
+                    # Decoded once, the pipeline reuses the arrays the gate measured
+                    decoded = self.decoded_uploads(images)
+                    issues = check_upload_quality(view_types, images, decoded)
+                    if issues:
+                        return Response(quality_rejection_data(issues), status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+                # Retries and identical concurrent uploads share the first submission's product
+                digest = upload_digest(user, brand_name, view_types, images)
+                with submission_guard.hold(digest):
+                    existing = find_submission(user, idempotency_key, digest)
+                    if existing:
+                        return self.replayed_response(existing)
+                    return self.create_and_analyze(request, user, brand_name, images, view_types, decoded,
+                                                   job_mode, full_scan, idempotency_key, digest)
+
+        except Overloaded as e:
+            return Response({'error': str(e)}, status=e.status_code, headers={'Retry-After': str(e.retry_after)})
+        except IdempotencyKeyReused as e:
+            return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except Exception as e:
+            logger.error(f"Error processing food detection request: {str(e)}")
+            return Response({'error': 'Internal server error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def decoded_uploads(self, images):
+        """
+        BGR arrays aligned with images: those decoded during upload, the rest
+        decoded here. Undecodable uploads are None, left to the pipeline.
+        """
+        decoded = self.upload_prefetch.decoded_images() if self.upload_prefetch else []
+        decoded += [None] * (len(images) - len(decoded))
+        for index, image in enumerate(images):
+            if decoded[index] is None:
+                try:
+                    image.seek(0)
+                    decoded[index] = decode_image(image.read())
+                except ValueError as e:
+                    logger.warning(f"Could not decode upload {image.name}: {e}")
+                finally:
+                    image.seek(0)
+        return decoded
+
+    def create_and_analyze(self, request, user, brand_name, images, view_types, decoded, job_mode, full_scan,
+                           idempotency_key, digest):
+        """Store the submission and analyse it inline, or queue it in job mode"""
+        serializer = FoodProductSerializer(data={
+            'brand_name': brand_name,
+            'uploaded_images': images,
+            'view_types': view_types,
+            'user': user.id if user else None
+        })
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            with transaction.atomic():
+                product = serializer.save(idempotency_key=idempotency_key, upload_digest=digest,
+                                          progress_token=parse_progress_token(request.POST.get('progress_token')))
+        except IntegrityError:
+            # Same Idempotency-Key committed by another process in the meantime
+            return self.replayed_response(find_submission(user, idempotency_key, digest))
+
+        record_event = event_recorder(product)
+        record_event('received', {'views': view_types})
+
+        # Log analysis activity
+        if user:
+            log_user_activity(user, 'analysis', f'Analyzed product: {brand_name}', request)
+
+        # Very large uploads go to a worker instead of tying up the request
+        if job_mode or exceeds_inline_pixels(product.images.all()):
+            return queued_response(product, full_scan)
+
+        # Run the ML/OCR pipeline, on images decoded during upload or by the quality gate where possible
+        if decoded is None:
+            decoded = self.upload_prefetch.decoded_images() if self.upload_prefetch else []
+        uploaded = {}
+        for index, (view_type, image) in enumerate(zip(view_types, images)):
+            if index < len(decoded) and decoded[index] is not None:
+                uploaded[view_type] = decoded[index]
+            else:
+                image.seek(0)
+                uploaded[view_type] = image.read()
+
+        try:
+            analyze_product(product, full_scan=full_scan, images=uploaded, on_event=record_event)
+        except CapacityExceeded as e:
+            # Out of model/OCR slots: hand the stored product to the job queue
+            logger.warning(f"Detection busy, queueing product {product.pk}: {e}")
+            return queued_response(product, full_scan)
+        except Exception:
+            # A retry of a failed analysis starts over instead of replaying it
+            FoodProduct.objects.filter(pk=product.pk).update(idempotency_key='', upload_digest='')
+            raise
+
+        return Response(self.product_data(product), status=status.HTTP_201_CREATED)
+
+    def replayed_response(self, product):
+        data, status_code, headers = replayed_submission(product, self.product_data)
+        return Response(data, status=status_code, headers=headers)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncFoodDetectorView(View):
+    """
+    Async variant of FoodDetectorView for the ASGI stack
+
+    Same validation, job mode, Idempotency-Key replay, upload coalescing and
+    DETECTION_INLINE_MAX_PIXELS routing as the sync view, and the same DRF
+    default throttles, sharing their per-client budgets. File reads, image
+    decoding and the ML/OCR pipeline run in bounded thread pools and
+    database writes use the async ORM, so the event loop is never blocked
+    by a slow analysis.
+    """
+    http_method_names = ['post']
+
+    def throttle_wait(self, request):
+        """
+        Seconds before the DEFAULT_THROTTLE_CLASSES admit the request, None
+        if they do. Every throttle records it, as in APIView.check_throttles
+        """
+        throttles = [throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        return max(wait or 0 for wait in waits) if waits else None
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            user = await request.auser()
+            if user.is_authenticated:
+                reason = await sync_to_async(self.check_csrf)(request)
+                if reason:
+                    return JsonResponse({'error': f'CSRF Failed: {reason}'}, status=status.HTTP_403_FORBIDDEN)
+            else:
+                user = None
+
+            wait = await sync_to_async(self.throttle_wait)(request)
+            if wait is not None:
+                response = JsonResponse({'error': 'Request was throttled'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+
+            # Multipart parsing reads the spooled request body
+            post, files = await sync_to_async(lambda: (request.POST, request.FILES))()
+            brand_name = post.get('brand_name')
+            images = files.getlist('images[]')
+            view_types = post.getlist('view_types[]')
+
+            # Same checks as FoodDetectorView, header reads kept off the event loop
+            error = await sync_to_async(validate_detection_request)(brand_name, images, view_types)
+            if error:
+                return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+            job_mode = (request.GET.get('mode') or post.get('mode')) == 'job'
+            full_scan = post.get('full_scan', '').lower() == 'true'
+            idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+            error = idempotency_key_error(idempotency_key, user)
+            if error:
+                return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+            admission = nullcontext() if job_mode else detection_admission.aadmit(len(images))
+            async with admission:
+                loop = asyncio.get_running_loop()
+                decoded = None
+                if settings.IMAGE_QUALITY_GATE == 'reject':
+                    decoded = await self.decode_uploads(images)
+                    issues = await loop.run_in_executor(decode_executor, check_image_quality,
+                                                        dict(zip(view_types, decoded)))
+                    if issues:
+                        return JsonResponse(quality_rejection_data(issues),
+                                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+                # Retries and identical concurrent uploads share the first submission's product
+                digest = await loop.run_in_executor(decode_executor, upload_digest,
+                                                    user, brand_name, view_types, images)
+                async with submission_guard.ahold(digest):
+                    existing = await sync_to_async(find_submission)(user, idempotency_key, digest)
+                    if existing:
+                        return await self.replayed_response(existing)
+                    return await self.create_and_analyze(request, post, user, brand_name, images, view_types,
+                                                         decoded, job_mode, full_scan, idempotency_key, digest)
+
+        except Overloaded as e:
+            response = JsonResponse({'error': str(e)}, status=e.status_code)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except IdempotencyKeyReused as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Error processing food detection request: {str(e)}")
+            logger.error(f"Error processing async food detection request: {str(e)}")
+            return JsonResponse({'error': 'Internal server error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def create_and_analyze(self, request, post, user, brand_name, images, view_types, decoded, job_mode,
+                                 full_scan, idempotency_key, digest):
+        """Store the submission and analyse it, routed like FoodDetectorView.create_and_analyze"""
+        try:
+            product = await FoodProduct.objects.acreate(user=user, brand_name=brand_name,
+                                                        idempotency_key=idempotency_key, upload_digest=digest,
+                                                        progress_token=parse_progress_token(post.get('progress_token')))
+        except IntegrityError:
+            # Same Idempotency-Key committed by another process in the meantime
+            return await self.replayed_response(await sync_to_async(find_submission)(user, idempotency_key, digest))
+
+        food_images = await sync_to_async(self.build_images)(product, images, view_types)
+        await FoodImage.objects.abulk_create(food_images)
+        await AnalysisEvent.objects.acreate(product=product, stage='received', data={'views': view_types})
+        if user:
+            await sync_to_async(log_user_activity)(user, 'analysis', f'Analyzed product: {brand_name}', request)
+
+        # Very large uploads go to a worker instead of tying up the request
+        if job_mode or exceeds_inline_pixels(food_images):
+            return await self.queued_response(product, full_scan)
+
+        if decoded is None:
+            decoded = await self.decode_uploads(images)
+        defer_ocr = await sync_to_async(should_defer_ocr)()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                analysis_executor,
+                partial(process_product_images, dict(zip(view_types, decoded)), brand_name,
+                        full_scan=full_scan, on_event=event_recorder(product), defer_ocr=defer_ocr)
+            )
+        except CapacityExceeded as e:
+            logger.warning(f"Detection busy, queueing product {product.pk}: {e}")
+            return await self.queued_response(product, full_scan)
+        except Exception:
+            # A retry of a failed analysis starts over instead of replaying it
+            await FoodProduct.objects.filter(pk=product.pk).aupdate(idempotency_key='', upload_digest='')
+            raise
+
+        await aapply_analysis_results(product, results)
+        if results['ocr_status'] == 'pending':
+            await AnalysisJob.objects.acreate(product=product, kind='ocr', full_scan=full_scan)
+        await AnalysisEvent.objects.acreate(product=product, stage='verdict', data=verdict_event_data(product))
+        product = await FoodProduct.objects.prefetch_related('images').aget(pk=product.pk)
+        return JsonResponse(FoodProductSerializer(product).data, status=status.HTTP_201_CREATED)
+
+    async def decode_uploads(self, images):
+        """Read and decode the uploads in the decode pool"""
+        loop = asyncio.get_running_loop()
+        raw_images = await asyncio.gather(*(
+            loop.run_in_executor(decode_executor, self.read_upload, image) for image in images
+        ))
+        return await asyncio.gather(*(
+            loop.run_in_executor(decode_executor, decode_image, data) for data in raw_images
+        ))
+
+    async def replayed_response(self, product):
+        data, status_code, headers = await sync_to_async(replayed_submission)(
+            product, lambda product: FoodProductSerializer(product).data
+        )
+        return JsonResponse(data, status=status_code, headers=headers)
+
+    async def queued_response(self, product, full_scan=False):
+        data, status_code, headers = await sync_to_async(queued_submission)(product, full_scan)
+        return JsonResponse(data, status=status_code, headers=headers)
+
+    @staticmethod
+    def build_images(product, images, view_types):
+        # bulk_create skips save(), which fills the header metadata
+        food_images = [
+            FoodImage(product=product, image=image, view_type=view_type)
+            for image, view_type in zip(images, view_types)
+        ]
+        for food_image in food_images:
+            food_image.read_header_metadata()
+        return food_images
+
+    @staticmethod
+    def read_upload(upload):
+        upload.seek(0)
+        return upload.read()
+
+    @staticmethod
+    def check_csrf(request):
+        """Same CSRF enforcement DRF's SessionAuthentication applies to logged-in users"""
+        check = CSRFCheck(lambda request: None)
+        check.process_request(request)
+        return check.process_view(request, None, (), {})
+
+class BulkFoodDetectorView(APIView):
+    """API endpoint analysing many products in one request, streaming NDJSON results"""
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (UserRateThrottle, ScopedRateThrottle)
+    throttle_scope = 'bulk_detection'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            archive = request.FILES.get('archive')
+            if archive:
+                items = parse_archive_batch(archive)
+            else:
+                items = parse_multipart_batch(request.POST, request.FILES)
+        except BulkRequestError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not items:
+            return Response({'error': 'At least one product is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(items) > settings.BULK_DETECTION_MAX_PRODUCTS:
+            return Response({'error': f'At most {settings.BULK_DETECTION_MAX_PRODUCTS} products per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        log_user_activity(request.user, 'analysis', f'Bulk analysis of {len(items)} products', request)
+
+        full_scan = request.POST.get('full_scan', '').lower() == 'true'
+        lines = (json.dumps(result) + '\n' for result in run_bulk_detection(items, request.user, full_scan))
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+class VideoScanView(ProductRepresentationMixin, APIView):
+    """
+    API endpoint analysing a short video of the pack being turned, in place
+    of one photo per view
+
+    Sharp, distinct keyframes stand in for the views of VIDEO_SCAN_VIEWS.
+    They get one batched model call, and only the sharpest
+    VIDEO_SCAN_OCR_FRAMES of them are OCR'd.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        brand_name = (request.POST.get('brand_name') or '').strip()
+        video = request.FILES.get('video')
+        if not brand_name:
+            return Response({'error': 'Brand name is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if video is None:
+            return Response({'error': 'A video file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (video.content_type or '').startswith('video/'):
+            return Response({'error': f'Invalid file type: {video.content_type}'}, status=status.HTTP_400_BAD_REQUEST)
+        if video.size > settings.VIDEO_SCAN_MAX_SIZE:
+            return Response({'error': f'Videos are limited to {settings.VIDEO_SCAN_MAX_SIZE // (1024 * 1024)}MB'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        full_scan = request.POST.get('full_scan', '').lower() == 'true'
+        user = request.user if request.user.is_authenticated else None
+        try:
+            # Admitted like a photo submission of every scanned view
+            with detection_admission.admit(len(settings.VIDEO_SCAN_VIEWS)):
+                with video_file_path(video) as path:
+                    views = keyframe_views(sample_keyframes(path))
+                if len(views) < 2:
+                    return Response({'error': 'Not enough sharp, distinct frames. Film every side of the pack '
+                                              'slowly in good light'}, status=status.HTTP_400_BAD_REQUEST)
+                return self.analyze_keyframes(request, user, brand_name, views, full_scan)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Overloaded as e:
+            return Response({'error': str(e)}, status=e.status_code, headers={'Retry-After': str(e.retry_after)})
+        except Exception as e:
+            logger.error(f"Error processing video scan: {str(e)}")
             return Response({'error': 'Internal server error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def analyze_keyframes(self, request, user, brand_name, views, full_scan):
+        with transaction.atomic():
+            product = FoodProduct.objects.create(user=user, brand_name=brand_name)
+            for view_type, keyframe in views.items():
+                _, encoded = cv2.imencode('.jpg', keyframe.image)
+                FoodImage.objects.create(product=product, view_type=view_type,
+                                         image=ContentFile(encoded.tobytes(), name=f'{view_type}.jpg'))
+
+        record_event = event_recorder(product)
+        record_event('received', {'views': list(views), 'source': 'video'})
+        if user:
+            log_user_activity(user, 'analysis', f'Analyzed product video: {brand_name}', request)
+
+        images = {view_type: keyframe.image for view_type, keyframe in views.items()}
+        try:
+            with model_slots.acquire():
+                predictions = dict(zip(images, ml_predictor.predict_batch(list(images.values()))))
+            analyze_product(product, full_scan=full_scan, images=images, predictions=predictions,
+                            on_event=record_event, ocr_views=None if full_scan else select_ocr_views(views))
+        except CapacityExceeded as e:
+            logger.warning(f"Detection busy, queueing video scan product {product.pk}: {e}")
+            return queued_response(product, full_scan)
+
+        data = self.product_data(product)
+        data['keyframes'] = [
+            {'view_type': view_type, 'timestamp': round(keyframe.timestamp, 2), 'sharpness': round(keyframe.sharpness, 1)}
+            for view_type, keyframe in views.items()
+        ]
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class AnalysisStatusView(ProductRepresentationMixin, APIView):
+    """API endpoint reporting progress and result of a queued product analysis"""
+
+    def get(self, request, pk, *args, **kwargs):
+        product = get_object_or_404(self.optimize_queryset(FoodProduct.objects.all()), pk=pk)
+        if product.user_id and product.user_id != request.user.id:
+            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        job = product.jobs.filter(kind='analysis').order_by('-created_at').first()
+        # Without a job the product is analysed inline, by this request's twin
+        inline_status = 'completed' if product.final_prediction else 'running'
+        data = {
+            'product_id': product.pk,
+            'job_id': job.pk if job else None,
+            'status': job.status if job else inline_status,
+            'progress': job.progress if job else (100 if product.final_prediction else 0),
+            'ocr_status': product.ocr_status,
+        }
+        if job and job.status == 'failed':
+            data['error'] = job.error
+        if data['status'] == 'completed':
+            data['result'] = self.product_data(product)
+        return Response(data, status=status.HTTP_200_OK)
+
+class AnalysisEventStreamView(View):
+    """
+    Server-Sent Events stream of a product's analysis progress
+
+    Sends every stored AnalysisEvent after Last-Event-ID, then follows new
+    ones until the 'verdict' or 'error' event. Followed by product id, or by
+    the progress_token the client sent with its upload, so an inline
+    analysis can be followed while its POST is still running: the stream
+    waits for that product to be stored.
+
+    Over ASGI an async generator holds no thread between polls. Under WSGI
+    (runserver, gunicorn sync workers) Django would buffer an async
+    generator whole, so a sync one is served instead, holding its worker
+    thread for the life of the stream.
+    """
+    http_method_names = ['get']
+    final_stages = ('verdict', 'error')
+
+    async def get(self, request, pk=None, token=None, *args, **kwargs):
+        user = await request.auser()
+        lookup = {'pk': pk} if token is None else {'progress_token': token}
+        product = await FoodProduct.objects.filter(**lookup).order_by('created_at').afirst()
+        if (product is None and token is None) or (product and not self.may_follow(product, user)):
+            return JsonResponse({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+        except ValueError:
+            last_id = 0
+
+        stream = self.astream if isinstance(request, ASGIRequest) else self.stream
+        response = StreamingHttpResponse(stream(lookup, user, product.pk if product else None, last_id),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    @staticmethod
+    def may_follow(product, user):
+        return not product.user_id or product.user_id == user.id
+
+    def resolve(self, lookup, user):
+        """Id of the product a progress token names once it is stored, 0 if someone else's"""
+        product = FoodProduct.objects.filter(**lookup).order_by('created_at').first()
+        if product is None:
+            return None
+        return product.pk if self.may_follow(product, user) else 0
+
+    @staticmethod
+    def format_event(event):
+        return f"id: {event.pk}\nevent: {event.stage}\ndata: {json.dumps(event.data)}\n\n"
+
+    def stream(self, lookup, user, product_id, last_id):
+        deadline = time.monotonic() + settings.ANALYSIS_EVENT_STREAM_TIMEOUT
+        next_keepalive = time.monotonic() + settings.ANALYSIS_EVENT_KEEPALIVE
+        yield f"retry: {int(settings.ANALYSIS_EVENT_POLL_INTERVAL * 1000)}\n\n"
+
+        while time.monotonic() < deadline:
+            if product_id is None:
+                product_id = self.resolve(lookup, user)
+            if product_id == 0:
+                return
+            if product_id:
+                for event in AnalysisEvent.objects.filter(product_id=product_id, id__gt=last_id).order_by('id'):
+                    last_id = event.pk
+                    yield self.format_event(event)
+                    if event.stage in self.final_stages:
+                        return
+
+            if time.monotonic() >= next_keepalive:
+                next_keepalive = time.monotonic() + settings.ANALYSIS_EVENT_KEEPALIVE
+                yield ": keepalive\n\n"
+            time.sleep(settings.ANALYSIS_EVENT_POLL_INTERVAL)
+
+    async def astream(self, lookup, user, product_id, last_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ANALYSIS_EVENT_STREAM_TIMEOUT
+        next_keepalive = loop.time() + settings.ANALYSIS_EVENT_KEEPALIVE
+        yield f"retry: {int(settings.ANALYSIS_EVENT_POLL_INTERVAL * 1000)}\n\n"
+
+        while loop.time() < deadline:
+            if product_id is None:
+                product_id = await sync_to_async(self.resolve)(lookup, user)
+            if product_id == 0:
+                return
+            if product_id:
+                async for event in AnalysisEvent.objects.filter(product_id=product_id, id__gt=last_id).order_by('id'):
+                    last_id = event.pk
+                    yield self.format_event(event)
+                    if event.stage in self.final_stages:
+                        return
+
+            if loop.time() >= next_keepalive:
+                next_keepalive = loop.time() + settings.ANALYSIS_EVENT_KEEPALIVE
+                yield ": keepalive\n\n"
+            await asyncio.sleep(settings.ANALYSIS_EVENT_POLL_INTERVAL)
+
+
+class UploadSessionCreateView(APIView):
+    """
+    Start a resumable chunked upload
+
+    POST {filename, size, content_type}, then PATCH the returned url with
+    chunks (see UploadSessionView) and submit the token with the form in
+    <field>_upload_token instead of the file. Staff only, like the admin
+    forms that consume the tokens, with at most UPLOAD_SESSION_MAX_OPEN
+    sessions open per user.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, *args, **kwargs):
+        filename = os.path.basename(str(request.data.get('filename', ''))).strip()
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = -1
+        if not filename or size <= 0:
+            return Response({'error': 'filename and a positive size are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if size > settings.UPLOAD_SESSION_MAX_SIZE:
+            return Response({'error': f'Files are limited to {settings.UPLOAD_SESSION_MAX_SIZE} bytes'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if open_session_count(request.user) >= settings.UPLOAD_SESSION_MAX_OPEN:
+            return Response({'error': f'At most {settings.UPLOAD_SESSION_MAX_OPEN} uploads may be open at once, '
+                                      'finish or cancel one first'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        session = UploadSession.objects.create(
+            user=request.user,
+            filename=filename[:255],
+            content_type=str(request.data.get('content_type', ''))[:100],
+            size=size
+        )
+        url = reverse('detector:upload_session', args=[session.token])
+        response = Response(upload_session_data(session), status=status.HTTP_201_CREATED)
+        response['Location'] = url
+        return response
+
+class UploadSessionView(APIView):
+    """
+    Resume, append to or cancel a chunked upload
+
+    GET/HEAD report the offset to resume from in Upload-Offset. PATCH takes
+    the bytes at Upload-Offset as the raw body, with an optional
+    `Upload-Checksum: sha256 <base64>` of the chunk. Chunks are throttled
+    on their own scope, a large file takes hundreds of them.
+    """
+    permission_classes = (IsAdminUser,)
+    throttle_classes = (ScopedRateThrottle,)
+    throttle_scope = 'upload_chunks'
+
+    def get_session(self, request, token):
+        return get_object_or_404(UploadSession, token=token, user=request.user)
+
+    def offset_response(self, session, response):
+        response['Upload-Offset'] = session.offset
+        response['Upload-Length'] = session.size
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def get(self, request, token):
+        session = self.get_session(request, token)
+        return self.offset_response(session, Response(upload_session_data(session)))
+
+    def patch(self, request, token):
+        session = self.get_session(request, token)
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'error': 'Upload-Offset and Content-Length are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            checksum = parse_checksum(request.headers.get('Upload-Checksum', ''))
+            append_chunk(session, request, offset, length, checksum)
+        except ChunkError as e:
+            # Report where to resume from with every rejection
+            session.refresh_from_db()
+            return self.offset_response(session, Response({'error': str(e)}, status=e.status_code))
+        return self.offset_response(session, Response(status=status.HTTP_204_NO_CONTENT))
+
+    def delete(self, request, token):
+        discard_session(self.get_session(request, token))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+def upload_session_data(session):
+    return {
+        'token': str(session.token),
+        'url': reverse('detector:upload_session', args=[session.token]),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'complete': session.is_complete,
+    }
+
 
 # Custom Admin Interface Views
 
@@ -502,14 +1423,8 @@ class MediaAdminDashboard(AdminRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(media_counts())
         context.update({
-            'total_advertisements': Advertisement.objects.count(),
-            'active_advertisements': Advertisement.objects.filter(is_active=True).count(),
-            'total_media_items': MediaItem.objects.count(),
-            'approved_media_items': MediaItem.objects.filter(status='approved').count(),
-            'pending_media_items': MediaItem.objects.filter(status='pending').count(),
-            'total_gallery_items': GalleryItem.objects.count(),
-            'featured_gallery_items': GalleryItem.objects.filter(is_featured=True).count(),
             'recent_advertisements': Advertisement.objects.select_related('uploaded_by').order_by('-created_at')[:5],
             'recent_media': MediaItem.objects.select_related('uploaded_by').order_by('-created_at')[:5],
         })
@@ -526,11 +1441,7 @@ class AdvertisementListView(AdminRequiredMixin, TemplateView):
         # Search functionality
         search_query = self.request.GET.get('search', '')
         if search_query:
-            advertisements = advertisements.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(content_type__icontains=search_query)
-            )
+            advertisements = full_text_search(advertisements, search_query, 'title', 'description', 'content_type')
         
         # Pagination
         paginator = Paginator(advertisements, 10)
@@ -551,11 +1462,16 @@ class AdvertisementCreateView(AdminRequiredMixin, View):
         return render(request, 'detector/admin/advertisement_form.html', {'form': form, 'action': 'Create'})
     
     def post(self, request):
-        form = AdvertisementForm(request.POST, request.FILES)
-        if form.is_valid():
-            advertisement = form.save(commit=False)
-            advertisement.uploaded_by = request.user
-            advertisement.save()
+        with attach_uploads(request, 'file') as (files, uploads):
+            form = AdvertisementForm(request.POST, files)
+            saved = form.is_valid()
+            if saved:
+                advertisement = form.save(commit=False)
+                advertisement.uploaded_by = request.user
+                advertisement.save()
+                for upload in uploads:
+                    discard_session(upload)
+        if saved:
             messages.success(request, 'Advertisement created successfully!')
             return redirect('detector:admin_advertisements')
         
@@ -571,9 +1487,14 @@ class AdvertisementUpdateView(AdminRequiredMixin, View):
     
     def post(self, request, pk):
         advertisement = get_object_or_404(Advertisement, pk=pk)
-        form = AdvertisementForm(request.POST, request.FILES, instance=advertisement)
-        if form.is_valid():
-            form.save()
+        with attach_uploads(request, 'file') as (files, uploads):
+            form = AdvertisementForm(request.POST, files, instance=advertisement)
+            saved = form.is_valid()
+            if saved:
+                form.save()
+                for upload in uploads:
+                    discard_session(upload)
+        if saved:
             messages.success(request, 'Advertisement updated successfully!')
             return redirect('detector:admin_advertisements')
         
@@ -594,16 +1515,15 @@ class MediaItemListView(AdminRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        media_items = MediaItem.objects.select_related('uploaded_by', 'approved_by').order_by('-created_at')
+        media_items = MediaItem.objects.select_related('uploaded_by', 'approved_by').prefetch_related(
+            'tags'
+        ).order_by('-created_at')
         
         # Search functionality
         search_query = self.request.GET.get('search', '')
         if search_query:
-            media_items = media_items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(media_type__icontains=search_query)
-            )
+            media_items = full_text_search(media_items, search_query, 'title', 'description', 'media_type',
+                                           'tags__name')
         
         # Filter by status
         status_filter = self.request.GET.get('status', '')
@@ -630,11 +1550,17 @@ class MediaItemCreateView(AdminRequiredMixin, View):
         return render(request, 'detector/admin/media_form.html', {'form': form, 'action': 'Create'})
     
     def post(self, request):
-        form = MediaItemForm(request.POST, request.FILES)
-        if form.is_valid():
-            media_item = form.save(commit=False)
-            media_item.uploaded_by = request.user
-            media_item.save()
+        with attach_uploads(request, 'file') as (files, uploads):
+            form = MediaItemForm(request.POST, files)
+            saved = form.is_valid()
+            if saved:
+                media_item = form.save(commit=False)
+                media_item.uploaded_by = request.user
+                media_item.save()
+                form.save_m2m()
+                for upload in uploads:
+                    discard_session(upload)
+        if saved:
             messages.success(request, 'Media item created successfully!')
             return redirect('detector:admin_media')
         
@@ -650,9 +1576,14 @@ class MediaItemUpdateView(AdminRequiredMixin, View):
     
     def post(self, request, pk):
         media_item = get_object_or_404(MediaItem, pk=pk)
-        form = MediaItemForm(request.POST, request.FILES, instance=media_item)
-        if form.is_valid():
-            form.save()
+        with attach_uploads(request, 'file') as (files, uploads):
+            form = MediaItemForm(request.POST, files, instance=media_item)
+            saved = form.is_valid()
+            if saved:
+                form.save()
+                for upload in uploads:
+                    discard_session(upload)
+        if saved:
             messages.success(request, 'Media item updated successfully!')
             return redirect('detector:admin_media')
         
@@ -699,11 +1630,7 @@ class GalleryItemListView(AdminRequiredMixin, TemplateView):
         # Search functionality
         search_query = self.request.GET.get('search', '')
         if search_query:
-            gallery_items = gallery_items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__icontains=search_query)
-            )
+            gallery_items = full_text_search(gallery_items, search_query, 'title', 'description', 'category')
         
         # Pagination
         paginator = Paginator(gallery_items, 12)
@@ -798,21 +1725,25 @@ class MediaLibraryView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Only show approved media items
-        media_items = MediaItem.objects.filter(status='approved').order_by('-created_at')
+        item_filters = {'status': 'approved'}
         
         # Filter by media type
         media_type = self.request.GET.get('type', '')
         if media_type:
-            media_items = media_items.filter(media_type=media_type)
+            item_filters['media_type'] = media_type
+        media_items = MediaItem.objects.filter(**item_filters).select_related('uploaded_by').prefetch_related(
+            'tags'
+        ).order_by('-created_at')
+        
+        # Filter by tag, an indexed join through the tag table
+        tag = Tag.normalize(self.request.GET.get('tag', ''))
+        if tag:
+            media_items = media_items.filter(tags__name=tag)
         
         # Search functionality
         search_query = self.request.GET.get('search', '')
         if search_query:
-            media_items = media_items.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(tags__icontains=search_query)
-            )
+            media_items = full_text_search(media_items, search_query, 'title', 'description', 'tags__name')
         
         # Pagination
         paginator = Paginator(media_items, 12)
@@ -824,6 +1755,9 @@ class MediaLibraryView(TemplateView):
             'search_query': search_query,
             'media_type': media_type,
             'media_types': MediaItem.MEDIA_TYPES,
+            'tag': tag,
+            # Most used tags in the current type, with item counts
+            'tag_facets': Tag.objects.facets(settings.MEDIA_TAG_FACETS, **item_filters),
         })
         return context
 
@@ -140,6 +140,8 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # Media files (Uploaded images)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')  # 'django' streams ranges itself, 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) hand files to the proxy
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')  # Internal nginx location aliasing MEDIA_ROOT
 
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -216,20 +218,108 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
         'user': '1000/day',
+        'bulk_detection': os.getenv('BULK_DETECTION_THROTTLE_RATE', '30/hour'),
+        'upload_chunks': os.getenv('UPLOAD_CHUNK_THROTTLE_RATE', '2000/hour'),
     }
 }
 
 # ML Model settings
 ML_MODEL_PATH = os.getenv('ML_MODEL_PATH', BASE_DIR.parent / 'models' / 'mobilenet_v2_food.h5')
 IMAGE_SIZE = (224, 224)  # MobileNetV2 input size
-ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/jpg']
+ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/jpg', 'image/webp']
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB max file size
 
+# Limits checked from the image header before any decode (detector/utils/image_headers.py)
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '12000'))  # Longest side in pixels
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', '50000000'))  # Width x height, guards against decompression bombs
+IMAGE_MAX_ASPECT_RATIO = float(os.getenv('IMAGE_MAX_ASPECT_RATIO', '10'))  # Longest side / shortest side
+DETECTION_INLINE_MAX_PIXELS = int(os.getenv('DETECTION_INLINE_MAX_PIXELS', '40000000'))  # Larger uploads go to the job queue
+
+# Image quality pre-check ahead of the ML/OCR pipeline (detector/utils/image_quality.py)
+IMAGE_QUALITY_GATE = os.getenv('IMAGE_QUALITY_GATE', 'reject')  # 'reject' answers 422 before storing, 'flag' reports issues and skips OCR on flagged views, 'off'
+IMAGE_QUALITY_MIN_SIDE = int(os.getenv('IMAGE_QUALITY_MIN_SIDE', '320'))  # Shortest side in pixels below which labels are unreadable
+IMAGE_QUALITY_MIN_SHARPNESS = float(os.getenv('IMAGE_QUALITY_MIN_SHARPNESS', '50'))  # Laplacian variance at 512px below which an image is blurred
+IMAGE_QUALITY_MIN_BRIGHTNESS = float(os.getenv('IMAGE_QUALITY_MIN_BRIGHTNESS', '40'))  # Mean grey level (0-255) below which an image is too dark
+IMAGE_QUALITY_MAX_CLIPPED = float(os.getenv('IMAGE_QUALITY_MAX_CLIPPED', '0.6'))  # Share of pure black or blown-out pixels tolerated
+
+# Cached image renditions served with srcset (detector/utils/derivatives.py)
+IMAGE_RENDITIONS = {
+    'thumb': int(os.getenv('IMAGE_RENDITION_THUMB_WIDTH', '400')),  # Grid cards
+    'medium': int(os.getenv('IMAGE_RENDITION_MEDIUM_WIDTH', '960')),  # Wide cards and high-DPI screens
+}
+IMAGE_RENDITION_FORMATS = os.getenv('IMAGE_RENDITION_FORMATS', 'avif,webp,jpeg').split(',')  # Preferred first, JPEG is the <img> fallback
+IMAGE_RENDITION_QUALITY = int(os.getenv('IMAGE_RENDITION_QUALITY', '80'))  # Lossy encoder quality (1-100)
+IMAGE_RENDITION_CACHE_SECONDS = 24 * 60 * 60  # Browser cache lifetime of renditions served by the generating view
+
+# Media admin dashboard counters (detector/utils/media_stats.py)
+MEDIA_COUNTS_CACHE_SECONDS = int(os.getenv('MEDIA_COUNTS_CACHE_SECONDS', '60'))  # Upper bound on staleness, saves and deletes invalidate sooner
+MEDIA_TAG_FACETS = int(os.getenv('MEDIA_TAG_FACETS', '20'))  # Most used tags listed with counts on the media library page
+
+# Resumable chunked uploads for large media (detector/utils/resumable_uploads.py)
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', str(BASE_DIR / 'upload_sessions'))  # Partial files, keep on the MEDIA_ROOT filesystem so completion is a rename
+UPLOAD_SESSION_MAX_SIZE = int(os.getenv('UPLOAD_SESSION_MAX_SIZE', str(2 * 1024 * 1024 * 1024)))  # Largest file accepted in bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))  # Largest chunk per PATCH, also advertised to clients
+UPLOAD_SESSION_MAX_OPEN = int(os.getenv('UPLOAD_SESSION_MAX_OPEN', '5'))  # Unfinished sessions a user may hold at once
+UPLOAD_SESSION_EXPIRY = 24 * 60 * 60  # Seconds an idle or unclaimed session is kept
+
+# Client-side downscaling before upload (static/js/upload.js), advertised by GET /api/detect/
+UPLOAD_MAX_DIMENSION = int(os.getenv('UPLOAD_MAX_DIMENSION', '1600'))  # Longest edge in pixels, enough for OCR
+UPLOAD_OUTPUT_FORMATS = ['image/webp', 'image/jpeg']  # Preferred re-encode formats, first supported wins
+UPLOAD_QUALITY = 0.85  # Lossy encoder quality (0-1)
+
+# Video scan mode, POST /api/detect/video/ (detector/utils/video_scan.py)
+VIDEO_SCAN_MAX_SIZE = int(os.getenv('VIDEO_SCAN_MAX_SIZE', str(50 * 1024 * 1024)))  # Bytes
+VIDEO_SCAN_MAX_SECONDS = float(os.getenv('VIDEO_SCAN_MAX_SECONDS', '20'))  # Only the start of longer videos is decoded
+VIDEO_SCAN_SAMPLE_FPS = float(os.getenv('VIDEO_SCAN_SAMPLE_FPS', '4'))  # Frames examined per second of video
+VIDEO_SCAN_MIN_SHARPNESS = float(os.getenv('VIDEO_SCAN_MIN_SHARPNESS', '60'))  # Laplacian variance below which a frame is too blurred
+VIDEO_SCAN_HASH_DISTANCE = int(os.getenv('VIDEO_SCAN_HASH_DISTANCE', '10'))  # dHash bits within which two frames show the same side
+VIDEO_SCAN_VIEWS = ['front', 'side', 'back', 'other']  # Keyframes in filming order, also the most kept
+VIDEO_SCAN_OCR_FRAMES = int(os.getenv('VIDEO_SCAN_OCR_FRAMES', '2'))  # Sharpest keyframes sent to Tesseract
+
+# Per-process detection concurrency budget (detector/utils/concurrency.py)
+DETECTION_MODEL_SLOTS = int(os.getenv('DETECTION_MODEL_SLOTS', '2'))  # Concurrent model inferences
+DETECTION_OCR_SLOTS = int(os.getenv('DETECTION_OCR_SLOTS', str(os.cpu_count() or 2)))  # Concurrent Tesseract runs
+DETECTION_SLOT_TIMEOUT = float(os.getenv('DETECTION_SLOT_TIMEOUT', '10'))  # Seconds to wait for a free slot
+DETECTION_OCR_DEFER_LATENCY = float(os.getenv('DETECTION_OCR_DEFER_LATENCY', '2'))  # Average OCR slot wait (s) above which OCR is deferred, 0 disables
+DETECTION_OCR_LATENCY_WINDOW = 30  # Seconds an OCR slot wait sample counts towards deferral
+DETECTION_DECODE_WORKERS = int(os.getenv('DETECTION_DECODE_WORKERS', '4'))  # Threads decoding uploads as they stream in
+DETECTION_DECODE_QUEUE = int(os.getenv('DETECTION_DECODE_QUEUE', '16'))  # Prefetch decodes queued or running, further uploads decode after admission
+DETECTION_ASYNC_WORKERS = int(os.getenv('DETECTION_ASYNC_WORKERS', '4'))  # Threads running the pipeline for /api/detect/async/
+
+# Admission control for /api/detect/, cost is the number of images per request
+DETECTION_ADMISSION_MAX_COST = int(os.getenv('DETECTION_ADMISSION_MAX_COST', '16'))  # Images analysed at once
+DETECTION_ADMISSION_QUEUE = int(os.getenv('DETECTION_ADMISSION_QUEUE', '8'))  # Requests waiting before 429
+DETECTION_ADMISSION_TIMEOUT = float(os.getenv('DETECTION_ADMISSION_TIMEOUT', '5'))  # Seconds waiting before 503
+
+# Duplicate submissions to /api/detect/ (detector/utils/idempotency.py)
+DETECTION_COALESCE_WINDOW = int(os.getenv('DETECTION_COALESCE_WINDOW', '600'))  # Seconds identical uploads share a product
+DETECTION_COALESCE_TIMEOUT = float(os.getenv('DETECTION_COALESCE_TIMEOUT', '30'))  # Seconds waiting for an identical request
+
+# Bulk detection (/api/detect/bulk/)
+BULK_DETECTION_MAX_PRODUCTS = int(os.getenv('BULK_DETECTION_MAX_PRODUCTS', '500'))
+BULK_DETECTION_BATCH_SIZE = int(os.getenv('BULK_DETECTION_BATCH_SIZE', '8'))  # Products per model call
+
+# Detection job queue (python manage.py run_detection_worker)
+DETECTION_WORKER_POLL_INTERVAL = float(os.getenv('DETECTION_WORKER_POLL_INTERVAL', '2'))  # Seconds between empty polls
+DETECTION_JOB_LOCK_TIMEOUT = int(os.getenv('DETECTION_JOB_LOCK_TIMEOUT', '600'))  # Seconds before a running job is considered stale
+DETECTION_JOB_HEARTBEAT_INTERVAL = float(os.getenv('DETECTION_JOB_HEARTBEAT_INTERVAL', str(DETECTION_JOB_LOCK_TIMEOUT / 4)))  # Seconds between lock refreshes of a running job
+DETECTION_JOB_MAX_ATTEMPTS = 3
+
+# Analysis progress stream (/api/products/<id>/events/)
+ANALYSIS_EVENT_POLL_INTERVAL = 0.5  # Seconds between checks for new events
+ANALYSIS_EVENT_KEEPALIVE = 15  # Seconds between keepalive comments
+ANALYSIS_EVENT_STREAM_TIMEOUT = 300  # Seconds before the stream is closed
+
 # Tesseract OCR settings
 TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 TESSDATA_PREFIX = r'C:\Program Files\Tesseract-OCR\tessdata'
 
-# Logging configuration
+# Per-view OCR profiles, merged over DEFAULT_OCR_PROFILES in detector/utils/ml_utils.py
+# e.g. {'back': {'psm': 4, 'lang': 'eng+hin'}, 'barcode': {'whitelist': '0123456789'}}
+OCR_PROFILES = {}
+
+# Logging configuration, logs/ is untracked so create it on a fresh checkout
+os.makedirs(BASE_DIR / 'logs', exist_ok=True)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -18,13 +18,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from detector.views import MediaFileView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Before the Django admin, whose catch-all would 404 the custom admin/... pages
     path('', include('detector.urls', namespace='detector')),  # Web interface
+    path('admin/', admin.site.urls),
+    # Media files with Range and conditional request support, see MEDIA_SERVE_MODE
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", MediaFileView.as_view(), name='media'),
 ]
-
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,38 @@
+// Image Resize Worker - downscales and re-encodes uploads off the main thread
+//
+// Message in:  { id, file, maxDimension, formats, quality }
+// Message out: { id, blob } with the re-encoded image, or { id, blob: null }
+//              when the original file should be uploaded as is
+self.addEventListener('message', async (e) => {
+    const { id, file, maxDimension, formats, quality } = e.data;
+    try {
+        const blob = await resizeImage(file, maxDimension, formats, quality);
+        self.postMessage({ id, blob });
+    } catch (error) {
+        self.postMessage({ id, blob: null, error: String(error) });
+    }
+});
+
+async function resizeImage(file, maxDimension, formats, quality) {
+    // Apply the EXIF orientation now, the server sees upright pixels only
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+    const width = Math.round(bitmap.width * scale);
+    const height = Math.round(bitmap.height * scale);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const context = canvas.getContext('2d');
+    context.imageSmoothingQuality = 'high';
+    context.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+
+    for (const type of formats) {
+        const blob = await canvas.convertToBlob({ type, quality });
+        // Browsers without an encoder for the type silently fall back to PNG
+        if (blob.type !== type) continue;
+        // Already small enough and re-encoding did not help
+        if (scale === 1 && blob.size >= file.size) return null;
+        return blob;
+    }
+    return null;
+}
@@ -0,0 +1,138 @@
+// Resumable chunked uploads for forms marked with data-resumable-upload
+// Each selected file is sent in chunks to /api/uploads/ and the form is then
+// submitted with <field>_upload_token instead of the file itself.
+const uploadSessionsUrl = document.currentScript && document.currentScript.dataset.uploadUrl;
+
+const MAX_CHUNK_ATTEMPTS = 5;
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form[data-resumable-upload]').forEach(form => {
+        form.addEventListener('submit', async function(e) {
+            const inputs = Array.from(form.querySelectorAll('input[type="file"][name]'))
+                .filter(input => input.files.length);
+            if (!uploadSessionsUrl || !inputs.length) {
+                return;
+            }
+            e.preventDefault();
+
+            const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+            const submitButton = form.querySelector('button[type="submit"]');
+            if (submitButton) submitButton.disabled = true;
+
+            try {
+                for (const input of inputs) {
+                    const status = uploadStatus(input);
+                    for (const file of input.files) {
+                        const token = await uploadResumable(file, csrfToken, fraction => {
+                            status.textContent = `Uploading ${file.name}: ${Math.floor(fraction * 100)}%`;
+                        });
+                        const hidden = document.createElement('input');
+                        hidden.type = 'hidden';
+                        hidden.name = `${input.name}_upload_token`;
+                        hidden.value = token;
+                        form.appendChild(hidden);
+                    }
+                    status.textContent = 'Upload complete, saving...';
+                    // Disabled inputs are left out of the submission
+                    input.disabled = true;
+                }
+                HTMLFormElement.prototype.submit.call(form);
+            } catch (error) {
+                console.error('Resumable upload failed:', error);
+                alert(`Upload interrupted: ${error.message}. Submit again to resume where it stopped.`);
+                if (submitButton) submitButton.disabled = false;
+            }
+        });
+    });
+});
+
+function uploadStatus(input) {
+    let status = input.parentElement.querySelector('.resumable-upload-status');
+    if (!status) {
+        status = document.createElement('p');
+        status.className = 'resumable-upload-status mt-1 text-sm text-blue-600';
+        input.insertAdjacentElement('afterend', status);
+    }
+    return status;
+}
+
+async function uploadResumable(file, csrfToken, onProgress) {
+    // Remember the session so a reload or a later attempt resumes it
+    const storageKey = `resumable-upload:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+
+    const savedUrl = localStorage.getItem(storageKey);
+    if (savedUrl) {
+        const response = await fetch(savedUrl, { credentials: 'same-origin' });
+        if (response.ok) {
+            session = await response.json();
+        }
+    }
+    if (!session) {
+        const response = await fetch(uploadSessionsUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+            body: JSON.stringify({ filename: file.name, size: file.size, content_type: file.type })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `Server returned ${response.status}`);
+        }
+        session = data;
+        localStorage.setItem(storageKey, session.url);
+    }
+
+    let offset = session.offset;
+    let attempts = 0;
+    onProgress(offset / file.size);
+    while (offset < file.size) {
+        const chunk = await file.slice(offset, offset + session.chunk_size).arrayBuffer();
+        const headers = {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+            'X-CSRFToken': csrfToken
+        };
+        const checksum = await chunkChecksum(chunk);
+        if (checksum) headers['Upload-Checksum'] = checksum;
+
+        let response = null;
+        try {
+            response = await fetch(session.url, { method: 'PATCH', credentials: 'same-origin', headers, body: chunk });
+        } catch (networkError) {
+            response = null;
+        }
+
+        if (response && (response.ok || response.status === 409)) {
+            // 409 means the server holds a different offset, continue from there
+            offset = parseInt(response.headers.get('Upload-Offset'), 10);
+            attempts = 0;
+            onProgress(offset / file.size);
+            continue;
+        }
+        if (response && response.status < 500 && response.status !== 460) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || `Server returned ${response.status}`);
+        }
+        // Network failure, server error or corrupted chunk: retry with backoff
+        attempts += 1;
+        if (attempts >= MAX_CHUNK_ATTEMPTS) {
+            throw new Error(`chunk at byte ${offset} failed ${attempts} times`);
+        }
+        await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempts));
+    }
+
+    localStorage.removeItem(storageKey);
+    return session.token;
+}
+
+async function chunkChecksum(buffer) {
+    // crypto.subtle only exists in secure contexts, the checksum is optional
+    if (!window.crypto || !window.crypto.subtle) {
+        return null;
+    }
+    const digest = new Uint8Array(await window.crypto.subtle.digest('SHA-256', buffer));
+    let binary = '';
+    digest.forEach(byte => { binary += String.fromCharCode(byte); });
+    return `sha256 ${btoa(binary)}`;
+}
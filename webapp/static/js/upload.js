@@ -1,4 +1,6 @@
 // Image Upload Handler - Single Click Fix
+const resizeWorkerUrl = document.currentScript && document.currentScript.dataset.resizeWorker;
+
 document.addEventListener('DOMContentLoaded', function() {
     const uploadSections = document.querySelectorAll('.image-upload-section');
     
@@ -115,40 +117,60 @@ document.addEventListener('DOMContentLoaded', function() {
                         alert('Please upload only image files.');
                         return;
                     }
-                    if (file.size > 5 * 1024 * 1024) { // 5MB
-                        alert('File size must be less than 5MB.');
-                        return;
-                    }
                 }
             }
             
+            // Show loading
+            const submitBtn = uploadForm.querySelector('button[type="submit"]');
+            const originalText = submitBtn.innerHTML;
+            submitBtn.disabled = true;
+            submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Preparing images...';
+            
+            const resetButton = () => {
+                submitBtn.disabled = false;
+                submitBtn.innerHTML = originalText;
+            };
+            
             const formData = new FormData();
             
             formData.append('brand_name', brandName);
             
-            // Collect all uploaded images
+            // Collect all uploaded images, downscaled to what the server needs
             const fileInputs = document.querySelectorAll('input[type="file"]');
             const viewTypes = document.querySelectorAll('input[name="view_types[]"]');
+            const limits = await getUploadLimits();
             
             let hasImages = false;
-            fileInputs.forEach((input, index) => {
+            for (let index = 0; index < fileInputs.length; index++) {
+                const input = fileInputs[index];
                 if (input.files.length > 0) {
-                    formData.append('images[]', input.files[0]);
+                    const file = await prepareImage(input.files[0], limits);
+                    if (file.size > limits.max_file_size) {
+                        alert(`File size must be less than ${Math.round(limits.max_file_size / (1024 * 1024))}MB.`);
+                        resetButton();
+                        return;
+                    }
+                    formData.append('images[]', file);
                     formData.append('view_types[]', viewTypes[index].value);
                     hasImages = true;
                 }
-            });
+            }
             
             if (!hasImages) {
                 alert('Please upload at least front and back view images');
+                resetButton();
                 return;
             }
             
-            // Show loading
-            const submitBtn = uploadForm.querySelector('button[type="submit"]');
-            const originalText = submitBtn.innerHTML;
-            submitBtn.disabled = true;
+            // Analysed inline and followed live through the progress token while the POST runs.
+            // Large or busy uploads come back as 202 and keep following the same stream
             submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Analyzing...';
+            let analysis = null;
+            if (window.crypto && crypto.randomUUID) {
+                const progressToken = crypto.randomUUID();
+                formData.append('progress_token', progressToken);
+                analysis = followAnalysis(`/api/analyses/${progressToken}/events/`, resetButton);
+            }
             
             try {
                 const response = await fetch('/api/detect/', {
@@ -161,23 +183,230 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 const result = await response.json();
                 
+                if (response.status === 202) {
+                    // A replayed submission is another product than the one the token names
+                    if (!analysis || response.headers.get('Idempotent-Replayed')) {
+                        if (analysis) analysis.finish();
+                        analysis = followAnalysis(`/api/products/${result.product_id}/events/`, resetButton);
+                    }
+                    analysis.track(result.product_id);
+                    return;
+                }
+                // The stream may have shown the verdict or error already
+                if (analysis && !analysis.finish()) return;
                 if (response.ok) {
-                    // Show success message
-                    showNotification('Analysis Complete!', 'success');
-                    // Redirect to dashboard or show results
-                    setTimeout(() => {
-                        window.location.href = '/dashboard/';
-                    }, 1500);
+                    showVerdict(result);
+                } else if (response.status === 422 && result.quality_issues) {
+                    // Rejected by the blur/exposure/resolution pre-check, say what to retake
+                    const details = Object.entries(result.quality_issues)
+                        .map(([view, problems]) => `${view}: ${problems.join('. ')}`)
+                        .join(' | ');
+                    showNotification(`${result.error}. ${details}`, 'error');
+                    resetButton();
                 } else {
                     showNotification(result.error || 'Upload failed', 'error');
+                    resetButton();
                 }
             } catch (error) {
+                if (analysis) analysis.finish();
                 showNotification('Network error. Please try again.', 'error');
-            } finally {
-                submitBtn.disabled = false;
-                submitBtn.innerHTML = originalText;
+                resetButton();
+            }
+        });
+    }
+    
+    // Limits advertised by GET /api/detect/, defaults if the request fails
+    let uploadLimits = null;
+    async function getUploadLimits() {
+        if (!uploadLimits) {
+            uploadLimits = {
+                max_dimension: 1600,
+                max_file_size: 5 * 1024 * 1024,
+                output_formats: ['image/webp', 'image/jpeg'],
+                quality: 0.85
+            };
+            try {
+                const response = await fetch('/api/detect/');
+                if (response.ok) {
+                    const info = await response.json();
+                    Object.assign(uploadLimits, info.upload_limits || {});
+                }
+            } catch (error) {
+                // Keep the defaults
+            }
+        }
+        return uploadLimits;
+    }
+    
+    // Downscale and re-encode in a worker so large photos never block the page
+    let resizeWorker = null;
+    let resizeRequestId = 0;
+    const resizeRequests = new Map();
+    
+    function getResizeWorker() {
+        if (!resizeWorker && resizeWorkerUrl && window.Worker && window.OffscreenCanvas && window.createImageBitmap) {
+            resizeWorker = new Worker(resizeWorkerUrl);
+            resizeWorker.addEventListener('message', (e) => {
+                const resolve = resizeRequests.get(e.data.id);
+                resizeRequests.delete(e.data.id);
+                if (resolve) resolve(e.data.blob);
+            });
+        }
+        return resizeWorker;
+    }
+    
+    async function prepareImage(file, limits) {
+        const worker = getResizeWorker();
+        if (!worker) {
+            return file;
+        }
+        const id = ++resizeRequestId;
+        const blob = await new Promise((resolve) => {
+            resizeRequests.set(id, resolve);
+            worker.postMessage({
+                id,
+                file,
+                maxDimension: limits.max_dimension,
+                formats: limits.output_formats,
+                quality: limits.quality
+            });
+        });
+        if (!blob) {
+            return file;
+        }
+        const extension = blob.type === 'image/webp' ? 'webp' : 'jpg';
+        const name = file.name.replace(/\.[^.]*$/, '') + '.' + extension;
+        return new File([blob], name, { type: blob.type });
+    }
+    
+    // Without any stage event for this long, check the status endpoint instead
+    const ANALYSIS_STALL_MS = 20000;
+    const ANALYSIS_POLL_MS = 3000;
+    // Still queued after this long: most likely no detection worker is running
+    const ANALYSIS_GIVE_UP_MS = 120000;
+    
+    // Render each analysis stage as soon as the server emits it. Returns
+    // track(productId), enabling the status fallback once the id is known, and finish()
+    // closing the stream
+    function followAnalysis(eventsUrl, onFailure) {
+        const panel = document.getElementById('analysisProgress');
+        const steps = document.getElementById('analysisSteps');
+        if (panel) {
+            panel.classList.remove('hidden');
+            steps.innerHTML = '';
+        }
+        
+        const addStep = (icon, text) => {
+            if (!steps) return;
+            const item = document.createElement('li');
+            item.className = 'flex items-center';
+            item.innerHTML = `<i class="fas fa-${icon} mr-2 text-blue-600"></i><span></span>`;
+            item.querySelector('span').textContent = text;
+            steps.appendChild(item);
+        };
+        
+        const source = new EventSource(eventsUrl);
+        let startedAt = Date.now();
+        let lastEventAt = startedAt;
+        let productId = null;
+        let finished = false;
+        let watchdog = null;
+        
+        // False when the stream already reported the outcome
+        const finish = () => {
+            if (finished) return false;
+            finished = true;
+            source.close();
+            clearInterval(watchdog);
+            return true;
+        };
+        
+        ['received', 'quality', 'prediction', 'ocr'].forEach((stage) => {
+            source.addEventListener(stage, () => { lastEventAt = Date.now(); });
+        });
+        
+        // The stream stays silent while the job waits for a worker, poll the status instead
+        watchdog = setInterval(async () => {
+            if (finished || productId === null || Date.now() - lastEventAt < ANALYSIS_STALL_MS) return;
+            try {
+                const response = await fetch(`/api/products/${productId}/status/`);
+                const analysis = await response.json();
+                if (finished) return;
+                if (analysis.status === 'completed') {
+                    finish();
+                    showVerdict(analysis.result);
+                    return;
+                }
+                if (analysis.status === 'failed') {
+                    finish();
+                    showNotification(analysis.error || 'Analysis failed', 'error');
+                    onFailure();
+                    return;
+                }
+            } catch (error) {
+                // Try again on the next tick
+            }
+            if (Date.now() - startedAt > ANALYSIS_GIVE_UP_MS) {
+                finish();
+                showNotification('Analysis is still waiting in the queue. Please try again later.', 'error');
+                onFailure();
             }
+        }, ANALYSIS_POLL_MS);
+        
+        source.addEventListener('received', (e) => {
+            const data = JSON.parse(e.data);
+            addStep('inbox', `Upload received: ${data.views.join(', ')} views`);
+        });
+        
+        source.addEventListener('quality', (e) => {
+            const data = JSON.parse(e.data);
+            Object.entries(data.quality_issues).forEach(([view, problems]) => {
+                addStep('exclamation-triangle', `${view} view: ${problems.join('. ')}`);
+            });
+        });
+        
+        source.addEventListener('prediction', (e) => {
+            const data = JSON.parse(e.data);
+            const confidence = (data.confidence * 100).toFixed(1);
+            addStep('eye', `${data.view_type} view: ${data.prediction} (${confidence}%)`);
+        });
+        
+        source.addEventListener('ocr', (e) => {
+            const data = JSON.parse(e.data);
+            const brands = data.ocr_results.extracted_brands;
+            addStep('font', `Label text read${brands.length ? ': ' + brands.join(', ') : ''}`);
         });
+        
+        source.addEventListener('verdict', (e) => {
+            finish();
+            showVerdict(JSON.parse(e.data));
+        });
+        
+        source.addEventListener('error', (e) => {
+            // Server-sent 'error' events carry data, connection errors do not
+            if (e.data) {
+                finish();
+                showNotification(JSON.parse(e.data).error, 'error');
+                onFailure();
+            }
+        });
+        
+        return {
+            track(id) {
+                productId = id;
+                startedAt = lastEventAt = Date.now();
+            },
+            finish,
+        };
+    }
+    
+    function showVerdict(result) {
+        // Under load OCR is deferred, the label text check finishes in the background
+        const ocrNote = result.ocr_status === 'pending' ? ' (label text check in progress)' : '';
+        showNotification(`Analysis Complete: ${result.final_prediction}${ocrNote}`, 'success');
+        setTimeout(() => {
+            window.location.href = '/dashboard/';
+        }, 1500);
     }
     
     // Notification function